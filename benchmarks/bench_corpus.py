@@ -0,0 +1,198 @@
+"""Benchmark y regresión sobre un corpus grabado (benchmarks/corpus.py), sin red.
+
+Por etapa: páginas/s y MB/s, pico de memoria por página (tracemalloc) y
+precisión/recall contra los precios esperados del corpus:
+- heurística (extract_prices_from_html)
+- reduce_html: tiempo, tamaño de salida, ratio y precios esperados que
+  sobreviven a la reducción
+- LLMExtractor contra el stub local (stub_llm.py): requests, tokens
+- pipeline completo (process_html con el stub), sin y con ruteo al LLM
+  (llm_router: "routed" sólo llama al LLM por páginas o tarjetas dudosas)
+
+Sin --corpus usa el corpus sintético (precios exactos). --save guarda los
+números en JSON y --baseline compara contra una corrida guardada:
+
+    python benchmarks/bench_corpus.py [--corpus corpus.gz] [--latency 0.05] [--save antes.json]
+    python benchmarks/bench_corpus.py --baseline antes.json
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import metrics  # noqa: E402
+from corpus import page_text, read_corpus, score, synthetic_corpus  # noqa: E402
+from html_reducer import reduce_html  # noqa: E402
+from llm_price_extractor import LLMExtractor  # noqa: E402
+from llm_router import ROUTE_MIN_CONFIDENCE  # noqa: E402
+from main import process_html  # noqa: E402
+from price_extractor import extract_prices_from_html  # noqa: E402
+from stub_llm import serve  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _quality(results, expected) -> dict:
+    tp = fp = fn = 0
+    for found, want in zip(results, expected):
+        a, b, c = score(found, want)
+        tp, fp, fn = tp + a, fp + b, fn + c
+    return {"precision": tp / (tp + fp) if tp + fp else 1.0, "recall": tp / (tp + fn) if tp + fn else 1.0}
+
+
+def _timed(fn, pages, repeat: int):
+    """Mejor tiempo total de repeat pasadas y los resultados de la última."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(h) for h in pages]
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _peak_kb(fn, pages) -> float:
+    """Pico de memoria de Python (tracemalloc) de la página más exigente;
+    lo que libxml2 asigna por su cuenta sólo se ve en max_rss_mb."""
+    peak = 0
+    tracemalloc.start()
+    try:
+        for h in pages:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(h)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return peak / 1e3
+
+
+def _throughput(elapsed: float, pages, mb: float) -> dict:
+    return {"seconds": elapsed, "pages_per_s": len(pages) / elapsed, "mb_per_s": mb / elapsed}
+
+
+def run(pages, urls, expected, args) -> dict:
+    mb = sum(len(h) for h in pages) / 1e6
+    report = {}
+
+    elapsed, found = _timed(extract_prices_from_html, pages, args.repeat)
+    report["heuristic"] = {**_throughput(elapsed, pages, mb), "peak_kb": _peak_kb(extract_prices_from_html, pages),
+                           **_quality(found, expected)}
+
+    reduce = lambda h: reduce_html(h, max_chars=args.max_chars)  # noqa: E731
+    elapsed, reduced = _timed(reduce, pages, args.repeat)
+    kept = _quality([extract_prices_from_html(r) for r in reduced], expected)
+    report["reduce"] = {**_throughput(elapsed, pages, mb), "peak_kb": _peak_kb(reduce, pages),
+                        "out_chars": sum(map(len, reduced)) / len(reduced),
+                        "ratio": sum(len(r) / len(h) for r, h in zip(reduced, pages) if h) / len(pages),
+                        "kept_recall": kept["recall"]}
+
+    if args.latency >= 0:
+        server, state, base_url = serve(0, latency=args.latency)
+        extractor = LLMExtractor(api_key="stub", base_url=base_url, max_in_flight=args.llm_concurrency)
+        try:
+            metrics.enable()
+            metrics.reset()
+            before = state.requests
+            t0 = time.perf_counter()
+            llm = extractor.extract_many(reduced)
+            elapsed = time.perf_counter() - t0
+            tokens = metrics.take()["histograms"].get(("llm_prompt_tokens", ()), [[], 0])[1]
+            metrics.enable(False)
+            report["llm"] = {"seconds": elapsed, "pages_per_s": len(pages) / elapsed,
+                             "requests": state.requests - before, "tokens": tokens,
+                             **_quality([r.get("prices", []) for r in llm], expected)}
+
+            before = state.requests
+            t0 = time.perf_counter()
+            merged = [process_html(h, extractor, max_chars=args.max_chars, url=u) for h, u in zip(pages, urls)]
+            elapsed = time.perf_counter() - t0
+            report["pipeline"] = {"seconds": elapsed, "pages_per_s": len(pages) / elapsed,
+                                  "requests": state.requests - before,
+                                  **_quality([m["prices"] for m in merged], expected)}
+
+            before = state.requests
+            t0 = time.perf_counter()
+            merged = [process_html(h, extractor, max_chars=args.max_chars, url=u,
+                                   route_confidence=args.route_min_confidence) for h, u in zip(pages, urls)]
+            elapsed = time.perf_counter() - t0
+            report["routed"] = {"seconds": elapsed, "pages_per_s": len(pages) / elapsed,
+                                "requests": state.requests - before,
+                                **_quality([m["prices"] for m in merged], expected)}
+        finally:
+            extractor.close()
+            server.shutdown()
+    if resource is not None:
+        # ru_maxrss: KB en Linux
+        report["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    return report
+
+
+LABELS = {
+    "seconds": ("s", "{:.3f}"), "pages_per_s": ("páginas/s", "{:.1f}"), "mb_per_s": ("MB/s", "{:.2f}"),
+    "peak_kb": ("pico kB/página", "{:.0f}"), "precision": ("precisión", "{:.3f}"), "recall": ("recall", "{:.3f}"),
+    "out_chars": ("salida media", "{:.0f}"), "ratio": ("ratio", "{:.3f}"), "kept_recall": ("recall tras reducir", "{:.3f}"),
+    "requests": ("requests", "{:d}"), "tokens": ("tokens", "{:.0f}"),
+}
+
+
+def print_report(report: dict, baseline: dict | None = None):
+    for stage, values in report.items():
+        if not isinstance(values, dict):
+            old = (baseline or {}).get(stage)
+            print(f"{stage}: {values:.0f}" + (f" (antes {old:.0f})" if old is not None else ""))
+            continue
+        parts = []
+        for key, value in values.items():
+            label, fmt = LABELS[key]
+            text = f"{label} {fmt.format(value)}"
+            old = ((baseline or {}).get(stage) or {}).get(key)
+            if old:
+                text += f" ({(value - old) / old:+.1%})"
+            parts.append(text)
+        print(f"  {stage:10s} " + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark y regresión sobre un corpus de páginas grabadas")
+    parser.add_argument("--corpus", default=None, help="Corpus de corpus.py (por defecto el sintético)")
+    parser.add_argument("--pages", type=int, default=10, help="Páginas por sitio del corpus sintético")
+    parser.add_argument("--max-chars", type=int, default=30000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia del stub del LLM (s); negativa omite el LLM")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--route-min-confidence", type=float, default=ROUTE_MIN_CONFIDENCE)
+    parser.add_argument("--repeat", type=int, default=3, help="Pasadas por etapa de CPU (se toma la mejor)")
+    parser.add_argument("--save", default=None, help="Guardar los resultados en JSON")
+    parser.add_argument("--baseline", default=None, help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    records = list(read_corpus(args.corpus)) if args.corpus else synthetic_corpus(args.pages)
+    # Sólo respuestas OK con precios esperados grabados
+    records = [(m, b) for m, b in records if m.get("status", 200) < 400 and "expected" in m]
+    pages = [page_text(m, b) for m, b in records]
+    urls = [m["url"] for m, _ in records]
+    expected = [m["expected"] for m, _ in records]
+    print(f"{len(pages)} páginas, {sum(map(len, pages)) / 1e6:.1f} MB, "
+          f"{sum(map(len, expected))} precios esperados ({args.corpus or 'sintético'})")
+
+    report = run(pages, urls, expected, args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
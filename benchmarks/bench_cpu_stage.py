@@ -0,0 +1,81 @@
+"""Escalado de la etapa CPU del modo lote (cpu_stage.CpuStage) con los núcleos.
+
+Procesa un corpus local de páginas guardadas (--corpus DIR con *.html; por
+defecto páginas sintéticas armadas con limpio.html) con 1, 2, 4... procesos
+y reporta páginas/s y aceleración. Con el máximo de procesos compara además
+el envío del HTML por memoria compartida con el envío por pickle:
+
+    python benchmarks/bench_cpu_stage.py [--corpus paginas/] [--pages 200] [--max-workers 16]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+import cpu_stage  # noqa: E402
+from cpu_stage import CpuStage  # noqa: E402
+
+
+def synthetic(pages: int, copies: int):
+    # Cada página repite el cuerpo de limpio.html con precios distintos
+    base = (ROOT / "limpio.html").read_text(encoding="utf-8")
+    out = []
+    for p in range(pages):
+        body = "".join(base.replace("Bs.", f"<!-- {p}-{c} --> Bs.") for c in range(copies))
+        out.append(body.replace("110.00", f"{110 + p}.00"))
+    return out
+
+
+def run(pages, workers: int, reduce_chars: int) -> float:
+    with CpuStage(workers) as cpu:
+        # Arranque de los procesos fuera de la medición
+        with ThreadPoolExecutor(cpu.workers) as warm:
+            list(warm.map(lambda h: cpu.analyze(h), pages[:cpu.workers]))
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(2 * cpu.workers) as pool:
+            list(pool.map(lambda h: cpu.analyze(h, fingerprint=True, reduce_chars=reduce_chars), pages))
+        return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Páginas/s de la etapa CPU según cantidad de procesos")
+    parser.add_argument("--corpus", default=None, help="Directorio con páginas .html guardadas")
+    parser.add_argument("--pages", type=int, default=200, help="Páginas sintéticas (sin --corpus)")
+    parser.add_argument("--copies", type=int, default=8, help="Copias de limpio.html por página sintética")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-chars", type=int, default=30000, help="Reducción para el LLM (0 = no reducir)")
+    args = parser.parse_args()
+
+    if args.corpus:
+        pages = [p.read_text(encoding="utf-8", errors="replace") for p in sorted(Path(args.corpus).glob("*.html"))]
+    else:
+        pages = synthetic(args.pages, args.copies)
+    mb = sum(len(h) for h in pages) / 1e6
+    print(f"{len(pages)} páginas, {mb:.1f} MB, {os.cpu_count()} núcleos")
+
+    counts = [1]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+    base = None
+    for workers in counts:
+        elapsed = run(pages, workers, args.max_chars)
+        base = base or elapsed
+        print(f"  {workers:3d} procesos  {len(pages) / elapsed:7.1f} páginas/s  x{base / elapsed:.2f}")
+
+    if args.max_workers > 1:
+        shared = run(pages, args.max_workers, args.max_chars)
+        cpu_stage.SHARED_MIN_BYTES = float("inf")
+        pickled = run(pages, args.max_workers, args.max_chars)
+        print(f"  {args.max_workers} procesos: memoria compartida {len(pages) / shared:.1f} páginas/s, "
+              f"pickle {len(pages) / pickled:.1f} páginas/s")
+
+
+if __name__ == "__main__":
+    main()
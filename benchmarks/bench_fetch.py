@@ -0,0 +1,96 @@
+"""Memoria y tiempo de descarga de una página enorme, sin red (servidor local).
+
+Compara la descarga anterior (requests + resp.text, sin tope) con
+fetch_html en streaming: con tope (--max-mb), sin tope y con as_bytes. El
+cuerpo se sirve con y sin gzip. El pico es el de tracemalloc durante la
+descarga (lo que asigna Python: buffers, bytes y str).
+
+    python benchmarks/bench_fetch.py [--mb 48] [--max-mb 16]
+"""
+import argparse
+import gzip
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+import requests  # noqa: E402
+
+from fetcher import DEFAULT_HEADERS, fetch_html  # noqa: E402
+
+ITEM = "<li class='product'><h2>Silla ergonómica</h2><span class='price'>Bs. 870,00</span></li>"
+
+
+def _serve(body: bytes):
+    packed = gzip.compress(body, 1)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            data = packed if self.path == "/gz" else body
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            if self.path == "/gz":
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # el cliente cortó al llegar al tope
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _old(url: str) -> str:
+    return requests.get(url, headers=DEFAULT_HEADERS, timeout=60).text
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6, len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de memoria y tiempo de fetch_html en una página enorme")
+    parser.add_argument("--mb", type=float, default=48, help="Tamaño de la página servida (MB)")
+    parser.add_argument("--max-mb", type=float, default=16, help="Tope de fetch_html (MB)")
+    args = parser.parse_args()
+
+    body = ("<html><body><ul>" + ITEM * int(args.mb * 1e6 / len(ITEM.encode())) + "</ul></body></html>").encode()
+    server, base = _serve(body)
+    cap = int(args.max_mb * 1024 * 1024)
+    cases = [
+        ("resp.text sin tope", lambda u: _old(u)),
+        ("fetch_html sin tope", lambda u: fetch_html(u, max_bytes=None)),
+        (f"fetch_html tope {args.max_mb:g} MB", lambda u: fetch_html(u, max_bytes=cap)),
+        (f"as_bytes tope {args.max_mb:g} MB", lambda u: fetch_html(u, max_bytes=cap, as_bytes=True)),
+    ]
+    print(f"página de {len(body) / 1e6:.1f} MB ({len(gzip.compress(body, 1)) / 1e6:.1f} MB con gzip)")
+    try:
+        for path in ("/plain", "/gz"):
+            for label, fn in cases:
+                elapsed, peak, size = _measure(lambda: fn(base + path))
+                print(f"  {path:6s} {label:26s} {elapsed:6.2f} s  pico {peak:7.1f} MB  salida {size / 1e6:6.1f} M")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Escala del índice de productos (product_matcher.ProductIndex).
+
+Carga un catálogo sintético de productos conocidos y matchea un lote de
+observaciones nuevas: variantes de productos conocidos (otro orden, mayúsculas,
+acentos, textos de la tienda, una palabra menos, un typo) y productos nuevos,
+algunos repetidos dentro del lote:
+
+    python benchmarks/bench_matcher.py [--known 500000] [--queries 50000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from product_matcher import ProductIndex  # noqa: E402
+
+TYPES = ["Silla", "Sillón", "Escritorio", "Mesa", "Estante", "Lámpara", "Archivero", "Banqueta", "Sofá", "Repisa"]
+LINES = ["gerencial", "secretarial", "ergonómica", "plegable", "de comedor", "de centro", "ejecutiva", "gamer",
+         "de reunión", "esquinera", "infantil", "de jardín"]
+BRANDS = [f"{a}{b}" for a in ["Ofi", "Mue", "Casa", "Home", "Pro", "Eco", "Max", "Neo"]
+          for b in ["line", "form", "tek", "style", "plus", "lux"]]
+COLORS = ["negra", "blanca", "gris", "roja", "azul", "café", "natural", "wengue"]
+NOISE = ["Vista Rápida", "Añadir al carrito", "Oferta", "Envío gratis"]
+
+
+def product(rng: random.Random, i: int) -> str:
+    code = f"{rng.choice('ABCDEFGHJKMNPRSTVWXZ')}{rng.choice('ABCDEFGHJKMNPRSTVWXZ')}-{i}"
+    return (f"{rng.choice(TYPES)} {rng.choice(LINES)} {rng.choice(BRANDS)} {code} "
+            f"{rng.choice(COLORS)} {rng.randrange(40, 200)} cm")
+
+
+def variant(rng: random.Random, name: str) -> str:
+    words = name.split()
+    kind = rng.randrange(5)
+    if kind == 0:
+        words = [w.upper() for w in words]
+    elif kind == 1:
+        rng.shuffle(words)
+    elif kind == 2:
+        words.insert(rng.randrange(len(words)), rng.choice(NOISE))
+        words.append(f"Bs. {rng.randrange(100, 9000)}.00")
+    elif kind == 3:
+        # Sin el color
+        words = [w for w in words if w not in COLORS]
+    else:
+        # Un typo en una palabra sin números
+        j = rng.choice([k for k, w in enumerate(words) if not any(c.isdigit() for c in w) and len(w) > 4])
+        w = words[j]
+        p = rng.randrange(1, len(w) - 1)
+        words[j] = w[:p] + w[p + 1] + w[p] + w[p + 2:]
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matcheo de observaciones contra productos conocidos")
+    parser.add_argument("--known", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=50_000)
+    parser.add_argument("--new", type=float, default=0.2, help="Fracción de observaciones de productos nuevos")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    known = [product(rng, i) for i in range(args.known)]
+    index = ProductIndex()
+    t0 = time.perf_counter()
+    index.add_many(known)
+    print(f"catálogo: {len(index)} productos cargados en {time.perf_counter() - t0:.1f} s")
+    ids = list(index._ids)
+
+    n_new = int(args.queries * args.new)
+    fresh = [product(rng, args.known + i) for i in range(max(1, n_new // 2))]
+    queries, truth = [], []
+    for _ in range(args.queries - n_new):
+        k = rng.randrange(args.known)
+        queries.append(variant(rng, known[k]))
+        truth.append(ids[k])
+    for j in range(n_new):
+        # Cada producto nuevo aparece unas dos veces (dos tiendas)
+        f = j % len(fresh)
+        queries.append(variant(rng, fresh[f]) if j >= len(fresh) else fresh[f])
+        truth.append(-1 - f)
+
+    t0 = time.perf_counter()
+    got = index.match(queries)
+    elapsed = time.perf_counter() - t0
+    s = index.stats
+    print(f"{len(queries)} observaciones en {elapsed:.1f} s: {s['exact']} exactas, {s['fuzzy']} por similitud, "
+          f"{s['new']} productos nuevos")
+
+    known_ok = sum(g == t for g, t in zip(got, truth) if t >= 0)
+    n_known = sum(t >= 0 for t in truth)
+    print(f"  conocidos con el id correcto: {known_ok}/{n_known} ({known_ok / n_known:.1%})")
+    groups = {}
+    for g, t in zip(got, truth):
+        if t < 0:
+            groups.setdefault(t, set()).add(g)
+    merged = sum(len(v) == 1 for v in groups.values())
+    stolen = sum(1 for g, t in zip(got, truth) if t < 0 and g in set(ids))
+    print(f"  nuevos: {merged}/{len(groups)} con un único id entre sus apariciones, "
+          f"{stolen} asignados por error a un producto conocido")
+
+
+if __name__ == "__main__":
+    main()
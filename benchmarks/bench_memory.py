@@ -0,0 +1,80 @@
+"""Memoria de 100k precios en memoria según el contenedor.
+
+Compara una lista de dicts (formato JSON de salida), una lista de
+PriceCandidate (dataclass con __slots__) y PriceTable (columnas). Los
+strings se crean de nuevo en cada fila, como al extraer de páginas
+distintas; el mismo producto aparece en varias páginas:
+
+    python benchmarks/bench_memory.py [--rows 100000] [--products 25000]
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from price_table import PriceCandidate, PriceTable  # noqa: E402
+
+CURRENCIES = ["BOB", "USD", "EUR", "PEN", None]
+
+
+def rows(n: int, products: int, seed: int = 1):
+    rng = random.Random(seed)
+    for _ in range(n):
+        p = rng.randrange(products)
+        value = (p * 37 % 250000) / 100
+        # "".join crea un str nuevo por fila aunque el texto se repita
+        raw = "".join(["Bs. ", f"{value:.2f}"])
+        context = "".join([f"Silla ergonómica modelo {p} ", "con apoyabrazos regulables ", raw])
+        yield raw, value, CURRENCIES[p % len(CURRENCIES)], context
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria de dicts vs PriceCandidate vs PriceTable")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=25_000)
+    args = parser.parse_args()
+
+    def as_dicts():
+        return [{"raw": r, "value": v, "currency": c, "context": ctx} for r, v, c, ctx in rows(args.rows, args.products)]
+
+    def as_candidates():
+        return [PriceCandidate(*row) for row in rows(args.rows, args.products)]
+
+    def as_table():
+        table = PriceTable()
+        for row in rows(args.rows, args.products):
+            table.append(*row)
+        return table
+
+    print(f"{args.rows} filas, {args.products} productos distintos")
+    results = {}
+    for name, build in [("list[dict]", as_dicts), ("list[PriceCandidate]", as_candidates), ("PriceTable", as_table)]:
+        obj, size, elapsed = measure(build)
+        results[name] = obj
+        print(f"  {name:22s} {size / 1e6:7.1f} MB  ({size / args.rows:5.0f} B/fila)  construir {elapsed * 1000:6.0f} ms")
+        del obj
+    assert results["PriceTable"].to_dicts() == results["list[dict]"]
+    t0 = time.perf_counter()
+    results["PriceTable"].to_dicts()
+    print(f"  PriceTable.to_dicts()  {(time.perf_counter() - t0) * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
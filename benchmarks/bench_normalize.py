@@ -0,0 +1,84 @@
+"""Benchmark de normalización + deduplicación de precios en modo lote.
+
+Compara el camino por página (PriceCandidate por match, dedup y
+merge_results con dicts) con PriceBatch (arrays de NumPy) sobre los mismos
+matches sin normalizar:
+
+    python benchmarks/bench_normalize.py [--pages 5000] [--per-page 60]
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_reducer import timeit  # noqa: E402
+from main import merge_results  # noqa: E402
+from price_batch import PriceBatch  # noqa: E402
+from price_extractor import _candidate_from_fields, deduplicate_prices  # noqa: E402
+
+SYMBOLS = ["Bs.", "Bs", "BOB", "$", "USD", "€", "EUR", "S/.", None]
+
+
+def _amount(rng: random.Random) -> str:
+    value = rng.randint(1, 250000) / 100
+    style = rng.random()
+    if style < 0.4:
+        return f"{value:,.2f}"  # 1,234.56
+    if style < 0.8:
+        return f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")  # 1.234,56
+    return str(int(value))
+
+
+def build_matches(pages: int, per_page: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(pages):
+        page = []
+        for _ in range(per_page):
+            amount, symbol = _amount(rng), rng.choice(SYMBOLS)
+            raw = f"{symbol} {amount}" if symbol else amount
+            page.append((raw, amount, symbol, f"Producto {rng.randint(1, 999)} {raw} en stock"))
+        # Listados repiten el mismo precio (precio tachado, carrusel, etc.)
+        page.extend(page[: per_page // 3])
+        out.append(page)
+    return out
+
+
+def per_page(pages: list) -> list:
+    result = []
+    for matches in pages:
+        candidates = [c for c in (_candidate_from_fields(*m) for m in matches) if c is not None]
+        heuristic = [c.to_dict() for c in deduplicate_prices(candidates)]
+        result.append(merge_results(heuristic, None)["prices"])
+    return result
+
+
+def batched(pages: list) -> list:
+    return list(PriceBatch.from_matches(pages).merge([None] * len(pages)).iter_pages())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de normalización por página vs PriceBatch")
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--per-page", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = build_matches(args.pages, args.per_page)
+    rows = sum(len(p) for p in pages)
+    assert per_page(pages) == batched(pages)
+    t_dicts = timeit(lambda: per_page(pages), args.repeat)
+    t_arrays = timeit(lambda: PriceBatch.from_matches(pages).merge([None] * len(pages)), args.repeat)
+    t_view = timeit(lambda: batched(pages), args.repeat)
+    print(f"{args.pages} páginas, {rows} matches")
+    print(f"  por página (dicts)         {t_dicts * 1000:8.1f} ms")
+    print(f"  PriceBatch (arrays)        {t_arrays * 1000:8.1f} ms")
+    print(f"  PriceBatch + vista dicts   {t_view * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Benchmark de html_reducer sobre los fixtures del repo.
+
+Uso:
+    python benchmarks/bench_reducer.py [--repeat 5] [--scale 80]
+
+`--scale` replica el <body> de limpio.html para simular páginas de listado
+de varios MB.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from html_reducer import clean_html, reduce_html  # noqa: E402
+
+
+def build_page(scale: int) -> str:
+    html = (ROOT / "limpio.html").read_text(encoding="utf-8")
+    start = html.index("<body")
+    start = html.index(">", start) + 1
+    end = html.rindex("</body>")
+    return html[:start] + html[start:end] * scale + html[end:]
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de clean_html/reduce_html")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=80)
+    parser.add_argument("--max-chars", type=int, default=30000)
+    args = parser.parse_args()
+
+    for scale in sorted({1, args.scale}):
+        page = build_page(scale)
+        t_clean = timeit(lambda: clean_html(page), args.repeat)
+        t_reduce = timeit(lambda: reduce_html(page, max_chars=args.max_chars), args.repeat)
+        out = reduce_html(page, max_chars=args.max_chars)
+        print(f"{len(page) / 1e6:6.2f} MB  clean_html {t_clean * 1000:8.1f} ms  "
+              f"reduce_html {t_reduce * 1000:8.1f} ms  -> {len(out)} chars")
+
+
+if __name__ == "__main__":
+    main()
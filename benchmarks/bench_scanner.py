@@ -0,0 +1,89 @@
+"""Microbenchmarks del escáner de precios/keywords (price_scanner).
+
+Compara, sobre el texto real de limpio.html replicado, las dos búsquedas que
+hacía el reductor (PRICE_RE y KEYWORDS_RE con IGNORECASE, copiadas abajo
+como referencia) con la pasada única de scan_bounds, y el filtro de líneas
+y el prefiltro del extractor. Antes verifica que el extractor en streaming no
+pierda un precio que queda cerca del corte entre porciones:
+
+    python benchmarks/bench_scanner.py [--scale 20] [--repeat 10]
+"""
+import argparse
+import re
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from bench_reducer import build_page, timeit  # noqa: E402
+from html_reducer import _RelevanceIndex, _clean_tree, _parse, reduce_html  # noqa: E402
+from price_extractor import STREAM_CHUNK_CHARS, extract_prices_from_html  # noqa: E402
+from price_scanner import PRICE_PATTERN, has_price_signal, iter_prices, scan_bounds  # noqa: E402
+
+# Patrones anteriores del reductor, sólo como referencia
+OLD_KEYWORDS_RE = re.compile(
+    r"precio|oferta|rebaja|ahorro|descuento|price|deal|sale|promo|desde|ver precio|\bUSD\b|\bEUR\b|\bMXN\b|\bARS\b|\bCLP\b|\bCOP\b|\bBOB\b|\bPEN\b|\bBRL\b|\bUYU\b|\bGTQ\b|\bCRC\b|S/\.|Bs\.?|[$€£]",
+    flags=re.IGNORECASE,
+)
+OLD_PRICE_RE = re.compile(
+    r"""
+    ([$€£]|S/\.|Bs\.?|USD\b|EUR\b|MXN\b|ARS\b|CLP\b|COP\b|BOB\b|PEN\b|BRL\b|UYU\b|GTQ\b|CRC\b)\s{0,3}
+        \d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d{2})?
+    |
+    \d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d{2})?\s{0,3}
+        (USD\b|EUR\b|MXN\b|ARS\b|CLP\b|COP\b|BOB\b|PEN\b|BRL\b|UYU\b|GTQ\b|CRC\b)
+    """,
+    flags=re.IGNORECASE | re.VERBOSE,
+)
+
+
+def old_bounds(text: str):
+    return ([m.span() for m in OLD_PRICE_RE.finditer(text)], [m.span() for m in OLD_KEYWORDS_RE.finditer(text)])
+
+
+def check_chunk_boundary():
+    """El precio aparece entero en todas las posiciones alrededor del corte
+    entre porciones de extract_prices_from_html."""
+    head = "<html><body>" + "<p>relleno</p>" * 4000
+    missed = []
+    for offset in range(STREAM_CHUNK_CHARS - 300, STREAM_CHUNK_CHARS + 50):
+        html = head + "<p>" + "x" * (offset - len(head)) + " USD 1,234,567.89 " + "y" * 200 + "</p></body></html>"
+        if 1234567.89 not in {p["value"] for p in extract_prices_from_html(html)}:
+            missed.append(offset)
+    assert not missed, f"precio perdido en el corte de porción (offsets {missed[:5]}...)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks de price_scanner")
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    check_chunk_boundary()
+    page = build_page(args.scale)
+    root = _parse(page)
+    _clean_tree(root)
+    text = _RelevanceIndex(root.find("body")).text
+    lines = [ln for ln in (t.strip() for t in root.itertext()) if ln]
+    # Texto sin precios (descripciones, menús): el caso que el prefiltro evita
+    prose = re.sub(r"\d", "", text)
+    print(f"texto {len(text)} chars, {len(lines)} líneas, HTML {len(page) / 1e6:.2f} MB")
+
+    rows = [
+        ("índice: PRICE_RE + KEYWORDS_RE", lambda: old_bounds(text)),
+        ("índice: scan_bounds (1 pasada)", lambda: scan_bounds(text)),
+        ("líneas: 2 regex por línea", lambda: [ln for ln in lines if OLD_PRICE_RE.search(ln) or OLD_KEYWORDS_RE.search(ln)]),
+        ("líneas: has_price_signal", lambda: [ln for ln in lines if has_price_signal(ln)]),
+        ("texto sin dígitos: finditer", lambda: list(PRICE_PATTERN.finditer(prose))),
+        ("texto sin dígitos: iter_prices", lambda: list(iter_prices(prose))),
+        ("reduce_html(max_chars=2000)", lambda: reduce_html(page, max_chars=2000)),
+        ("extract_prices_from_html", lambda: extract_prices_from_html(page)),
+    ]
+    for name, fn in rows:
+        print(f"  {name:34s} {timeit(fn, args.repeat) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
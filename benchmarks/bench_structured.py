@@ -0,0 +1,91 @@
+"""Fast path de datos estructurados frente al LLM.
+
+Genera páginas de catálogo tipo WooCommerce (precios visibles + JSON-LD
+schema.org/Product); una fracción de ellas sin JSON-LD. Procesa todas con
+process_html contra el stub del LLM, con y sin fast path, y cuenta requests
+al LLM y tiempo total:
+
+    python benchmarks/bench_structured.py [--pages 40] [--products 24] [--without-jsonld 0.25] [--latency 0.2]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_llm import serve  # noqa: E402
+from llm_price_extractor import LLMExtractor  # noqa: E402
+from main import process_html  # noqa: E402
+from structured_data import extract_structured_offers  # noqa: E402
+
+
+def build_page(page: int, products: int, with_jsonld: bool) -> str:
+    items, ld = [], []
+    for i in range(products):
+        value = 150 + (page * 131 + i * 37) % 9000 + 0.5 * (i % 2)
+        name = f"Silla ergonómica modelo {page}-{i}"
+        items.append(
+            f'<li class="product"><h2 class="woocommerce-loop-product__title">{name}</h2>'
+            f'<span class="price"><span class="woocommerce-Price-amount amount">'
+            f'<span class="woocommerce-Price-currencySymbol">Bs.</span> {value:,.2f}</span></span>'
+            f'<a class="button add_to_cart_button">Añadir al carrito</a></li>'
+        )
+        ld.append({"@type": "ListItem", "position": i + 1, "item": {
+            "@type": "Product", "name": name, "sku": f"SKU-{page}-{i}",
+            "offers": {"@type": "Offer", "price": f"{value:.2f}", "priceCurrency": "BOB",
+                       "availability": "https://schema.org/InStock"}}})
+    script = ""
+    if with_jsonld:
+        data = {"@context": "https://schema.org", "@type": "ItemList", "itemListElement": ld}
+        script = f'<script type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+    return (f"<html><head><title>Catálogo {page}</title>{script}</head><body>"
+            f'<nav>Inicio | Sillas | Mesas | Contacto</nav><ul class="products">{"".join(items)}</ul>'
+            "<footer>Envíos a todo el país</footer></body></html>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Datos estructurados vs LLM")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--products", type=int, default=24)
+    parser.add_argument("--without-jsonld", type=float, default=0.25, help="Fracción de páginas sin JSON-LD")
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia simulada del LLM (s)")
+    args = parser.parse_args()
+
+    cutoff = int(args.pages * (1 - args.without_jsonld))
+    pages = [build_page(p, args.products, p < cutoff) for p in range(args.pages)]
+
+    t0 = time.perf_counter()
+    for html in pages:
+        extract_structured_offers(html)
+    parse_ms = (time.perf_counter() - t0) * 1000 / len(pages)
+    print(f"{len(pages)} páginas ({cutoff} con JSON-LD), {args.products} productos c/u")
+    print(f"  extract_structured_offers: {parse_ms:.2f} ms/página")
+
+    server, state, base_url = serve(0, latency=args.latency)
+    extractor = LLMExtractor(api_key="stub", base_url=base_url)
+    try:
+        results = {}
+        for name, min_coverage in [("sin fast path", float("inf")), ("con fast path", 1.0)]:
+            before = state.requests
+            t0 = time.perf_counter()
+            results[name] = [process_html(html, extractor, min_coverage=min_coverage) for html in pages]
+            elapsed = time.perf_counter() - t0
+            print(f"  {name:14s} requests LLM {state.requests - before:4d}  {elapsed:6.2f} s")
+        same = all(
+            sorted(map(json.dumps, a["prices"])) == sorted(map(json.dumps, b["prices"]))
+            for a, b in zip(results["sin fast path"], results["con fast path"])
+        )
+        print(f"  mismos precios: {same}")
+    finally:
+        extractor.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    main()
@@ -0,0 +1,152 @@
+"""Plantillas por dominio frente al LLM, sobre fixtures offline.
+
+Genera varios sitios sintéticos con tarjetas de producto de distinta forma
+(WooCommerce con ofertas <del>/<ins>, grilla Bootstrap en filas, tabla) y un
+sitio que cambia de diseño a mitad de la corrida. Cada página se procesa con
+process_html contra el stub del LLM, con y sin --templates-db, y se reporta
+requests al LLM, aciertos de plantilla, tiempo y precios recuperados:
+
+    python benchmarks/bench_templates.py [--pages 10] [--products 18] [--latency 0.2]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_llm import serve  # noqa: E402
+from llm_price_extractor import LLMExtractor  # noqa: E402
+from main import process_html  # noqa: E402
+from site_templates import TemplateStore  # noqa: E402
+
+CHROME = ("<html><head><title>{title}</title></head><body>"
+          "<header><nav>Inicio | Ofertas | Contacto</nav></header>"
+          "<div class='aviso'>Envío gratis en compras desde Bs. 300</div>{body}"
+          "<footer>© Tienda · Todos los derechos reservados</footer></body></html>")
+
+
+def _value(page: int, i: int) -> float:
+    return 90 + (page * 97 + i * 53) % 4000 + 0.5 * (i % 2)
+
+
+def woo(page: int, products: int) -> str:
+    items = []
+    for i in range(products):
+        v = _value(page, i)
+        price = f"<span class='woocommerce-Price-amount amount'><bdi><span class='woocommerce-Price-currencySymbol'>Bs.</span>&nbsp;{v:,.2f}</bdi></span>"
+        if i % 4 == 0:
+            old = f"<span class='woocommerce-Price-amount amount'><bdi><span class='woocommerce-Price-currencySymbol'>Bs.</span>&nbsp;{v * 1.2:,.2f}</bdi></span>"
+            price = f"<del>{old}</del> <ins>{price}</ins>"
+        items.append(
+            f"<li class='product type-product post-{page * 100 + i} status-publish {'first' if i % 3 == 0 else ''} instock'>"
+            f"<a href='/p/{page}-{i}' class='woocommerce-LoopProduct-link'><img src='/i/{i}.jpg' alt=''>"
+            f"<h2 class='woocommerce-loop-product__title'>Silla ergonómica {page}-{i}</h2>"
+            f"<span class='price'>{price}</span></a>"
+            f"<a href='?add-to-cart={i}' class='button add_to_cart_button'>Añadir al carrito</a></li>"
+        )
+    return CHROME.format(title=f"Sillas – página {page}", body=f"<ul class='products columns-4'>{''.join(items)}</ul>")
+
+
+def grid(page: int, products: int, card_class: str = "card") -> str:
+    rows = []
+    for r in range(0, products, 3):
+        cols = []
+        for i in range(r, min(r + 3, products)):
+            v = _value(page, i)
+            cols.append(
+                f"<div class='col-md-4'><div class='{card_class} h-100'><div class='{card_class}-body'>"
+                f"<h5 class='{card_class}-title'>Escritorio modelo {page}-{i}</h5>"
+                f"<p class='text-muted'>Melamina 18 mm, 120 x 60 cm</p>"
+                f"<p class='precio'>$ {v:,.2f}</p></div></div></div>"
+            )
+        rows.append(f"<div class='row'>{''.join(cols)}</div>")
+    return CHROME.format(title=f"Escritorios {page}", body=f"<div class='container'>{''.join(rows)}</div>")
+
+
+def table(page: int, products: int) -> str:
+    rows = "".join(
+        f"<tr><td>{page}-{i}</td><td>Mesa plegable {page}-{i}</td><td>{_value(page, i):,.2f} BOB</td></tr>"
+        for i in range(products)
+    )
+    return CHROME.format(title=f"Lista de precios {page}",
+                         body=f"<table class='lista'><tr><th>Código</th><th>Producto</th><th>Precio</th></tr>{rows}</table>")
+
+
+def redesign(page: int, products: int, pages: int) -> str:
+    # A mitad de la corrida las tarjetas cambian de clase y estructura
+    if page < pages // 2:
+        return grid(page, products, "card")
+    items = "".join(
+        f"<article class='tile'><div class='tile-name'>Lámpara {page}-{i}</div>"
+        f"<div class='tile-foot'><b>$</b> <b>{_value(page, i):,.2f}</b></div></article>"
+        for i in range(products)
+    )
+    return CHROME.format(title=f"Lámparas {page}", body=f"<section class='tiles'>{items}</section>")
+
+
+def fixtures(pages: int, products: int):
+    sites = {
+        "woo.example": lambda p: woo(p, products),
+        "grid.example": lambda p: grid(p, products),
+        "tabla.example": lambda p: table(p, products),
+        "rediseño.example": lambda p: redesign(p, products, pages),
+    }
+    return [(site, f"https://{site}/categoria?page={p}", build(p)) for site, build in sites.items() for p in range(pages)]
+
+
+def _values(result: dict) -> set:
+    return {round(p["value"], 2) for p in result["prices"] if p["value"] is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plantillas por dominio vs LLM en cada página")
+    parser.add_argument("--pages", type=int, default=10, help="Páginas por sitio")
+    parser.add_argument("--products", type=int, default=18)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latencia simulada del LLM (s)")
+    args = parser.parse_args()
+
+    pages = fixtures(args.pages, args.products)
+    server, state, base_url = serve(0, latency=args.latency)
+    extractor = LLMExtractor(api_key="stub", base_url=base_url)
+    try:
+        before = state.requests
+        t0 = time.perf_counter()
+        baseline = [process_html(html, extractor, url=url) for _, url, html in pages]
+        print(f"{len(pages)} páginas, {args.pages} por sitio")
+        print(f"  sólo LLM         requests {state.requests - before:4d}  {time.perf_counter() - t0:6.2f} s")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            templates = TemplateStore(tmp)
+            before = state.requests
+            t0 = time.perf_counter()
+            learned = [process_html(html, extractor, url=url, templates=templates) for _, url, html in pages]
+            elapsed = time.perf_counter() - t0
+            s = templates.stats
+            print(f"  con plantillas   requests {state.requests - before:4d}  {elapsed:6.2f} s  "
+                  f"aciertos {s['hits']}/{len(pages)}, confianza baja {s['misses']}, aprendidas {s['learned']}")
+
+            t0 = time.perf_counter()
+            for _, url, html in pages:
+                templates.extract(url, html, [])
+            print(f"  aplicar plantilla {(time.perf_counter() - t0) * 1000 / len(pages):6.2f} ms/página")
+            templates.close()
+
+        print("  precios (valores) recuperados respecto de sólo LLM, por sitio:")
+        for site in dict.fromkeys(s for s, _, _ in pages):
+            got = want = 0
+            for (s, _, _), a, b in zip(pages, baseline, learned):
+                if s == site:
+                    want += len(_values(a))
+                    got += len(_values(a) & _values(b))
+            print(f"    {site:18s} {got}/{want}")
+    finally:
+        extractor.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
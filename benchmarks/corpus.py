@@ -0,0 +1,311 @@
+"""Corpus de páginas grabadas para benchmarks y regresión sin red.
+
+Formato (parecido a WARC): un .gz de varios miembros; cada registro es una
+línea JSON de cabecera (url, fecha, status, headers de la respuesta, length,
+precios esperados) seguida de length bytes del cuerpo tal cual llegó (ya
+descomprimido) y un salto de línea. Se lee secuencialmente sin cargar todo.
+
+    python benchmarks/corpus.py record corpus.gz --urls-file urls.txt [--expected heuristic|llm]
+    python benchmarks/corpus.py synth corpus.gz [--pages 10] [--products 18]
+    python benchmarks/corpus.py info corpus.gz
+    python benchmarks/corpus.py serve corpus.gz --port 8800
+
+Los precios esperados de un registro grabado salen del pipeline actual
+(heurística o heurística + LLM) y se pueden corregir a mano; los del corpus
+sintético son exactos por construcción.
+"""
+import argparse
+import gzip
+import json
+import re
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+_CHARSET_RE = re.compile(r"charset=([\w.-]+)", re.I)
+# Headers de la respuesta que se guardan (el resto no afecta al pipeline)
+KEEP_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def write_corpus(path: str | Path, records: Iterable[Tuple[Dict, bytes]]) -> int:
+    """Escribe pares (cabecera, cuerpo); devuelve cuántos registros."""
+    n = 0
+    with open(path, "wb") as f:
+        for meta, body in records:
+            header = json.dumps({**meta, "length": len(body)}, ensure_ascii=False).encode("utf-8")
+            # Un miembro gzip por registro, como los .warc.gz
+            f.write(gzip.compress(header + b"\n" + body + b"\n"))
+            n += 1
+    return n
+
+
+def read_corpus(path: str | Path) -> Iterator[Tuple[Dict, bytes]]:
+    with gzip.open(path, "rb") as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            meta = json.loads(line)
+            body = f.read(meta["length"])
+            f.read(1)
+            yield meta, body
+
+
+def page_text(meta: Dict, body: bytes) -> str:
+    """Cuerpo decodificado con el charset del Content-Type (UTF-8 si falta)."""
+    m = _CHARSET_RE.search(meta.get("headers", {}).get("Content-Type", ""))
+    try:
+        return body.decode(m.group(1) if m else "utf-8", errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def price_key(p: Dict) -> Optional[Tuple[float, Optional[str]]]:
+    value = p.get("value")
+    if not isinstance(value, (int, float)):
+        return None
+    return round(float(value), 2), p.get("currency")
+
+
+def score(found: Iterable[Dict], expected: Iterable[Dict]) -> Tuple[int, int, int]:
+    """(verdaderos positivos, falsos positivos, falsos negativos) por
+    (valor, moneda) de una página."""
+    got = {k for k in map(price_key, found) if k is not None}
+    want = {k for k in map(price_key, expected) if k is not None}
+    return len(got & want), len(got - want), len(want - got)
+
+
+# --- corpus sintético --------------------------------------------------------
+
+CHROME = ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>{head}</head><body>"
+          "<header><nav>{menu}</nav></header>"
+          "<div class='aviso'>Envío gratis en compras desde Bs. 300</div>{body}"
+          "<footer>© Tienda · Todos los derechos reservados</footer></body></html>")
+
+
+def _value(page: int, i: int) -> float:
+    return 90 + (page * 97 + i * 53) % 4000 + 0.5 * (i % 2)
+
+
+def _money(v: float) -> str:
+    return f"{v:,.2f}"
+
+
+def _woo(page: int, products: int, heavy: bool = False):
+    items, expected = [], []
+    for i in range(products):
+        v = _value(page, i)
+        amount = ("<span class='woocommerce-Price-amount amount'><bdi><span class='woocommerce-Price-currencySymbol'>"
+                  "Bs.</span>&nbsp;{}</bdi></span>")
+        price = amount.format(_money(v))
+        expected.append({"value": v, "currency": "BOB"})
+        if i % 4 == 0:
+            old = round(v * 1.2, 2)
+            price = f"<del>{amount.format(_money(old))}</del> <ins>{price}</ins>"
+            expected.append({"value": old, "currency": "BOB"})
+        items.append(
+            f"<li class='product type-product post-{page * 100 + i} instock'>"
+            f"<a href='/p/{page}-{i}'><img src='/i/{i}.jpg' alt=''>"
+            f"<h2 class='woocommerce-loop-product__title'>Silla ergonómica {page}-{i}</h2>"
+            f"<span class='price'>{price}</span></a>"
+            f"<a href='?add-to-cart={i}' class='button add_to_cart_button'>Añadir al carrito</a></li>"
+        )
+    head = menu = ""
+    if heavy:
+        # Tema pesado: scripts en línea, estilos y un mega menú que el reductor debe descartar
+        head = "".join(f"<script>var cfg{k} = {json.dumps({'id': k, 'items': list(range(60))})};</script>"
+                       for k in range(150)) + "<style>" + ".x{color:red}" * 4000 + "</style>"
+        menu = "".join(f"<a href='/c/{k}'>Categoría {k}</a>" for k in range(1500))
+    html = CHROME.format(title=f"Sillas – página {page}", head=head, menu=menu,
+                         body=f"<ul class='products columns-4'>{''.join(items)}</ul>")
+    return html, expected
+
+
+def _grid(page: int, products: int):
+    cols, expected = [], []
+    for i in range(products):
+        v = _value(page, i)
+        expected.append({"value": v, "currency": "USD"})
+        cols.append(f"<div class='col-md-4'><div class='card'><div class='card-body'>"
+                    f"<h5 class='card-title'>Escritorio modelo {page}-{i}</h5>"
+                    f"<p class='text-muted'>Melamina 18 mm, 120 x 60 cm</p>"
+                    f"<p class='precio'>$ {_money(v)}</p></div></div></div>")
+    rows = "".join(f"<div class='row'>{''.join(cols[r:r + 3])}</div>" for r in range(0, len(cols), 3))
+    return CHROME.format(title=f"Escritorios {page}", head="", menu="Inicio | Ofertas",
+                         body=f"<div class='container'>{rows}</div>"), expected
+
+
+def _table(page: int, products: int):
+    expected = [{"value": _value(page, i), "currency": "BOB"} for i in range(products)]
+    rows = "".join(f"<tr><td>{page}-{i}</td><td>Mesa plegable {page}-{i}</td><td>{_money(_value(page, i))} BOB</td></tr>"
+                   for i in range(products))
+    return CHROME.format(title=f"Lista de precios {page}", head="", menu="Inicio",
+                         body=f"<table class='lista'><tr><th>Código</th><th>Producto</th><th>Precio</th></tr>{rows}</table>"
+                         ), expected
+
+
+def _split(page: int, products: int):
+    # Símbolo y monto en nodos distintos, y un producto sin precio ("Consultar")
+    items, expected = [], []
+    for i in range(products):
+        if i % 7 == 3:
+            items.append(f"<article class='tile'><div class='tile-name'>Lámpara {page}-{i}</div>"
+                         f"<div class='tile-foot'>Consultar precio</div></article>")
+            continue
+        v = _value(page, i)
+        expected.append({"value": v, "currency": "USD"})
+        items.append(f"<article class='tile'><div class='tile-name'>Lámpara {page}-{i}</div>"
+                     f"<div class='tile-foot'><b>$</b> <b>{_money(v)}</b></div></article>")
+    return CHROME.format(title=f"Lámparas {page}", head="", menu="Inicio",
+                         body=f"<section class='tiles'>{''.join(items)}</section>"), expected
+
+
+SITES = {
+    "woo.example": _woo,
+    "pesado.example": lambda page, products: _woo(page, products, heavy=True),
+    "grid.example": _grid,
+    "tabla.example": _table,
+    "partido.example": _split,
+}
+
+
+def synthetic_corpus(pages: int = 10, products: int = 18) -> List[Tuple[Dict, bytes]]:
+    """Páginas de listado de varios diseños con sus precios de producto
+    exactos (el aviso "Bs. 300" del encabezado no es un precio esperado)."""
+    date = formatdate(0, usegmt=True)
+    records = []
+    for site, build in SITES.items():
+        for p in range(pages):
+            html, expected = build(p, products)
+            meta = {"url": f"https://{site}/categoria?page={p}", "date": date, "status": 200,
+                    "headers": {"Content-Type": "text/html; charset=utf-8"},
+                    "expected": expected, "expected_source": "synthetic"}
+            records.append((meta, html.encode("utf-8")))
+    return records
+
+
+# --- grabación y replay ------------------------------------------------------
+
+def _expected(html: str, url: str, source: str) -> List[Dict]:
+    from main import merge_results, process_html
+    from price_extractor import extract_price_table
+
+    if source == "none":
+        return []
+    if source == "heuristic":
+        return merge_results(extract_price_table(html), None)["prices"]
+    from llm_price_extractor import LLMExtractor
+
+    extractor = LLMExtractor()
+    try:
+        return process_html(html, extractor, url=url)["prices"]
+    finally:
+        extractor.close()
+
+
+def record(urls: List[str], expected: str = "heuristic", timeout: int = 20) -> Iterator[Tuple[Dict, bytes]]:
+    import requests
+    from fetcher import DEFAULT_HEADERS
+
+    with requests.Session() as session:
+        session.headers.update(DEFAULT_HEADERS)
+        for url in urls:
+            try:
+                resp = session.get(url, timeout=timeout)
+            except requests.RequestException as ex:
+                print(f"  {url}: {ex}", file=sys.stderr)
+                continue
+            meta = {"url": resp.url, "date": formatdate(time.time(), usegmt=True), "status": resp.status_code,
+                    "headers": {k: resp.headers[k] for k in KEEP_HEADERS if k in resp.headers}}
+            if resp.status_code < 400:
+                meta["expected"] = _expected(page_text(meta, resp.content), resp.url, expected)
+                meta["expected_source"] = expected
+            print(f"  {resp.status_code} {len(resp.content) / 1e3:8.1f} kB  {resp.url}", file=sys.stderr)
+            yield meta, resp.content
+
+
+def serve_corpus(records: List[Tuple[Dict, bytes]], port: int = 0, latency: float = 0.0):
+    """Sirve el registro i en /r/i con sus headers grabados. Devuelve
+    (servidor, base_url)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            try:
+                meta, body = records[int(self.path.rsplit("/", 1)[-1])]
+            except (ValueError, IndexError):
+                meta, body = {"status": 404, "headers": {}}, b"no encontrado"
+            self.send_response(meta["status"])
+            for k, v in meta["headers"].items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graba, genera, inspecciona o sirve un corpus de páginas")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="Descargar URLs y guardarlas con sus precios esperados")
+    rec.add_argument("path")
+    rec.add_argument("--urls-file", required=True)
+    rec.add_argument("--expected", choices=["heuristic", "llm", "none"], default="heuristic",
+                     help="De dónde salen los precios esperados (llm usa OPENAI_API_KEY)")
+    syn = sub.add_parser("synth", help="Generar el corpus sintético (precios exactos)")
+    syn.add_argument("path")
+    syn.add_argument("--pages", type=int, default=10, help="Páginas por sitio")
+    syn.add_argument("--products", type=int, default=18)
+    info = sub.add_parser("info", help="Resumen del corpus")
+    info.add_argument("path")
+    srv = sub.add_parser("serve", help="Servir el corpus por HTTP local (registro i en /r/i)")
+    srv.add_argument("path")
+    srv.add_argument("--port", type=int, default=8800)
+    srv.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        with open(args.urls_file, "r", encoding="utf-8") as f:
+            urls = [ln.strip() for ln in f if ln.strip() and not ln.startswith("#")]
+        n = write_corpus(args.path, record(urls, args.expected))
+        print(f"{n} páginas grabadas en {args.path}", file=sys.stderr)
+    elif args.command == "synth":
+        n = write_corpus(args.path, synthetic_corpus(args.pages, args.products))
+        print(f"{n} páginas generadas en {args.path}", file=sys.stderr)
+    elif args.command == "info":
+        n = size = prices = 0
+        for meta, body in read_corpus(args.path):
+            n += 1
+            size += len(body)
+            prices += len(meta.get("expected") or [])
+        print(f"{n} páginas, {size / 1e6:.1f} MB sin comprimir ({Path(args.path).stat().st_size / 1e6:.1f} MB en disco), "
+              f"{prices} precios esperados")
+    else:
+        records = list(read_corpus(args.path))
+        server, base = serve_corpus(records, args.port, args.latency)
+        print(f"{len(records)} páginas en {base}/r/0 .. {base}/r/{len(records) - 1}", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Prueba de carga de la app web contra stubs locales (sin red).
+
+Levanta un servidor de páginas que sirve limpio.html con latencia simulada,
+el stub de chat completions (stub_llm.py) y la app FastAPI con uvicorn (en
+otro proceso), y lanza requests concurrentes a /api/extract:
+
+    python benchmarks/load_web.py --requests 200 --concurrency 100 --llm
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import httpx  # noqa: E402
+
+from stub_llm import serve as serve_llm  # noqa: E402
+
+
+def serve_pages(latency: float):
+    body = (ROOT / "limpio.html").read_bytes()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_app(port: int) -> subprocess.Popen:
+    # Proceso aparte: los stubs y el cliente de carga no comparten GIL con la app
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "web.app:app", "--app-dir", str(ROOT / "src"),
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("La app no arrancó")
+
+
+async def run_load(base: str, page_base: str, total: int, concurrency: int, use_llm: bool):
+    latencies = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        async def one(i: int):
+            nonlocal errors
+            data = {"url": f"{page_base}/p{i}", "model": "stub"}
+            if use_llm:
+                data["use_llm"] = "true"
+            async with slots:
+                t0 = time.perf_counter()
+                resp = await client.post(f"{base}/api/extract", data=data)
+                latencies.append(time.perf_counter() - t0)
+                if resp.status_code != 200:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    print(f"{total} requests, concurrencia {concurrency}: {elapsed:.2f} s, "
+          f"{total / elapsed:.1f} req/s, p50 {statistics.median(latencies):.2f} s, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f} s, errores {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de /api/extract")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--page-latency", type=float, default=0.5)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--llm", action="store_true", help="Incluir extracción LLM (contra el stub)")
+    parser.add_argument("--llm-in-flight", type=int, default=64, help="LLM_MAX_IN_FLIGHT para la app")
+    parser.add_argument("--port", type=int, default=8931)
+    args = parser.parse_args()
+
+    _, _, llm_url = serve_llm(0, args.llm_latency)
+    os.environ["OPENAI_BASE_URL"] = llm_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["LLM_MAX_IN_FLIGHT"] = str(args.llm_in_flight)
+    os.environ.pop("LLM_CACHE_DIR", None)
+    _, page_base = serve_pages(args.page_latency)
+    app_proc = start_app(args.port)
+    try:
+        asyncio.run(run_load(f"http://127.0.0.1:{args.port}", page_base, args.requests, args.concurrency, args.llm))
+    finally:
+        app_proc.terminate()
+        app_proc.wait()
+
+
+if __name__ == "__main__":
+    main()
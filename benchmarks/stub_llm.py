@@ -0,0 +1,112 @@
+"""Servidor stub del endpoint /v1/chat/completions de OpenAI.
+
+Responde con los precios que encuentra el extractor heurístico en el prompt, tras una
+latencia simulada, y opcionalmente devuelve 429 en una fracción de requests.
+Sirve para probar LLMExtractor sin red ni costo:
+
+    python benchmarks/stub_llm.py --port 8900 --latency 0.5 --rate-limit 0.1
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=stub python src/main.py ... --llm
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from price_extractor import iter_price_candidates  # noqa: E402
+
+
+class StubState:
+    def __init__(self, latency: float = 0.0, rate_limit: float = 0.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, payload: dict, headers: dict | None = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length) or b"{}")
+            with state.lock:
+                state.requests += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                if state.rate_limit and random.random() < state.rate_limit:
+                    self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"retry-after": "0.05"})
+                    return
+                time.sleep(state.latency)
+                prompt = req.get("messages", [{}])[-1].get("content", "")
+                prices = [
+                    {"raw": c.raw, "value": c.value, "currency": c.currency, "context": c.context}
+                    for c in iter_price_candidates([prompt], dedup=False)
+                ]
+                self._send(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": req.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": json.dumps({"prices": prices})},
+                    }],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 10, "total_tokens": len(prompt) // 4 + 10},
+                })
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int = 0, latency: float = 0.0, rate_limit: float = 0.0):
+    """Arranca el stub en un hilo. Devuelve (server, state, base_url)."""
+    state = StubState(latency, rate_limit)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub local de chat completions")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="Segundos por request")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fracción de requests que devuelven 429")
+    args = parser.parse_args()
+    server, _, base_url = serve(args.port, args.latency, args.rate_limit)
+    print(f"Stub escuchando en {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Etapa CPU del modo lote en un pool de procesos.
+
+Fingerprint, matches de precio, datos estructurados y reducción para el LLM
+son Python puro: con el GIL se serializan en un núcleo aunque las descargas
+sean concurrentes. CpuStage corre analyze_page en procesos; el HTML viaja
+como bytes UTF-8 por memoria compartida (el proceso principal no lo
+serializa con pickle ni lo escribe en un pipe) y vuelve un dict compacto
+(matches sin normalizar, offers, HTML reducido). Si llega como bytes
+(Fetcher con as_bytes) el proceso principal ni siquiera lo decodifica.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Union
+
+import metrics
+from html_reducer import page_fingerprint, reduce_html
+from llm_router import route_page
+from price_extractor import candidates_from_matches, scan_price_matches
+from structured_data import structured_fast_path
+
+# Páginas más chicas (en caracteres) viajan por pickle: crear y liberar el segmento cuesta más
+SHARED_MIN_BYTES = 64 * 1024
+
+
+def analyze_page(html: Union[str, bytes], min_coverage: float = 1.0, fingerprint: bool = False,
+                 known: Optional[str] = None, reduce_chars: Optional[int] = None,
+                 route_confidence: Optional[float] = None) -> Dict:
+    """Parte CPU de una página del modo lote.
+
+    Con fingerprint=True calcula page_fingerprint; si coincide con known
+    (el guardado para la URL) devuelve sólo {"fingerprint"}. Con
+    reduce_chars incluye el HTML reducido para el LLM cuando los datos
+    estructurados no alcanzan. Con route_confidence, llm_router decide
+    antes si hace falta el LLM ("route", con su "confidence") y qué se le
+    manda ("reduced").
+    html puede llegar como bytes UTF-8.
+    """
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", "replace")
+    fp = page_fingerprint(html) if fingerprint else None
+    if fp is not None and fp == known:
+        return {"fingerprint": fp}
+    matches = scan_price_matches(html)
+    visible = [(c.value, c.currency) for c in candidates_from_matches(matches)]
+    offers, structured, complete = structured_fast_path(html, visible, min_coverage)
+    route = reduced = confidence = None
+    if not complete and route_confidence is not None:
+        decision = route_page(html, route_confidence, reduce_chars)
+        route, reduced, confidence = decision.action, decision.payload, decision.confidence
+    elif not complete and reduce_chars:
+        reduced = reduce_html(html, max_chars=reduce_chars)
+    return {"fingerprint": fp, "matches": matches, "visible": visible, "offers": offers,
+            "structured": structured, "complete": complete, "route": route, "reduced": reduced,
+            "confidence": confidence}
+
+
+def _in_worker(html: str, kwargs: Dict, profile: bool) -> Dict:
+    # Lo medido en el proceso viaja con el resultado (metrics.take/merge)
+    if not profile:
+        return analyze_page(html, **kwargs)
+    metrics.enable()
+    page = analyze_page(html, **kwargs)
+    page["metrics"] = metrics.take()
+    return page
+
+
+def _analyze_shared(name: str, size: int, kwargs: Dict, profile: bool, errors: str = "surrogatepass") -> Dict:
+    shm = SharedMemory(name=name)
+    try:
+        with shm.buf[:size] as view:
+            html = str(view, "utf-8", errors)
+    finally:
+        shm.close()
+    return _in_worker(html, kwargs, profile)
+
+
+class CpuStage:
+    """analyze_page en workers procesos (0: uno por núcleo; 1: en el hilo
+    que llama, sin procesos). analyze() es bloqueante y thread-safe: cada
+    hilo de páginas espera su resultado mientras los demás siguen."""
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.stats = {"pages": 0, "shared": 0}
+        self._lock = threading.Lock()
+        # spawn: el proceso principal ya tiene hilos (descargas, LLM) y fork los copiaría a medias
+        self._pool = (ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+                      if self.workers > 1 else None)
+
+    def _count(self, shared: bool):
+        with self._lock:
+            self.stats["pages"] += 1
+            self.stats["shared"] += shared
+
+    def analyze(self, html: Union[str, bytes], **kwargs) -> Dict:
+        if self._pool is None:
+            self._count(False)
+            return analyze_page(html, **kwargs)
+        shared = len(html) >= SHARED_MIN_BYTES
+        self._count(shared)
+        profile = metrics.enabled()
+        if not shared:
+            page = self._pool.submit(_in_worker, html, kwargs, profile).result()
+        else:
+            # bytes de la red: UTF-8 sin validar, se decodifica con errors="replace"
+            raw = isinstance(html, bytes)
+            data = html if raw else html.encode("utf-8", "surrogatepass")
+            size = len(data)
+            shm = SharedMemory(create=True, size=size)
+            try:
+                shm.buf[:size] = data
+                del data
+                page = self._pool.submit(_analyze_shared, shm.name, size, kwargs, profile,
+                                         "replace" if raw else "surrogatepass").result()
+            finally:
+                shm.close()
+                shm.unlink()
+        if "metrics" in page:
+            metrics.merge(page.pop("metrics"))
+        return page
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+__all__ = ["CpuStage", "analyze_page"]
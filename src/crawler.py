@@ -0,0 +1,354 @@
+"""Crawler de listados: paginación y (opcional) fichas de producto.
+
+Las URLs descubiertas se normalizan y se guardan en una frontera SQLite
+(índice único por URL: deduplicación en disco, sin límite de memoria). Cada
+host tiene su propio intervalo entre requests (--crawl-delay o el
+Crawl-delay de robots.txt, el mayor) y se respeta robots.txt. Una URL se
+marca terminada recién cuando su resultado se escribió, así que tras una
+caída se retoma sin volver a descargar lo ya guardado.
+"""
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+from fetcher import Fetcher
+from html_reducer import _parse
+
+# Token con el que se buscan reglas propias en robots.txt (si no hay, rigen las de "*")
+ROBOTS_AGENT = "scraper-precios"
+
+TRACKING_PARAM_RE = re.compile(r"^(?:utm_\w+|fbclid|gclid|msclkid|mc_cid|mc_eid|_ga|add-to-cart|add_to_wishlist)$", re.I)
+PAGE_PATH_RE = re.compile(r"/page/(\d+)/?$")
+PAGE_PARAMS = {"page", "paged", "pg", "product-page"}
+PAGINATION_CLASS_RE = re.compile(r"pagination|page-numbers|nav-links|pager|paginado", re.I)
+PRODUCT_PATH_RE = re.compile(r"/(?:producto|productos|product|products|item|articulo|p)/[^/?#]+", re.I)
+PRODUCT_LINK_CLASSES = {"woocommerce-LoopProduct-link", "product-link", "product-title"}
+PRODUCT_CARD_CLASSES = {"product", "product-item", "product-card"}
+
+# Filas pendientes que se traen de la frontera por vez
+PENDING_BATCH = 500
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """URL absoluta canónica: esquema y host en minúsculas, sin puerto por
+    defecto, sin fragmento ni parámetros de tracking y con la query ordenada.
+    None si no es http(s)."""
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if scheme not in ("http", "https") or not host:
+        return None
+    if port is not None and port != {"http": 80, "https": 443}[scheme]:
+        host = f"{host}:{port}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAM_RE.match(k)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def listing_root(url: str) -> str:
+    """La URL del listado sin número de página (/page/N/, ?page=N, ...)."""
+    parts = urlsplit(url)
+    path = PAGE_PATH_RE.sub("/", parts.path)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in PAGE_PARAMS])
+    return urlunsplit((parts.scheme, parts.netloc, path, query, ""))
+
+
+def _page_number(url: str) -> Optional[int]:
+    parts = urlsplit(url)
+    m = PAGE_PATH_RE.search(parts.path)
+    if m:
+        return int(m.group(1))
+    for k, v in parse_qsl(parts.query):
+        if k in PAGE_PARAMS and v.isdigit():
+            return int(v)
+    return None
+
+
+def _is_page_link(el, target: str) -> bool:
+    rel = (el.get("rel") or "").lower().split()
+    if "next" in rel or "prev" in rel:
+        return True
+    if _page_number(target) is not None:
+        return True
+    for depth, anc in enumerate(el.iterancestors()):
+        if depth >= 3:
+            break
+        if PAGINATION_CLASS_RE.search(anc.get("class", "")):
+            return True
+    return False
+
+
+def _is_product_link(el, target: str) -> bool:
+    if PRODUCT_PATH_RE.search(urlsplit(target).path):
+        return True
+    if PRODUCT_LINK_CLASSES & set(el.get("class", "").split()):
+        return True
+    return any(PRODUCT_CARD_CLASSES & set(anc.get("class", "").split())
+               for anc in el.iterancestors("li", "article", "div"))
+
+
+def discover_links(html: str, url: str, products: bool = False) -> Tuple[List[str], List[str]]:
+    """(páginas del mismo listado, fichas de producto) enlazadas desde la
+    página, normalizadas y del mismo host."""
+    root = _parse(html)
+    base_el = root.find(".//base[@href]")
+    base = urljoin(url, base_el.get("href")) if base_el is not None else url
+    host = urlsplit(url).netloc
+    root_of_page = listing_root(url)
+    pages: Dict[str, None] = {}
+    items: Dict[str, None] = {}
+    for el in root.iter("a", "link"):
+        href = el.get("href")
+        if not href or href.startswith(("#", "javascript:", "mailto:", "tel:")):
+            continue
+        if el.tag == "link" and not {"next", "prev"} & set((el.get("rel") or "").lower().split()):
+            continue
+        target = normalize_url(href, base)
+        if target is None or urlsplit(target).netloc != host:
+            continue
+        if _is_page_link(el, target):
+            if listing_root(target) == root_of_page:
+                # /page/1/ es la misma página que la raíz del listado
+                pages[root_of_page if _page_number(target) == 1 else target] = None
+        elif products and el.tag == "a" and listing_root(target) != root_of_page and _is_product_link(el, target):
+            items[target] = None
+    pages.pop(url, None)
+    return list(pages), list(items)
+
+
+class CrawlFrontier:
+    """Frontera de URLs en SQLite (":memory:" si no se indica ruta).
+
+    Estados: pending → done | error, o blocked (robots.txt). Al reabrir una
+    frontera con URLs terminadas, las pendientes se retoman y las terminadas
+    no se vuelven a descargar.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        if path is None:
+            target = ":memory:"
+        else:
+            path = Path(path)
+            if path.suffix not in {".sqlite", ".db"}:
+                path.mkdir(parents=True, exist_ok=True)
+                path = path / "frontier.sqlite"
+            target = str(path)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(target, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS frontier (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_frontier_status ON frontier(status, seq)")
+        self._db.commit()
+        self._total = self._db.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+        self.resumed = self.count("done") + self.count("error") > 0
+
+    def add(self, urls: Iterable[str], kind: str, limit: Optional[int] = None) -> int:
+        """Agrega URLs nuevas (las ya conocidas se ignoran) sin superar limit
+        URLs en total. Devuelve cuántas se agregaron."""
+        now = time.time()
+        added = 0
+        with self._lock:
+            for url in urls:
+                if limit and self._total >= limit:
+                    break
+                cur = self._db.execute(
+                    "INSERT OR IGNORE INTO frontier (url, kind, updated_at) VALUES (?, ?, ?)", (url, kind, now)
+                )
+                added += cur.rowcount
+                self._total += cur.rowcount
+            self._db.commit()
+        return added
+
+    def pending(self, after: int = 0, limit: int = PENDING_BATCH) -> List[Tuple[int, str, str]]:
+        """(seq, url, kind) pendientes con seq > after, en orden de descubrimiento."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT seq, url, kind FROM frontier WHERE status = 'pending' AND seq > ? ORDER BY seq LIMIT ?",
+                (after, limit),
+            ).fetchall()
+
+    def mark(self, urls: Iterable[str], status: str):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("UPDATE frontier SET status = ?, updated_at = ? WHERE url = ?",
+                                 [(status, now, u) for u in urls])
+            self._db.commit()
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM frontier WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class _Host:
+    __slots__ = ("queue", "next_at", "in_flight", "robots", "delay")
+
+    def __init__(self, delay: float):
+        self.queue = deque()
+        self.next_at = 0.0
+        self.in_flight = 0
+        self.robots: Optional[RobotFileParser] = None  # None: aún no descargado
+        self.delay = delay
+
+
+class Crawler:
+    """Recorre listados a partir de URLs semilla usando un Fetcher.
+
+    crawl() genera (url, html, error) a medida que terminan las descargas,
+    igual que Fetcher.fetch_many, así que alimenta el mismo pipeline del modo
+    lote. Las páginas de listado se expanden (paginación y, con
+    follow_products, fichas de producto); las fichas no.
+
+    - delay: segundos mínimos entre el inicio de dos requests al mismo host.
+    - per_host: descargas simultáneas por host.
+    - max_pages: tope de URLs en la frontera (incluye las de corridas previas).
+    """
+
+    def __init__(self, fetcher: Fetcher, frontier: CrawlFrontier, delay: float = 1.0, per_host: int = 1,
+                 max_pages: int = 500, follow_products: bool = False, respect_robots: bool = True):
+        self.fetcher = fetcher
+        self.frontier = frontier
+        self.delay = delay
+        self.per_host = max(1, per_host)
+        self.max_pages = max_pages
+        self.follow_products = follow_products
+        self.respect_robots = respect_robots
+        self.stats: Dict[str, int] = {"fetched": 0, "discovered": 0, "blocked": 0}
+
+    def _load_robots(self, netloc: str, scheme: str) -> RobotFileParser:
+        parser = RobotFileParser(f"{scheme}://{netloc}/robots.txt")
+        try:
+            resp = self.fetcher.session.get(parser.url, timeout=self.fetcher.timeout)
+        except Exception:
+            parser.allow_all = True
+            return parser
+        if resp.status_code in (401, 403):
+            parser.disallow_all = True
+        elif resp.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(resp.text.splitlines())
+        return parser
+
+    def _expand(self, url: str, html: str | bytes):
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", "replace")
+        pages, items = discover_links(html, url, self.follow_products)
+        added = self.frontier.add(pages, "listing", self.max_pages)
+        if items:
+            added += self.frontier.add(items, "product", self.max_pages)
+        self.stats["discovered"] += added
+
+    def done(self, urls: Iterable[str], status: str = "done"):
+        """Marca URLs como terminadas (llamar después de guardar su resultado)."""
+        self.frontier.mark(urls, status)
+
+    def crawl(self, seeds: Iterable[str]) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        seeds = [u for u in (normalize_url(s) for s in seeds) if u]
+        self.frontier.add(seeds, "listing", max(self.max_pages, len(seeds)))
+        hosts: "OrderedDict[str, _Host]" = OrderedDict()
+        futures = {}
+        cursor = 0
+        queued = 0
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=self.fetcher.max_workers) as pool:
+            while True:
+                if not exhausted and queued < PENDING_BATCH // 2:
+                    rows = self.frontier.pending(cursor)
+                    exhausted = not rows
+                    for seq, url, kind in rows:
+                        cursor = seq
+                        netloc = urlsplit(url).netloc
+                        host = hosts.get(netloc)
+                        if host is None:
+                            host = hosts[netloc] = _Host(self.delay)
+                            if not self.respect_robots:
+                                host.robots = RobotFileParser()
+                                host.robots.allow_all = True
+                            else:
+                                futures[pool.submit(self._load_robots, netloc, urlsplit(url).scheme)] = ("robots", netloc, None)
+                        host.queue.append((url, kind))
+                        queued += 1
+
+                # Despacho round-robin: un request por host listo en cada vuelta
+                now = time.monotonic()
+                blocked = []
+                for netloc in list(hosts):
+                    host = hosts[netloc]
+                    if len(futures) >= self.fetcher.max_workers:
+                        break
+                    if not host.queue or host.robots is None or host.in_flight >= self.per_host or host.next_at > now:
+                        continue
+                    url, kind = host.queue.popleft()
+                    queued -= 1
+                    if not host.robots.can_fetch(ROBOTS_AGENT, url):
+                        blocked.append(url)
+                        continue
+                    host.next_at = now + host.delay
+                    host.in_flight += 1
+                    futures[pool.submit(self.fetcher.fetch, url)] = ("page", netloc, (url, kind))
+                    hosts.move_to_end(netloc)
+                if blocked:
+                    self.frontier.mark(blocked, "blocked")
+                    self.stats["blocked"] += len(blocked)
+                    continue
+
+                waiting = [h.next_at for h in hosts.values() if h.queue and h.robots is not None
+                           and h.in_flight < self.per_host]
+                if not futures:
+                    if not waiting and exhausted and not queued:
+                        return
+                    if waiting:
+                        time.sleep(max(0.0, min(waiting) - time.monotonic()))
+                    continue
+                timeout = None
+                if waiting and len(futures) < self.fetcher.max_workers:
+                    timeout = max(0.0, min(waiting) - time.monotonic())
+                finished, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    what, netloc, item = futures.pop(fut)
+                    host = hosts[netloc]
+                    if what == "robots":
+                        host.robots = fut.result()
+                        crawl_delay = host.robots.crawl_delay(ROBOTS_AGENT)
+                        if crawl_delay:
+                            host.delay = max(host.delay, float(crawl_delay))
+                        continue
+                    host.in_flight -= 1
+                    url, kind = item
+                    try:
+                        html, error = fut.result(), None
+                    except Exception as ex:
+                        html, error = None, ex
+                    self.stats["fetched"] += 1
+                    if html is not None and kind == "listing":
+                        self._expand(url, html)
+                        # Lo recién descubierto se lee en la próxima vuelta
+                        exhausted = False
+                    yield url, html, error
+
+
+__all__ = ["Crawler", "CrawlFrontier", "discover_links", "listing_root", "normalize_url"]
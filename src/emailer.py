@@ -3,6 +3,8 @@ import smtplib
 from email.message import EmailMessage
 from typing import Optional
 
+import metrics
+
 class EmailConfigError(RuntimeError):
     pass
 
@@ -33,7 +35,7 @@ def send_email_smtp(to: str, subject: str, html_body: str, text_body: Optional[s
     msg.set_content(text_body)
     msg.add_alternative(html_body, subtype="html")
 
-    with smtplib.SMTP(host, port) as server:
+    with metrics.timed("email"), smtplib.SMTP(host, port) as server:
         server.ehlo()
         server.starttls()
         server.login(user, password)
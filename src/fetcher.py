@@ -1,22 +1,305 @@
+import codecs
+import importlib.util
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain, zip_longest
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import httpx
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+
+import metrics
+from http_cache import CachedResponse, ResponseCache
+
+# Tope del cuerpo ya descomprimido por página: lo que sigue no se descarga
+MAX_HTML_BYTES = 16 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+# Bytes iniciales donde se busca <meta charset> (HTML lo exige en los primeros 1024)
+SNIFF_BYTES = 4096
+
+
+def _accept_encoding() -> str:
+    # requests/urllib3 y httpx decodifican br sólo con brotli (o brotlicffi) instalado
+    if any(importlib.util.find_spec(m) for m in ("brotli", "brotlicffi")):
+        return "gzip, deflate, br"
+    return "gzip, deflate"
+
+
+ACCEPT_ENCODING = _accept_encoding()
 
 DEFAULT_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0 Safari/537.36",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-    "Accept-Language": "es-ES,es;q=0.9,en;q=0.8"
+    "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
+    "Accept-Encoding": ACCEPT_ENCODING,
 }
 
+_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.I)
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+# Como los navegadores: una página declarada latin-1 se lee como windows-1252
+_ALIASES = {"iso8859-1": "cp1252"}
+
 class FetchError(Exception):
     pass
 
-def fetch_html(url: str, timeout: int = 20, headers: Optional[dict] = None) -> str:
-    h = DEFAULT_HEADERS.copy()
-    if headers:
-        h.update(headers)
-    resp = requests.get(url, headers=h, timeout=timeout)
-    if resp.status_code >= 400:
-        raise FetchError(f"Error HTTP {resp.status_code} al obtener {url}")
-    return resp.text
 
-__all__ = ["fetch_html", "FetchError"]
+def detect_charset(content_type: Optional[str], head: bytes) -> str:
+    """Charset del cuerpo: BOM, charset de Content-Type, <meta charset> en
+    head (los primeros bytes) o UTF-8. Nunca analiza el cuerpo completo
+    (requests.apparent_encoding lo recorre entero antes de decodificar)."""
+    for bom, name in _BOMS:
+        if head.startswith(bom):
+            return name
+    m = _CHARSET_RE.search(content_type or "")
+    label = m.group(1) if m else None
+    if label is None:
+        m = _META_CHARSET_RE.search(head[:SNIFF_BYTES])
+        label = m.group(1).decode("ascii", "ignore") if m else None
+    try:
+        name = codecs.lookup(label).name if label else "utf-8"
+    except LookupError:
+        name = "utf-8"
+    return _ALIASES.get(name, name)
+
+
+class _Body:
+    """Acumula los chunks del cuerpo descomprimido hasta max_bytes y los
+    decodifica una sola vez al terminar. Pico: unas 2 veces lo leído."""
+
+    def __init__(self, max_bytes: Optional[int]):
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.max_bytes = max_bytes
+        self.truncated = False
+
+    def add(self, chunk: bytes) -> bool:
+        """False al alcanzar el tope: hay que dejar de leer."""
+        if self.max_bytes is not None and self.size + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.size]
+            self.truncated = True
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        return not self.truncated
+
+    def _head(self) -> bytes:
+        head = b""
+        for chunk in self.chunks:
+            head += chunk[:SNIFF_BYTES - len(head)]
+            if len(head) >= SNIFF_BYTES:
+                break
+        return head
+
+    def finish(self, content_type: Optional[str], as_bytes: bool) -> Union[str, bytes]:
+        if self.truncated:
+            metrics.inc("fetch_truncated_total")
+        charset = detect_charset(content_type, self._head())
+        if as_bytes and charset in ("utf-8", "utf-8-sig"):
+            # Sin decodificar: quien lo lea decodifica con errors="replace"
+            data = b"".join(self.chunks)
+            self.chunks = []
+            return data[len(codecs.BOM_UTF8):] if charset == "utf-8-sig" else data
+        # Cada chunk se libera apenas se decodifica
+        decoder = codecs.getincrementaldecoder(charset)("replace")
+        chunks, self.chunks = self.chunks[::-1], []
+        parts = []
+        while chunks:
+            parts.append(decoder.decode(chunks.pop()))
+        parts.append(decoder.decode(b"", final=True))
+        text = "".join(parts)
+        return text.encode("utf-8") if as_bytes else text
+
+
+def _cached(entry: CachedResponse, as_bytes: bool) -> Union[str, bytes]:
+    return entry.data if as_bytes else entry.body
+
+
+def _new_session(pool_size: int = 10) -> requests.Session:
+    session = requests.Session()
+    # Keep-alive: las conexiones se reutilizan entre requests al mismo host
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+_default_session: Optional[requests.Session] = None
+_default_lock = threading.Lock()
+
+
+def _get_default_session() -> requests.Session:
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = _new_session()
+        return _default_session
+
+
+def fetch_html(url: str, timeout: int = 20, headers: Optional[dict] = None,
+               session: Optional[requests.Session] = None,
+               cache: Optional[ResponseCache] = None,
+               max_bytes: Optional[int] = MAX_HTML_BYTES, as_bytes: bool = False) -> Union[str, bytes]:
+    """HTML de url, descargado en streaming. Del cuerpo descomprimido se
+    leen como máximo max_bytes (None: sin tope) y se corta la conexión ahí.
+    Con as_bytes=True devuelve bytes UTF-8 sin decodificar a str (si la
+    página ya viene en UTF-8 no se decodifica en absoluto)."""
+    with metrics.timed("fetch"):
+        html = _fetch_html(url, timeout, headers, session, cache, max_bytes, as_bytes)
+    metrics.sizes("fetch", size_out=len(html))
+    return html
+
+
+def _fetch_html(url: str, timeout: int, headers: Optional[dict],
+                session: Optional[requests.Session], cache: Optional[ResponseCache],
+                max_bytes: Optional[int], as_bytes: bool) -> Union[str, bytes]:
+    s = session or _get_default_session()
+    entry = cache.get(url) if cache else None
+    if entry is not None:
+        if entry.is_fresh(cache.ttl):
+            cache.count("hits")
+            return _cached(entry, as_bytes)
+        headers = {**(headers or {}), **cache.conditional_headers(entry)}
+    with s.get(url, headers=headers, timeout=timeout, stream=True) as resp:
+        if resp.status_code == 304 and entry is not None:
+            cache.touch(url)
+            cache.count("revalidated")
+            return _cached(entry, as_bytes)
+        if resp.status_code >= 400:
+            raise FetchError(f"Error HTTP {resp.status_code} al obtener {url}")
+        body = _Body(max_bytes)
+        for chunk in resp.iter_content(READ_CHUNK_BYTES):
+            if not body.add(chunk):
+                break
+        html = body.finish(resp.headers.get("Content-Type"), as_bytes)
+        etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    if cache:
+        cache.count("misses")
+        # Un cuerpo cortado por el tope no se guarda: serviría la página a medias
+        if not body.truncated:
+            cache.put(url, html, etag, last_modified)
+    return html
+
+
+def new_async_client(max_connections: int = 100, timeout: float = 20) -> httpx.AsyncClient:
+    """Cliente httpx asíncrono con pool keep-alive, pensado para crearse una
+    vez (p. ej. al arrancar la app web) y compartirse entre requests."""
+    return httpx.AsyncClient(
+        headers=DEFAULT_HEADERS,
+        timeout=timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+
+async def fetch_html_async(url: str, client: httpx.AsyncClient, timeout: float = 20,
+                           headers: Optional[dict] = None,
+                           cache: Optional[ResponseCache] = None,
+                           max_bytes: Optional[int] = MAX_HTML_BYTES, as_bytes: bool = False) -> Union[str, bytes]:
+    """Versión asíncrona de fetch_html (mismo tope y decodificación)."""
+    with metrics.timed("fetch"):
+        html = await _fetch_html_async(url, client, timeout, headers, cache, max_bytes, as_bytes)
+    metrics.sizes("fetch", size_out=len(html))
+    return html
+
+
+async def _fetch_html_async(url: str, client: httpx.AsyncClient, timeout: float,
+                            headers: Optional[dict], cache: Optional[ResponseCache],
+                            max_bytes: Optional[int], as_bytes: bool) -> Union[str, bytes]:
+    entry = cache.get(url) if cache else None
+    if entry is not None:
+        if entry.is_fresh(cache.ttl):
+            cache.count("hits")
+            return _cached(entry, as_bytes)
+        headers = {**(headers or {}), **cache.conditional_headers(entry)}
+    async with client.stream("GET", url, headers=headers, timeout=timeout) as resp:
+        if resp.status_code == 304 and entry is not None:
+            cache.touch(url)
+            cache.count("revalidated")
+            return _cached(entry, as_bytes)
+        if resp.status_code >= 400:
+            raise FetchError(f"Error HTTP {resp.status_code} al obtener {url}")
+        body = _Body(max_bytes)
+        async for chunk in resp.aiter_bytes(READ_CHUNK_BYTES):
+            if not body.add(chunk):
+                break
+        html = body.finish(resp.headers.get("Content-Type"), as_bytes)
+        etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    if cache:
+        cache.count("misses")
+        # Un cuerpo cortado por el tope no se guarda: serviría la página a medias
+        if not body.truncated:
+            cache.put(url, html, etag, last_modified)
+    return html
+
+
+class Fetcher:
+    """Descarga concurrente con una sesión compartida (keep-alive).
+
+    - max_workers: límite global de descargas en paralelo.
+    - per_host: límite de descargas simultáneas contra un mismo host.
+    - cache: ResponseCache opcional compartido por todas las descargas.
+    - max_bytes / as_bytes: tope por página y salida en bytes UTF-8 (ver
+      fetch_html).
+    """
+
+    def __init__(self, max_workers: int = 16, per_host: int = 4, timeout: int = 20,
+                 headers: Optional[dict] = None, cache: Optional[ResponseCache] = None,
+                 max_bytes: Optional[int] = MAX_HTML_BYTES, as_bytes: bool = False):
+        self.max_workers = max(1, max_workers)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.as_bytes = as_bytes
+        self.session = _new_session(pool_size=self.max_workers)
+        if headers:
+            self.session.headers.update(headers)
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self._host_lock = threading.Lock()
+
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._host_lock:
+            return self._host_slots[host]
+
+    def fetch(self, url: str) -> Union[str, bytes]:
+        with self._slot(url):
+            return fetch_html(url, timeout=self.timeout, session=self.session, cache=self.cache,
+                              max_bytes=self.max_bytes, as_bytes=self.as_bytes)
+
+    @staticmethod
+    def _interleave_hosts(urls: Iterable[str]) -> List[str]:
+        # Round-robin por host para que un host con muchas URLs no acapare
+        # todos los workers esperando su semáforo.
+        by_host = defaultdict(list)
+        for u in urls:
+            by_host[urlsplit(u).netloc.lower()].append(u)
+        return [u for u in chain.from_iterable(zip_longest(*by_host.values())) if u is not None]
+
+    def fetch_many(self, urls: Iterable[str]) -> Iterator[Tuple[str, Union[str, bytes, None], Optional[Exception]]]:
+        """Genera (url, html, error) a medida que cada descarga termina."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch, u): u for u in self._interleave_hosts(urls)}
+            for fut in as_completed(futures):
+                url = futures[fut]
+                try:
+                    yield url, fut.result(), None
+                except Exception as ex:
+                    yield url, None, ex
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+__all__ = ["fetch_html", "fetch_html_async", "new_async_client", "detect_charset", "Fetcher",
+           "FetchError", "MAX_HTML_BYTES"]
@@ -0,0 +1,76 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+
+class FingerprintStore:
+    """Último resultado conocido por URL junto al fingerprint de su contenido
+    relevante (html_reducer.page_fingerprint).
+
+    Si una página vuelve con el mismo fingerprint y las mismas opciones de
+    extracción, el pipeline puede reutilizar el resultado guardado sin volver a
+    extraer ni llamar al LLM.
+    """
+
+    def __init__(self, path: str | Path):
+        path = Path(path)
+        if path.suffix != ".sqlite":
+            path.mkdir(parents=True, exist_ok=True)
+            path = path / "fingerprints.sqlite"
+        self.path = path
+        self.stats: Dict[str, int] = {"unchanged": 0, "changed": 0, "new": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                options TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                result TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (url, options)
+            )"""
+        )
+        self._db.commit()
+
+    def get(self, url: str, options: str = "") -> Optional[Tuple[str, Dict]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, result FROM pages WHERE url = ? AND options = ?", (url, options)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def lookup(self, url: str, fingerprint: str, options: str = "") -> Optional[Dict]:
+        """Devuelve el resultado guardado si el fingerprint coincide."""
+        prev = self.get(url, options)
+        if prev is None:
+            event = "new"
+        else:
+            event = "unchanged" if prev[0] == fingerprint else "changed"
+        with self._lock:
+            self.stats[event] += 1
+        metrics.inc("cache_events_total", cache="fingerprint", event=event)
+        return prev[1] if event == "unchanged" else None
+
+    def put(self, url: str, fingerprint: str, result: Dict, options: str = ""):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, options, fingerprint, result, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (url, options, fingerprint, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+__all__ = ["FingerprintStore"]
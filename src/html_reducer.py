@@ -1,22 +1,11 @@
+import hashlib
 import re
-from bs4 import BeautifulSoup, Comment
-
-# Palabras clave relacionadas con precios para priorizar bloques relevantes
-KEYWORDS_RE = re.compile(
-    r"precio|oferta|rebaja|ahorro|descuento|price|deal|sale|promo|desde|ver precio|\bUSD\b|\bEUR\b|\bMXN\b|\bARS\b|\bCLP\b|\bCOP\b|\bBOB\b|\bPEN\b|\bBRL\b|\bUYU\b|\bGTQ\b|\bCRC\b|S/\.|Bs\.?|[$€£]",
-    flags=re.IGNORECASE,
-)
-
-PRICE_RE = re.compile(
-    r"""
-    ([$€£]|S/\.|Bs\.?|USD\b|EUR\b|MXN\b|ARS\b|CLP\b|COP\b|BOB\b|PEN\b|BRL\b|UYU\b|GTQ\b|CRC\b)\s{0,3}
-        \d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d{2})?
-    |
-    \d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d{2})?\s{0,3}
-        (USD\b|EUR\b|MXN\b|ARS\b|CLP\b|COP\b|BOB\b|PEN\b|BRL\b|UYU\b|GTQ\b|CRC\b)
-    """,
-    flags=re.IGNORECASE | re.VERBOSE,
-)
+from bisect import bisect_left, bisect_right
+from html import escape
+from lxml import etree, html as lxml_html
+
+import metrics
+from price_scanner import has_price_signal, scan_bounds
 
 STRIP_TAGS = {
     "script",
@@ -38,119 +27,276 @@ STRIP_TAGS = {
     "meta",
 }
 
+STRIP_ATTRS = {"style", "class", "onclick", "onload", "id"}
+
+BLOCK_TAGS = {"section", "article", "div", "ul", "ol", "li", "table", "tr", "td", "th", "p", "span", "h1", "h2", "h3", "h4"}
+
+# Un bloque con a lo sumo estos precios y caracteres de texto se considera una
+# tarjeta de producto (precio normal + oferta + precio por unidad).
+CARD_MAX_PRICES = 3
+CARD_MAX_CHARS = 2000
+
+WS_RE = re.compile(r"\s+")
+
+_UTF8_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+
+def _parse(html: str):
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # str con declaración de encoding (<?xml ... encoding=...?>)
+        return lxml_html.document_fromstring(html.encode("utf-8"), parser=_UTF8_PARSER)
+    except etree.ParserError:
+        return lxml_html.document_fromstring("<html><body></body></html>")
+
+
+def _collapse_ws(text: str | None) -> str | None:
+    if not text:
+        return text
+    return WS_RE.sub(" ", text)
+
+
+def _clean_tree(root) -> None:
+    """Limpia el árbol en sitio (una sola pasada además del strip en C de lxml)."""
+    etree.strip_elements(root, etree.Comment, etree.ProcessingInstruction, *STRIP_TAGS, with_tail=False)
+
+    drop = []
+    for el in root.iter(etree.Element):
+        attrib = el.attrib
+        if attrib:
+            for attr in [a for a in attrib if a.startswith("data-") or a in STRIP_ATTRS]:
+                del attrib[attr]
+            if el.tag == "img" and ";base64," in attrib.get("src", ""):
+                drop.append(el)
+        el.text = _collapse_ws(el.text)
+        el.tail = _collapse_ws(el.tail)
+    for el in drop:
+        el.drop_tree()
+
+
+def _serialize(root) -> str:
+    return lxml_html.tostring(root, encoding="unicode")
+
+
+def _text(el, sep: str = " ") -> str:
+    return sep.join(t.strip() for t in el.itertext() if t.strip())
+
 
 def clean_html(html: str) -> str:
-    soup = BeautifulSoup(html, "lxml")
+    with metrics.timed("clean"):
+        root = _parse(html)
+        _clean_tree(root)
+        return _serialize(root)
 
-    # Remove comments
-    for c in soup.find_all(string=lambda s: isinstance(s, Comment)):
-        c.extract()
 
-    # Remove undesired tags
-    for tag in soup(STRIP_TAGS):
-        tag.decompose()
+class _RelevanceIndex:
+    """Índice de relevancia construido en una sola pasada sobre el árbol.
 
-    # Remove attributes that can be huge (styles, data-*, class)
-    for el in soup.find_all(True):
-        for attr in list(el.attrs.keys()):
-            if attr.startswith("data-") or attr in {"style", "class", "onclick", "onload", "id"}:
-                del el.attrs[attr]
+    Concatena el texto del documento una vez, guarda el rango [inicio, fin)
+    de cada elemento en ese texto y lo escanea una sola vez (scan_bounds).
+    Longitud de texto y cantidad de precios/keywords de cualquier nodo se
+    obtienen luego en O(log n) sin volver a recorrer su subárbol. Un precio
+    partido entre nodos hermanos ("Bs." + "870.00") se cuenta en el ancestro
+    común más cercano.
+    """
 
-    # Remove base64 images or long attributes
-    for img in soup.find_all("img"):
-        if img.has_attr("src") and ";base64," in img["src"]:
-            img.decompose()
+    def __init__(self, root):
+        parts = []
+        pos = 0
+        spans = {}
+        for event, el in etree.iterwalk(root, events=("start", "end")):
+            if event == "start":
+                spans[el] = pos
+                piece = el.text
+            else:
+                spans[el] = (spans[el], pos)
+                piece = el.tail if el is not root else None
+            if piece and not piece.isspace():
+                piece = piece.strip()
+                parts.append(piece)
+                pos += len(piece) + 1
+        self.text = " ".join(parts)
+        self.spans = spans
+        self.price_starts, self.price_ends, self.kw_starts, self.kw_ends = scan_bounds(self.text)
 
-    # Collapse whitespace in text nodes
-    for t in soup.find_all(string=True):
-        text = re.sub(r"\s+", " ", t)
-        t.replace_with(text)
+    @staticmethod
+    def _count(starts, ends, span) -> int:
+        # Los tokens del escáner no se solapan: starts y ends están ordenados,
+        # así que los contenidos en [s, e) son un rango contiguo.
+        s, e = span
+        return max(0, bisect_right(ends, e) - bisect_left(starts, s))
 
-    return str(soup)
+    def prices(self, el) -> int:
+        return self._count(self.price_starts, self.price_ends, self.spans[el])
 
+    def keywords(self, el) -> int:
+        return self._count(self.kw_starts, self.kw_ends, self.spans[el])
+
+    def text_len(self, el) -> int:
+        s, e = self.spans[el]
+        return e - s
+
+    def text_of(self, el) -> str:
+        s, e = self.spans[el]
+        return self.text[s:e].strip()
+
+
+def _select_blocks(index: _RelevanceIndex, body, hits, max_blocks: int):
+    """Selecciona de arriba hacia abajo el bloque más externo que ya es una
+    "tarjeta": pocos precios y poco texto. Los contenedores de listado (muchos
+    precios) se recorren hacia sus hijos; las ramas sin hits se descartan."""
+    selected = []
+    stack = [body]
+    while stack and len(selected) < max_blocks:
+        node = stack.pop()
+        n = hits(node)
+        if n == 0:
+            continue
+        kids = [c for c in node if isinstance(c.tag, str) and hits(c)]
+        is_card = n <= CARD_MAX_PRICES and index.text_len(node) <= CARD_MAX_CHARS
+        if node is not body and (is_card or not kids):
+            selected.append(node)
+            continue
+        stack.extend(reversed(kids))
+    return selected
 
-def _collect_relevant_blocks(html: str, max_blocks: int = 200):
-    soup = BeautifulSoup(html, "lxml")
-    body = soup.body or soup
-    blocks = []
 
-    def is_relevant(text: str) -> bool:
-        if not text:
-            return False
-        t = text.strip()
-        return bool(PRICE_RE.search(t) or KEYWORDS_RE.search(t))
-
-    # Consider block-level tags
-    candidates = body.find_all(["section", "article", "div", "ul", "ol", "li", "table", "tr", "td", "th", "p", "span", "h1", "h2", "h3", "h4"])
-    for node in candidates:
-        text = node.get_text(" ", strip=True)
-        if is_relevant(text):
-            # include limited sibling context
-            parent = node.parent if node.parent else body
-            wrapper = soup.new_tag("div")
-            # previous siblings
-            prev_count = 0
-            for sib in node.previous_siblings:
-                if prev_count >= 2:
-                    break
-                if getattr(sib, "name", None):
-                    wrapper.append(sib.extract())
-                    prev_count += 1
-            wrapper.append(node.extract())
-            # next siblings
-            next_count = 0
-            for sib in node.next_siblings:
-                if next_count >= 2:
-                    break
-                if getattr(sib, "name", None):
-                    wrapper.append(sib.extract())
-                    next_count += 1
-            blocks.append(str(wrapper))
-            if len(blocks) >= max_blocks:
-                break
-
-    # Deduplicate blocks by text signature
+def select_relevant_blocks(root, max_blocks: int = 200, index: _RelevanceIndex | None = None):
+    """Devuelve los elementos tarjeta (con precio) del árbol limpio, en orden
+    de documento. Si no hay precios, usa los bloques con keywords."""
+    body = root.find("body")
+    if body is None:
+        body = root
+    index = index or _RelevanceIndex(body)
+    blocks = _select_blocks(index, body, index.prices, max_blocks)
+    if not blocks:
+        blocks = _select_blocks(index, body, index.keywords, max_blocks)
+    return blocks
+
+
+def _collect_relevant_blocks(root, max_blocks: int = 200) -> str:
+    body = root.find("body")
+    if body is None:
+        body = root
+    index = _RelevanceIndex(body)
+    blocks = []
     seen = set()
-    unique_blocks = []
-    for b in blocks:
-        key = re.sub(r"\s+", " ", BeautifulSoup(b, "lxml").get_text(" ", strip=True))[:200]
+    for node in select_relevant_blocks(root, max_blocks, index):
+        key = index.text_of(node)[:200]
         if key not in seen:
             seen.add(key)
-            unique_blocks.append(b)
+            blocks.append(lxml_html.tostring(node, encoding="unicode", with_tail=False))
 
-    title = (soup.title.get_text(strip=True) if soup.title else "")
+    title_el = root.find(".//title")
+    title = escape(_text(title_el, "")) if title_el is not None else ""
     head = f"<head><meta charset='utf-8'><title>{title}</title></head>"
-    body = "\n".join(unique_blocks) if unique_blocks else soup.body.get_text(" ", strip=True)
-    return f"<html>{head}<body>{body}</body></html>"
+    body_html = "\n".join(blocks) if blocks else escape(index.text)
+    return f"<html>{head}<body>{body_html}</body></html>"
+
+
+class CleanPage:
+    """Página parseada, limpia e indexada una sola vez, para quien necesita
+    más que reduce_html (p. ej. llm_router).
+
+    Con keep_classes, classes guarda el atributo class de cada elemento
+    tal como venía: la limpieza lo borra del árbol.
+    """
+
+    __slots__ = ("root", "body", "index", "classes")
+
+    def __init__(self, html: str, keep_classes: bool = False):
+        self.root = _parse(html or "")
+        self.classes = None
+        if keep_classes:
+            self.classes = {el: el.get("class") or "" for el in self.root.iter(etree.Element)}
+        _clean_tree(self.root)
+        body = self.root.find("body")
+        self.body = body if body is not None else self.root
+        self.index = _RelevanceIndex(self.body)
+
+    def text_of(self, el) -> str:
+        return self.index.text_of(el)
+
+    def price_blocks(self, max_blocks: int = 200) -> list:
+        """Tarjetas con precio, como select_relevant_blocks pero sin recurrir
+        a las keywords."""
+        return _select_blocks(self.index, self.body, self.index.prices, max_blocks)
+
+    def reduce(self, max_chars: int) -> str:
+        """reduce_html sobre este árbol ya limpio (pasos 2-4)."""
+        return _reduce_tree(self.root, _serialize(self.root), max_chars)
+
+
+def page_fingerprint(html: str) -> str:
+    """Hash estable del contenido relevante para precios.
+
+    Se calcula sobre el texto de los bloques que elige select_relevant_blocks
+    (no sobre el HTML crudo), así que tokens CSRF, nonces, anuncios rotativos
+    o cambios de atributos no lo alteran.
+    """
+    with metrics.timed("fingerprint"):
+        return _fingerprint(html)
+
+
+def _fingerprint(html: str) -> str:
+    root = _parse(html or "")
+    _clean_tree(root)
+    body = root.find("body")
+    if body is None:
+        body = root
+    index = _RelevanceIndex(body)
+    blocks = select_relevant_blocks(root, index=index)
+    h = hashlib.sha256()
+    for text in ([index.text_of(b) for b in blocks] or [index.text]):
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
 
 
 def reduce_html(html: str, max_chars: int = 30000) -> str:
     """Reduce el HTML a como máximo max_chars priorizando secciones con precios.
 
+    El documento se parsea una sola vez con lxml y el mismo árbol limpio se
+    reutiliza en todas las etapas.
+
     Estrategia:
     1) Limpieza básica del DOM, remoción de scripts/estilos/atributos enormes.
-    2) Si aún excede, seleccionar bloques relevantes (precios/keywords) con poco contexto.
+    2) Si aún excede, seleccionar las tarjetas con precio (bloques mínimos que
+       contienen precios, vía un índice de relevancia de una sola pasada).
     3) Si aún excede, convertir a texto plano relevante (líneas con precio) y truncar.
     4) Fallback final: truncar duro a max_chars.
     """
     if not html:
         return ""
 
-    cleaned = clean_html(html)
+    with metrics.timed("clean"):
+        root = _parse(html)
+        _clean_tree(root)
+        cleaned = _serialize(root)
+    with metrics.timed("reduce"):
+        reduced = _reduce_tree(root, cleaned, max_chars)
+    if metrics.enabled():
+        metrics.sizes("reduce", len(html), len(reduced))
+        metrics.observe("reduction_ratio", len(reduced) / len(html))
+    return reduced
+
+
+def _reduce_tree(root, cleaned: str, max_chars: int) -> str:
+    """Pasos 2-4 de reduce_html sobre el árbol ya limpio."""
     if len(cleaned) <= max_chars:
         return cleaned
 
-    relevant_html = _collect_relevant_blocks(cleaned)
+    relevant_html = _collect_relevant_blocks(root)
     if len(relevant_html) <= max_chars:
         return relevant_html
 
     # Extract only relevant lines with small context
-    text = BeautifulSoup(cleaned, "lxml").get_text("\n", strip=True)
-    lines = [ln for ln in text.splitlines() if PRICE_RE.search(ln) or KEYWORDS_RE.search(ln)]
-    # Join with separators to keep some structure
-    text_only = ("\n---\n").join(lines)
+    lines = [ln for ln in (t.strip() for t in root.itertext()) if ln and has_price_signal(ln)]
     if not lines:
         return cleaned[:max_chars]
+    # Join with separators to keep some structure
+    text_only = escape(("\n---\n").join(lines), quote=False)
     payload = f"<html><head><meta charset='utf-8'></head><body><pre>{text_only}</pre></body></html>"
     if len(payload) <= max_chars:
         return payload
@@ -158,4 +304,4 @@ def reduce_html(html: str, max_chars: int = 30000) -> str:
     return payload[:max_chars]
 
 
-__all__ = ["reduce_html", "clean_html"]
+__all__ = ["reduce_html", "clean_html", "select_relevant_blocks", "page_fingerprint", "CleanPage"]
@@ -0,0 +1,127 @@
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import metrics
+
+
+@dataclass
+class CachedResponse:
+    data: bytes  # cuerpo en UTF-8
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    @property
+    def body(self) -> str:
+        return self.data.decode("utf-8", "replace")
+
+    def is_fresh(self, ttl: float) -> bool:
+        return (time.time() - self.stored_at) < ttl
+
+
+class ResponseCache:
+    """Caché HTTP persistente en SQLite con cuerpo comprimido (zlib).
+
+    - ttl: segundos durante los que una entrada se sirve sin tocar la red.
+      Pasado el TTL se revalida con If-None-Match / If-Modified-Since.
+    - max_bytes: tamaño máximo (comprimido); se desalojan las entradas
+      usadas hace más tiempo (LRU).
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 256 * 1024 * 1024, ttl: float = 24 * 3600):
+        path = Path(path)
+        if path.suffix != ".sqlite":
+            path.mkdir(parents=True, exist_ok=True)
+            path = path / "http_cache.sqlite"
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def count(self, event: str):
+        with self._lock:
+            self.stats[event] = self.stats.get(event, 0) + 1
+        metrics.inc("cache_events_total", cache="http", event=event)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        body, etag, last_modified, stored_at = row
+        return CachedResponse(zlib.decompress(body), etag, last_modified, stored_at)
+
+    def put(self, url: str, body: str | bytes, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """body: str o bytes ya en UTF-8 (se guardan tal cual)."""
+        blob = zlib.compress(body.encode("utf-8") if isinstance(body, str) else body, 6)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (url, body, size, etag, last_modified, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, blob, len(blob), etag, last_modified, now, now),
+            )
+            self._size += len(blob) - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def touch(self, url: str):
+        """Marca la entrada como revalidada (respuesta 304)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self._db.commit()
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            row = self._db.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._size = 0
+                return
+            self._db.execute("DELETE FROM responses WHERE url = ?", (row[0],))
+            self._size -= row[1]
+            self.stats["evictions"] += 1
+            metrics.inc("cache_events_total", cache="http", event="evictions")
+
+    def conditional_headers(self, entry: CachedResponse) -> Dict[str, str]:
+        h = {}
+        if entry.etag:
+            h["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            h["If-Modified-Since"] = entry.last_modified
+        return h
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+__all__ = ["ResponseCache", "CachedResponse"]
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class MemoryJobBackend:
+    """Estado de jobs en memoria del proceso; conserva los últimos max_jobs."""
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._in_flight: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _save(self, job: Dict):
+        self._jobs[job["id"]] = dict(job)
+        self._jobs.move_to_end(job["id"])
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def save(self, job: Dict):
+        with self._lock:
+            self._save(job)
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, key: str, job: Dict) -> Dict:
+        """Guarda job como el que está en curso para key, salvo que ya haya
+        otro: en ese caso devuelve ese otro sin guardar nada."""
+        with self._lock:
+            existing = self._jobs.get(self._in_flight.get(key, ""))
+            if existing is not None:
+                return dict(existing)
+            self._in_flight[key] = job["id"]
+            self._save(job)
+            return job
+
+    def release(self, key: str, job_id: str):
+        with self._lock:
+            if self._in_flight.get(key) == job_id:
+                del self._in_flight[key]
+
+    def close(self):
+        pass
+
+
+class SQLiteJobBackend:
+    """Estado de jobs en SQLite: sustituto local de un almacén tipo Redis,
+    visible desde varios procesos (p. ej. varios workers de uvicorn).
+
+    La tabla in_flight (clave job_key -> id) deduplica entre procesos; una
+    entrada con más de stale_after segundos se descarta, por si el proceso
+    que corría el job murió sin liberarla.
+    """
+
+    def __init__(self, path: str | Path, ttl: float = 24 * 3600, stale_after: float = 600):
+        path = Path(path)
+        if path.suffix != ".sqlite":
+            path.mkdir(parents=True, exist_ok=True)
+            path = path / "jobs.sqlite"
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS in_flight (key TEXT PRIMARY KEY, job_id TEXT NOT NULL, claimed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _save(self, job: Dict, now: float):
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (id, data, updated_at) VALUES (?, ?, ?)",
+            (job["id"], json.dumps(job, ensure_ascii=False), now),
+        )
+        self._db.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl,))
+
+    def save(self, job: Dict):
+        with self._lock:
+            self._save(job, time.time())
+            self._db.commit()
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def claim(self, key: str, job: Dict) -> Dict:
+        """Como MemoryJobBackend.claim, atómico también entre procesos."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE toma el lock de escritura antes de leer: dos procesos
+            # no pueden ver la clave libre a la vez
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM in_flight WHERE claimed_at < ?", (now - self.stale_after,))
+                row = self._db.execute(
+                    "SELECT j.data FROM in_flight f JOIN jobs j ON j.id = f.job_id WHERE f.key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO in_flight (key, job_id, claimed_at) VALUES (?, ?, ?)",
+                        (key, job["id"], now),
+                    )
+                    self._save(job, now)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return json.loads(row[0]) if row else job
+
+    def release(self, key: str, job_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM in_flight WHERE key = ? AND job_id = ?", (key, job_id))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def backend_from_url(url: Optional[str]):
+    """"memory" (por defecto) o "sqlite:/ruta"."""
+    if url and url.startswith("sqlite:"):
+        return SQLiteJobBackend(url[len("sqlite:"):])
+    return MemoryJobBackend()
+
+
+def job_key(params: Dict, scope: str = "") -> str:
+    return hashlib.sha256(json.dumps([params, scope], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class JobQueue:
+    """Cola de jobs en el event loop con un pool de workers asyncio.
+
+    submit() deduplica: mientras un job con los mismos parámetros está en cola
+    o corriendo, se devuelve su id en vez de crear otro. La deduplicación pasa
+    por el backend, así que con SQLite vale entre procesos. Los parámetros
+    `secret` (p. ej. una API key) se pasan al runner pero no se persisten;
+    `scope` (p. ej. un hash de esa key) separa la deduplicación entre
+    quienes no deben compartir jobs.
+    """
+
+    def __init__(self, runner: Callable[..., Awaitable[Dict]], backend=None, workers: int = 4):
+        self.runner = runner
+        self.backend = backend or MemoryJobBackend()
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.backend.close()
+
+    def submit(self, params: Dict, secret: Optional[Dict] = None, scope: str = "") -> Dict:
+        key = job_key(params, scope)
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "params": params,
+            "created_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        claimed = self.backend.claim(key, job)
+        if claimed["id"] != job["id"]:
+            return claimed
+        self._queue.put_nowait((key, job, secret or {}))
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.backend.load(job_id)
+
+    async def _worker(self):
+        while True:
+            key, job, secret = await self._queue.get()
+            job["status"] = RUNNING
+            self.backend.save(job)
+            try:
+                job["result"] = await self.runner(**job["params"], **secret)
+                job["status"] = DONE
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                job["status"] = FAILED
+                job["error"] = str(ex)
+            finally:
+                job["finished_at"] = time.time()
+                self.backend.save(job)
+                self.backend.release(key, job["id"])
+                self._queue.task_done()
+
+
+__all__ = ["JobQueue", "MemoryJobBackend", "SQLiteJobBackend", "backend_from_url"]
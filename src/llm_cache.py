@@ -0,0 +1,97 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+
+
+def cache_key(model: str, prompt_version: str, chunk: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, prompt_version, chunk):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMResultCache:
+    """Caché persistente (SQLite) de respuestas del LLM, direccionada por
+    contenido: la clave es sha256(modelo, versión del prompt, chunk).
+
+    Pensada para compartirse entre el CLI y la app web apuntando al mismo
+    directorio (modo WAL, varios procesos). max_bytes limita el tamaño
+    comprimido; se desalojan las entradas usadas hace más tiempo (LRU).
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 64 * 1024 * 1024):
+        path = Path(path)
+        if path.suffix != ".sqlite":
+            path.mkdir(parents=True, exist_ok=True)
+            path = path / "llm_cache.sqlite"
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results(accessed_at)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                metrics.inc("cache_events_total", cache="llm", event="misses")
+                return None
+            self.stats["hits"] += 1
+            metrics.inc("cache_events_total", cache="llm", event="hits")
+            self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, key: str, model: str, prices: List[Dict]):
+        blob = zlib.compress(json.dumps(prices, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, model, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, blob, len(blob), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Otro proceso puede escribir en la misma base: el total se lee de SQLite
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self.stats["evictions"] += 1
+            metrics.inc("cache_events_total", cache="llm", event="evictions")
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+__all__ = ["LLMResultCache", "cache_key"]
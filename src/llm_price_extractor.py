@@ -1,10 +1,22 @@
 import os
-import math
-from typing import List, Dict
-from openai import OpenAI
+import asyncio
+import json
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html import escape
+from typing import AsyncIterator, List, Dict, Iterator, Tuple
+from lxml import etree, html as lxml_html
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from dataclasses import dataclass
 import re
 
+import metrics
+from llm_cache import LLMResultCache, cache_key
+from price_scanner import BARE_AMOUNT_RE, has_price_signal
+
 SYSTEM_PROMPT = """Eres un asistente experto en extracción de precios desde HTML plano. Devuelves SOLO JSON válido.
 Extrae todos los precios, incluso aquellos en listas, tablas o texto corrido. 
 Normaliza:
@@ -20,6 +32,9 @@ Formato de salida:
 Si no hay precios devuelve {"prices": []}.
 No añadas comentarios ni texto fuera del JSON."""
 
+# Cambia automáticamente al editar el prompt: invalida la caché de resultados
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
 @dataclass
 class LLMPrice:
     raw: str
@@ -29,71 +44,339 @@ class LLMPrice:
 
 PRICE_VALUE_FIX = re.compile(r'"value"\s*:\s*"(\d+(?:\.\d+)?)"')
 
+# Aproximación de tokens (~4 caracteres por token en texto latino)
+CHARS_PER_TOKEN = 4
+# Tokens de respuesta reservados por request al descontar del presupuesto TPM
+COMPLETION_TOKENS_ESTIMATE = 1000
+
+# Presupuesto por chunk (~12000 caracteres)
+CHUNK_TOKENS = 3000
+
+TAG_RE = re.compile(r"<[^>]+>")
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """Presupuesto de tokens por minuto compartido entre hilos."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self, tokens: float) -> float:
+        """Descuenta tokens si alcanzan; si no, devuelve cuánto esperar."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: int):
+        tokens = min(float(tokens), self.capacity)
+        while (wait := self._try_take(tokens)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        tokens = min(float(tokens), self.capacity)
+        while (wait := self._try_take(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+
+def _has_price_signal(fragment: str) -> bool:
+    text = TAG_RE.sub(" ", fragment)
+    return has_price_signal(text) or BARE_AMOUNT_RE.search(text) is not None
+
+
+def _split_text(text: str, max_tokens: int) -> Iterator[str]:
+    """Corta texto largo en límites de línea y, si no alcanza, de palabra."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    for line in text.split("\n"):
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            yield line[:cut]
+            line = line[cut:].lstrip()
+        if line.strip():
+            yield line
+
+
+def _split_element(el, max_tokens: int, outer: bool = True) -> Iterator[str]:
+    """Genera fragmentos HTML de el que no exceden max_tokens, cortando sólo
+    entre elementos hijos. outer=False omite el propio tag (para <body>)."""
+    if outer:
+        fragment = lxml_html.tostring(el, encoding="unicode", with_tail=False)
+        if estimate_tokens(fragment) <= max_tokens:
+            yield fragment
+            return
+    children = [c for c in el if isinstance(c.tag, str)]
+    if not children:
+        yield from _split_text(escape(el.text_content(), quote=False), max_tokens)
+        return
+    if el.text and el.text.strip():
+        yield from _split_text(escape(el.text.strip(), quote=False), max_tokens)
+    for child in children:
+        yield from _split_element(child, max_tokens)
+        if child.tail and child.tail.strip():
+            yield from _split_text(escape(child.tail.strip(), quote=False), max_tokens)
+
+
+def _retry_after(ex: Exception) -> float | None:
+    response = getattr(ex, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
 class LLMExtractor:
-    def __init__(self, api_key: str | None = None, model: str = "gpt-4.1-mini"):
-        api_key = api_key or os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY no definido.")
-        self.client = OpenAI(api_key=api_key)
+    """Extractor de precios vía chat completions.
+
+    Los chunks se envían en paralelo por un pool compartido por todas las
+    llamadas a extract() de la misma instancia (también entre páginas en modo
+    lote):
+    - max_in_flight: requests simultáneos como máximo.
+    - tokens_per_minute: presupuesto TPM opcional (token bucket).
+    - max_retries: reintentos con backoff exponencial ante rate limit / errores
+      transitorios (respeta Retry-After).
+    - cache: LLMResultCache opcional; un chunk ya visto con el mismo modelo y
+      prompt no se vuelve a enviar.
+    - chunk_tokens: tamaño máximo estimado de cada chunk (ver _chunk).
+    - async_client: AsyncOpenAI compartido para extract_async (p. ej. creado
+      una vez al arrancar la app web). Con sólo async_client no se crea el
+      cliente síncrono.
+    """
+
+    def __init__(self, api_key: str | None = None, model: str = "gpt-4.1-mini",
+                 max_in_flight: int = 4, tokens_per_minute: int | None = None,
+                 max_retries: int = 5, base_url: str | None = None,
+                 cache: LLMResultCache | None = None, chunk_tokens: int = CHUNK_TOKENS,
+                 async_client: AsyncOpenAI | None = None):
+        self.client = None
+        if async_client is None:
+            api_key = api_key or os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY no definido.")
+            # Los reintentos se manejan aquí para coordinarlos con el presupuesto TPM
+            self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.async_client = async_client
         self.model = model
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        self._async_slots: asyncio.Semaphore | None = None
+
+    def _chunk(self, text: str, max_tokens: int | None = None) -> List[str]:
+        """Parte el HTML reducido en chunks de hasta max_tokens (estimados).
 
-    def _chunk(self, text: str, max_chars: int = 12000) -> List[str]:
-        text = re.sub(r"\s+", " ", text)
-        if len(text) <= max_chars:
-            return [text]
-        parts = []
-        chunk_count = math.ceil(len(text) / max_chars)
-        for i in range(chunk_count):
-            parts.append(text[i*max_chars:(i+1)*max_chars])
-        return parts
+        Corta sólo entre elementos: cada hijo de <body> (las tarjetas que
+        arma html_reducer) es una unidad que no se divide salvo que por sí
+        sola exceda el límite, en cuyo caso se baja a sus hijos. Las unidades
+        se empaquetan en orden y los chunks sin precios, montos sueltos ni
+        keywords se descartan (no se envían al modelo).
+        """
+        max_tokens = max_tokens or self.chunk_tokens
+        if not text or not text.strip():
+            return []
+        try:
+            root = lxml_html.document_fromstring(text)
+        except (etree.ParserError, ValueError):
+            units = list(_split_text(text, max_tokens))
+        else:
+            body = root.find("body")
+            units = list(_split_element(body if body is not None else root, max_tokens, outer=False))
+
+        chunks, current, used, signal = [], [], 0, False
+        for unit in units:
+            unit = re.sub(r"\s+", " ", unit).strip()
+            if not unit:
+                continue
+            tokens = estimate_tokens(unit)
+            if current and used + tokens > max_tokens:
+                if signal:
+                    chunks.append("\n".join(current))
+                current, used, signal = [], 0, False
+            current.append(unit)
+            used += tokens
+            signal = signal or _has_price_signal(unit)
+        if current and signal:
+            chunks.append("\n".join(current))
+        return chunks
 
     def _build_user_prompt(self, chunk: str) -> str:
         return f"HTML PLANO:\n{chunk}\n\nTarea: Extrae precios en JSON como se indicó."
 
-    def extract(self, html_text: str) -> Dict:
-        chunks = self._chunk(html_text)
-        merged: Dict[str, List[Dict]] = {"prices": []}
-        for idx, chunk in enumerate(chunks):
-            prompt = self._build_user_prompt(chunk)
-            response = self.client.chat.completions.create(
-                model=self.model,
-                temperature=0,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            content = response.choices[0].message.content.strip()
-            # Fix possible value quoted as string
-            content = PRICE_VALUE_FIX.sub(r'"value": \1', content)
-            # Ensure starts with '{'
-            if not content.startswith('{'):
-                first_brace = content.find('{')
-                if first_brace != -1:
-                    content = content[first_brace:]
-            # Try parse
-            import json
+    def _request(self, prompt: str) -> Dict:
+        return dict(
+            model=self.model,
+            temperature=0,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+        )
+
+    @staticmethod
+    def _prompt_tokens(prompt: str) -> int:
+        return estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt) + COMPLETION_TOKENS_ESTIMATE
+
+    @staticmethod
+    def _backoff(ex: Exception, attempt: int) -> float:
+        return _retry_after(ex) or min(60.0, 2 ** attempt) * (0.5 + random.random())
+
+    def _complete(self, prompt: str) -> str:
+        if self.bucket:
+            self.bucket.acquire(self._prompt_tokens(prompt))
+        metrics.observe("llm_prompt_tokens", self._prompt_tokens(prompt))
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.chat.completions.create(**self._request(prompt))
+                return (response.choices[0].message.content or "").strip()
+            except RETRYABLE_ERRORS as ex:
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(ex, attempt))
+        return ""
+
+    async def _complete_async(self, prompt: str) -> str:
+        if self.bucket:
+            await self.bucket.acquire_async(self._prompt_tokens(prompt))
+        metrics.observe("llm_prompt_tokens", self._prompt_tokens(prompt))
+        for attempt in range(self.max_retries + 1):
             try:
-                data = json.loads(content)
-            except json.JSONDecodeError:
-                data = {"prices": []}
-            for p in data.get("prices", []):
-                # basic normalization
-                if isinstance(p.get("value"), str):
-                    try:
-                        p["value"] = float(p["value"].replace(',', '.'))
-                    except ValueError:
-                        continue
-                merged["prices"].append(p)
-        # Deduplicate by (value,currency,raw)
+                response = await self.async_client.chat.completions.create(**self._request(prompt))
+                return (response.choices[0].message.content or "").strip()
+            except RETRYABLE_ERRORS as ex:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(ex, attempt))
+        return ""
+
+    @staticmethod
+    def _parse_prices(content: str) -> List[Dict]:
+        # Fix possible value quoted as string
+        content = PRICE_VALUE_FIX.sub(r'"value": \1', content)
+        # Ensure starts with '{'
+        if not content.startswith('{'):
+            first_brace = content.find('{')
+            if first_brace != -1:
+                content = content[first_brace:]
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            data = {"prices": []}
+        prices = []
+        for p in data.get("prices", []):
+            if not isinstance(p, dict):
+                continue
+            # basic normalization
+            if isinstance(p.get("value"), str):
+                try:
+                    p["value"] = float(p["value"].replace(',', '.'))
+                except ValueError:
+                    continue
+            # null u otro tipo: sin monto no hay precio
+            if not isinstance(p.get("value"), (int, float)) or isinstance(p["value"], bool):
+                continue
+            prices.append(p)
+        return prices
+
+    def _cached(self, chunk: str):
+        if self.cache is None:
+            return None, None
+        key = cache_key(self.model, PROMPT_VERSION, chunk)
+        return key, self.cache.get(key)
+
+    def _extract_chunk(self, chunk: str) -> List[Dict]:
+        key, cached = self._cached(chunk)
+        if cached is not None:
+            return cached
+        with metrics.timed("llm_chunk"):
+            prices = self._parse_prices(self._complete(self._build_user_prompt(chunk)))
+        if key is not None:
+            self.cache.put(key, self.model, prices)
+        return prices
+
+    async def _extract_chunk_async(self, chunk: str) -> List[Dict]:
+        key, cached = self._cached(chunk)
+        if cached is not None:
+            return cached
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_in_flight)
+        async with self._async_slots:
+            with metrics.timed("llm_chunk"):
+                content = await self._complete_async(self._build_user_prompt(chunk))
+        prices = self._parse_prices(content)
+        if key is not None:
+            self.cache.put(key, self.model, prices)
+        return prices
+
+    @staticmethod
+    def _merge(chunk_results: List[List[Dict]]) -> Dict:
+        # Deduplicate by (value,currency,raw), en orden de chunk: el resultado
+        # no depende del orden en que terminan los requests
         seen = set()
         dedup = []
-        for p in merged["prices"]:
-            key = (round(p.get("value", 0), 4), p.get("currency"), p.get("raw"))
-            if key not in seen:
-                seen.add(key)
-                dedup.append(p)
-        merged["prices"] = dedup
-        return merged
-
-__all__ = ["LLMExtractor"]
+        for prices in chunk_results:
+            for p in prices:
+                value = p.get("value")
+                # Entradas de caché anteriores pueden traer montos no numéricos
+                key = (round(value, 4) if isinstance(value, (int, float)) else None, p.get("currency"), p.get("raw"))
+                if key not in seen:
+                    seen.add(key)
+                    dedup.append(p)
+        return {"prices": dedup}
+
+    def extract(self, html_text: str) -> Dict:
+        futures = [self._pool.submit(self._extract_chunk, c) for c in self._chunk(html_text)]
+        return self._merge([f.result() for f in futures])
+
+    def extract_many(self, html_texts: List[str]) -> List[Dict]:
+        """Extrae varias páginas compartiendo el pool: los chunks de todas las
+        páginas compiten por los mismos max_in_flight slots."""
+        pages = [[self._pool.submit(self._extract_chunk, c) for c in self._chunk(h)] for h in html_texts]
+        return [self._merge([f.result() for f in futures]) for futures in pages]
+
+    async def extract_async(self, html_text: str) -> Dict:
+        """Como extract() pero sobre async_client, sin bloquear el event loop;
+        el chunking (CPU) corre en un hilo."""
+        chunks = await asyncio.to_thread(self._chunk, html_text)
+        results = await asyncio.gather(*(self._extract_chunk_async(c) for c in chunks))
+        return self._merge(list(results))
+
+    async def iter_extract_async(self, html_text: str) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        """Genera (índice de chunk, precios) a medida que cada chunk responde,
+        en orden de llegada (para streaming a la UI)."""
+        chunks = await asyncio.to_thread(self._chunk, html_text)
+        tasks = [asyncio.create_task(self._indexed(i, c)) for i, c in enumerate(chunks)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def _indexed(self, index: int, chunk: str) -> Tuple[int, List[Dict]]:
+        return index, await self._extract_chunk_async(chunk)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        if self.client is not None:
+            self.client.close()
+
+__all__ = ["LLMExtractor", "TokenBucket", "estimate_tokens"]
@@ -0,0 +1,154 @@
+"""Decide si una página necesita el LLM según la confianza de la heurística.
+
+Sobre el árbol limpio (el mismo que usa el reductor) se ubican las tarjetas
+de producto: los bloques con precio que elige el reductor, sus
+hermanos de la misma forma (mismo tag y clases en el HTML original) con
+precio o nombre, y los bloques repetidos que
+contienen montos sin moneda ("870.00") que la heurística no reconoce. Una
+tarjeta es confiable si la heurística encuentra en ella precios con moneda,
+tiene un nombre (texto además del precio) y no le quedan montos sueltos;
+una tarjeta sin precio ni montos (agotado, "consultar") también lo es. La
+confianza de la página es la fracción de tarjetas confiables:
+
+- >= min_confidence: el LLM se omite ("skip").
+- si las dudosas son pocas: sólo esas tarjetas, enteras y hasta
+  max_chars, van al LLM ("blocks").
+- si no (o si no hay tarjetas): la página reducida completa ("page").
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from lxml import html as lxml_html
+
+import metrics
+from html_reducer import CleanPage
+from price_extractor import extract_price_candidates
+from price_scanner import BARE_AMOUNT_RE, PRICE_PATTERN
+
+# Confianza mínima (fracción de tarjetas confiables) para omitir el LLM
+ROUTE_MIN_CONFIDENCE = 0.9
+# Con más de esta fracción de tarjetas dudosas se manda la página completa
+BLOCKS_MAX_FRACTION = 0.5
+# Hermanos de las tarjetas con precio que también cuentan como tarjetas
+MIN_SIBLING_CARDS = 2
+MAX_CARDS = 200
+
+_NAME_RE = re.compile(r"[^\W\d_]{3,}")
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    action: str  # "skip" | "blocks" | "page"
+    confidence: float
+    cards: int
+    uncertain: int
+    payload: Optional[str] = None  # HTML para el LLM (tarjetas dudosas o página reducida)
+
+
+def _signatures(page: CleanPage) -> dict:
+    """Forma (tag, clases originales) de cada elemento, para no confundir un
+    menú con un listado."""
+    return {el: (el.tag, frozenset(classes.split())) for el, classes in page.classes.items()}
+
+
+def _repeated(el, shapes: dict) -> bool:
+    parent = el.getparent()
+    if parent is None:
+        return False
+    sig = shapes.get(el)
+    return sum(1 for c in parent if shapes.get(c) == sig) >= MIN_SIBLING_CARDS
+
+
+def _named(text: str) -> bool:
+    return _NAME_RE.search(BARE_AMOUNT_RE.sub(" ", text)) is not None
+
+
+def _has_content(text: str) -> bool:
+    return bool(PRICE_PATTERN.search(text) or BARE_AMOUNT_RE.search(text)) or _named(text)
+
+
+def _cards(page: CleanPage, shapes: dict) -> List:
+    """Tarjetas en orden de documento: bloques con precio, sus hermanos de
+    la misma forma (con precio o nombre) y el bloque repetido (con nombre)
+    que contiene cada monto sin moneda fuera de ellas; body si un monto
+    suelto no está en ninguno."""
+    body = page.body
+    priced = page.price_blocks(MAX_CARDS)
+    cards = {el: None for el in priced}
+    by_parent = {}
+    for el in priced:
+        parent = el.getparent()
+        if parent is not None:
+            by_parent.setdefault(parent, set()).add(shapes.get(el))
+    for parent, kinds in by_parent.items():
+        siblings = [c for c in parent if isinstance(c.tag, str) and shapes.get(c) in kinds]
+        if len(siblings) >= MIN_SIBLING_CARDS:
+            for c in siblings:
+                if c in cards or _has_content(page.text_of(c)):
+                    cards.setdefault(c, None)
+    loose = []
+    for el in body.iter():
+        if not isinstance(el.tag, str):
+            continue
+        if el.text and BARE_AMOUNT_RE.search(el.text):
+            loose.append(el)
+        if el.tail and el is not body and BARE_AMOUNT_RE.search(el.tail):
+            loose.append(el.getparent())
+    for el in loose:
+        if el in cards or any(a in cards for a in el.iterancestors()):
+            continue
+        unit = el
+        while unit is not body and not (_repeated(unit, shapes) and _named(page.text_of(unit))):
+            unit = unit.getparent()
+        cards.setdefault(unit, None)
+    order = {el: i for i, el in enumerate(body.iter())}
+    return sorted(cards, key=order.__getitem__)
+
+
+def card_ok(text: str) -> bool:
+    """Una tarjeta cuyo precio la heurística ya resuelve bien."""
+    candidates = extract_price_candidates(text)
+    rest = PRICE_PATTERN.sub(" ", text)
+    if BARE_AMOUNT_RE.search(rest) or any(c.currency is None for c in candidates):
+        return False
+    return not candidates or bool(_NAME_RE.search(rest))
+
+
+def _blocks_payload(uncertain: List, max_chars: int) -> Optional[str]:
+    """Tarjetas dudosas completas hasta max_chars; None si ni la primera entra."""
+    head, tail = "<html><head><meta charset='utf-8'></head><body>", "</body></html>"
+    parts, size = [], len(head) + len(tail)
+    for card in uncertain:
+        part = lxml_html.tostring(card, encoding="unicode", with_tail=False)
+        if size + len(part) > max_chars:
+            break
+        parts.append(part)
+        size += len(part)
+    return head + "".join(parts) + tail if parts else None
+
+
+def route_page(html: str, min_confidence: float = ROUTE_MIN_CONFIDENCE, max_chars: Optional[int] = 30000) -> Route:
+    """Decide qué mandar al LLM. payload es None con "skip" o sin max_chars
+    (cuando el LLM puede evitarse igual, p. ej. con una plantilla)."""
+    with metrics.timed("route"):
+        page = CleanPage(html, keep_classes=True)
+        cards = _cards(page, _signatures(page))
+        uncertain = [c for c in cards if not card_ok(page.text_of(c))]
+        confidence = 1 - len(uncertain) / len(cards) if cards else 0.0
+        blocks = bool(cards) and page.body not in uncertain and len(uncertain) <= BLOCKS_MAX_FRACTION * len(cards)
+        payload = _blocks_payload(uncertain, max_chars) if blocks and max_chars else None
+        if cards and confidence >= min_confidence:
+            route = Route("skip", confidence, len(cards), len(uncertain))
+        elif not max_chars:
+            route = Route("blocks" if blocks else "page", confidence, len(cards), len(uncertain))
+        elif payload:
+            route = Route("blocks", confidence, len(cards), len(uncertain), payload)
+        else:
+            # Se reutiliza el árbol ya limpio
+            route = Route("page", confidence, len(cards), len(uncertain), page.reduce(max_chars))
+    metrics.inc("llm_routes_total", action=route.action)
+    return route
+
+
+__all__ = ["Route", "route_page", "card_ok", "ROUTE_MIN_CONFIDENCE"]
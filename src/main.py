@@ -1,11 +1,25 @@
 import os
+import sys
 import json
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from fetcher import fetch_html
-from price_extractor import extract_prices_from_html
+import metrics
+from fetcher import MAX_HTML_BYTES, fetch_html, Fetcher
+from http_cache import ResponseCache
+from price_table import PriceTable
+from price_batch import PriceBatch
 from llm_price_extractor import LLMExtractor
+from llm_cache import LLMResultCache
+from llm_router import ROUTE_MIN_CONFIDENCE
 from html_reducer import reduce_html, clean_html
+from cpu_stage import CpuStage, analyze_page
+from crawler import CrawlFrontier, Crawler
+from fingerprint_store import FingerprintStore
+from price_history import PriceHistory
+from product_matcher import MATCH_THRESHOLD, ProductIndex
+from site_templates import TemplateStore, site_key
 try:
     from dotenv import load_dotenv
     load_dotenv()  # Carga variables desde .env si existe
@@ -19,63 +33,455 @@ except Exception:
 2. Extrae precios heurísticos rápidos.
 3. (Opcional) Usa LLM para mayor precisión/contexto.
 4. Fusiona y deduplica.
+
+Modo lote (--urls-file): descarga concurrente y escribe un JSON por línea
+(NDJSON) a medida que termina cada página; los precios se normalizan y
+deduplican en bloques de páginas (price_batch).
 """
 
-def merge_results(heuristic: list, llm: dict | None) -> dict:
-    merged = {"prices": []}
-    seen = set()
-    for p in heuristic:
-        key = (round(p.get("value", 0), 4), p.get("currency"), p.get("raw"))
-        if key not in seen:
-            seen.add(key)
-            merged["prices"].append(p)
-    if llm:
-        for p in llm.get("prices", []):
-            key = (round(p.get("value", 0), 4), p.get("currency"), p.get("raw"))
-            if key not in seen:
-                seen.add(key)
-                merged["prices"].append(p)
-    return merged
+def merge_prices(heuristic: PriceTable, llm: dict | None, structured: list | None = None) -> PriceTable:
+    """Heurística + precios de datos estructurados sin equivalente visible +
+    precios del LLM, deduplicados por (valor, moneda, raw)."""
+    with metrics.timed("merge"):
+        return PriceTable.merge(heuristic, PriceTable.from_dicts(structured) if structured else None,
+                                PriceTable.from_dicts(llm.get("prices", [])) if llm else None)
+
+def merge_results(heuristic: PriceTable | list, llm: dict | None, structured: list | None = None) -> dict:
+    """Como merge_prices, en el formato JSON de salida ({"prices": [dicts]})."""
+    if not isinstance(heuristic, PriceTable):
+        heuristic = PriceTable.from_dicts(heuristic)
+    return {"prices": merge_prices(heuristic, llm, structured).to_dicts()}
+
+def _with_offers(result: dict, offers: list) -> dict:
+    if offers:
+        result["offers"] = [o.to_dict() for o in offers]
+    return result
+
+def extraction_options(model: str | None, max_chars: int, route_confidence: float | None = None,
+                       min_coverage: float = 1.0, templates: bool = False) -> str:
+    """Identifica la configuración de extracción (model=None: sólo heurística).
+    Un resultado guardado sólo se reutiliza si se obtuvo con las mismas opciones:
+    modelo, max_chars y lo que decide si se omite el LLM (ruteo, cobertura de
+    datos estructurados, plantillas)."""
+    if not model:
+        return "heuristic"
+    route = "off" if route_confidence is None else f"{route_confidence:g}"
+    return f"llm:{model}:{max_chars}:route={route}:structured={min_coverage:g}:templates={int(templates)}"
+
+
+def _llm_prices(html: str, url: str | None, visible: list, extractor: LLMExtractor, max_chars: int,
+                templates: TemplateStore | None = None, reduced: str | None = None,
+                route: str | None = None, details: dict | None = None) -> list:
+    """Precios del LLM, o de la plantilla aprendida para el dominio si su
+    confianza alcanza; cada respuesta del LLM actualiza la plantilla.
+    reduced: HTML ya reducido (etapa CPU del modo lote). route: decisión de
+    llm_router; con "skip" la heurística alcanza y no se llama a nada, con
+    "blocks" reduced tiene sólo las tarjetas dudosas y la respuesta no se
+    usa para aprender la plantilla. details (ver process_html) recibe lo
+    que se hizo."""
+    if details is None:
+        details = {}
+    if route == "skip":
+        return []
+    if templates is not None and url:
+        prices = templates.extract(url, html, visible)
+        if prices is not None:
+            details.update(skipped="template", template_prices=len(prices))
+            return prices
+    if reduced is None:
+        # Sin payload del ruteo (había plantilla): va la página reducida completa
+        reduced, route = reduce_html(html, max_chars=max_chars), None
+    details.update(llm_input=reduced, route=route)
+    prices = extractor.extract(reduced).get("prices", [])
+    if templates is not None and url and route != "blocks":
+        details["learned"] = templates.learn(url, html, prices, visible)
+    return prices
+
+
+def process_html(html: str, extractor: LLMExtractor | None = None, max_chars: int = 30000,
+                 url: str | None = None, store: FingerprintStore | None = None,
+                 refresh: bool = False, min_coverage: float = 1.0,
+                 templates: TemplateStore | None = None, route_confidence: float | None = None,
+                 details: dict | None = None) -> dict:
+    """Una página por el mismo camino que el modo lote (_scan_page y
+    _finish_block, en el hilo que llama): heurística + datos estructurados +
+    (opcional) LLM. El LLM se omite si los datos estructurados cubren
+    min_coverage de los precios visibles, si con route_confidence la
+    heurística resuelve esa fracción de las tarjetas de producto
+    (llm_router; si no, puede mandar sólo las dudosas), o si la plantilla
+    aprendida del dominio (templates, con url) alcanza su umbral.
+    Con store y url, si el contenido relevante no cambió desde la última
+    corrida se devuelve el resultado guardado con "unchanged": True, sin
+    extraer de nuevo (refresh=True fuerza la extracción y sólo actualiza el
+    store).
+
+    details, si se pasa, recibe lo que se hizo (para el modo de una URL):
+    "offers", "skipped" ("structured", "heuristic" o "template"),
+    "template_prices", "confidence" del ruteo, "llm_input" (HTML enviado al
+    LLM), "route" y "learned"."""
+    if not url:
+        store = templates = None
+    scanned = _scan(url, html, extractor, max_chars, store, refresh, min_coverage, templates, None,
+                    route_confidence, details)
+    if "matches" in scanned:
+        scanned = _finish_block([scanned], store)[0]
+    del scanned["url"]
+    return scanned
+
+
+def _read_urls(path: str) -> list:
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        return [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _open_cache(args) -> ResponseCache | None:
+    if not args.cache_dir:
+        return None
+    return ResponseCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024), ttl=args.cache_ttl)
+
+
+def _report_cache(cache: ResponseCache | None):
+    if cache is not None:
+        s = cache.stats
+        print(f"Caché HTTP: {s['hits']} hits, {s['revalidated']} revalidados (304), "
+              f"{s['misses']} misses, {s['evictions']} desalojados", file=sys.stderr)
+        cache.close()
+
+
+def _new_extractor(args, api_key: str | None) -> LLMExtractor:
+    llm_cache = LLMResultCache(args.llm_cache_dir) if args.llm_cache_dir else None
+    return LLMExtractor(api_key=api_key, model=args.model, max_in_flight=args.llm_concurrency,
+                        tokens_per_minute=args.llm_tpm, cache=llm_cache)
+
+
+def _close_extractor(extractor: LLMExtractor):
+    extractor.close()
+    if extractor.cache is not None:
+        s = extractor.cache.stats
+        print(f"Caché LLM: {s['hits']} hits, {s['misses']} misses, {s['evictions']} desalojados", file=sys.stderr)
+        extractor.cache.close()
+
+
+def _open_store(args) -> FingerprintStore | None:
+    return FingerprintStore(args.state_dir) if args.state_dir else None
+
+
+def _open_templates(args) -> TemplateStore | None:
+    if not (args.llm and args.templates_db):
+        return None
+    return TemplateStore(args.templates_db, min_confidence=args.template_min_confidence)
+
+
+def _report_templates(templates: TemplateStore | None):
+    if templates is not None:
+        s = templates.stats
+        print(f"Plantillas: {s['hits']} páginas sin LLM, {s['misses']} con confianza baja, "
+              f"{s['unknown']} sin plantilla, {s['learned']} aprendidas", file=sys.stderr)
+        templates.close()
+
+
+def _open_products(args) -> ProductIndex | None:
+    return ProductIndex(args.products_db, threshold=args.product_threshold) if args.products_db else None
+
+
+def _report_products(products: ProductIndex | None):
+    if products is not None:
+        s = products.stats
+        print(f"Productos: {s['exact']} exactos, {s['fuzzy']} por similitud, {s['new']} nuevos "
+              f"({len(products)} en el índice)", file=sys.stderr)
+        products.close()
+
+
+def _max_bytes(args) -> int | None:
+    return int(args.max_page_mb * 1024 * 1024) if args.max_page_mb > 0 else None
+
+
+def _report_profile(args):
+    if args.profile:
+        print("Perfil por etapa:\n" + metrics.summary(), file=sys.stderr)
+
+
+def _report_store(store: FingerprintStore | None):
+    if store is not None:
+        s = store.stats
+        print(f"Cambios: {s['unchanged']} sin cambios, {s['changed']} modificadas, {s['new']} nuevas", file=sys.stderr)
+        store.close()
+
+
+def _scan_page(url: str, html: str | bytes | None, error: Exception | None,
+               extractor: LLMExtractor | None, max_chars: int,
+               store: FingerprintStore | None = None, refresh: bool = False,
+               min_coverage: float = 1.0, templates: TemplateStore | None = None,
+               cpu: CpuStage | None = None, route_confidence: float | None = None) -> dict:
+    """Parte por página del modo lote: fingerprint, matches de precio sin
+    normalizar, datos estructurados, ruteo (route_confidence) y LLM (o
+    plantilla del dominio). La parte CPU corre en cpu (pool de procesos) si
+    se indica. La normalización y
+    deduplicación se hacen por bloques de páginas en _finish_block."""
+    if error is None:
+        try:
+            return _scan(url, html, extractor, max_chars, store, refresh, min_coverage, templates, cpu,
+                         route_confidence)
+        except Exception as ex:
+            error = ex
+    return {"url": url, "error": str(error)}
+
+
+def _scan(url: str | None, html: str | bytes, extractor: LLMExtractor | None, max_chars: int,
+          store: FingerprintStore | None, refresh: bool, min_coverage: float,
+          templates: TemplateStore | None, cpu: CpuStage | None, route_confidence: float | None,
+          details: dict | None = None) -> dict:
+    """_scan_page sin capturar errores (process_html los deja propagar)."""
+    options = known = None
+    if store is not None:
+        options = extraction_options(extractor.model if extractor is not None else None, max_chars,
+                                     route_confidence, min_coverage, templates is not None)
+        saved = None if refresh else store.get(url, options)
+        known = saved[0] if saved is not None else None
+    # Se reduce junto con el resto sólo si no hay plantilla que pueda evitar el LLM
+    reduce_chars = None
+    if extractor is not None and (templates is None or templates.get(site_key(url)) is None):
+        reduce_chars = max_chars
+    if extractor is None:
+        route_confidence = None
+    analyze = cpu.analyze if cpu is not None else analyze_page
+    page = analyze(html, min_coverage=min_coverage, fingerprint=store is not None,
+                   known=known, reduce_chars=reduce_chars, route_confidence=route_confidence)
+    fingerprint = page["fingerprint"]
+    if store is not None and not refresh:
+        previous = store.lookup(url, fingerprint, options)
+        if previous is not None:
+            return {**previous, "url": url, "unchanged": True}
+        if "matches" not in page:
+            # El resultado guardado cambió entre get() y lookup()
+            page = analyze(html, min_coverage=min_coverage, fingerprint=True, reduce_chars=reduce_chars,
+                           route_confidence=route_confidence)
+    if details is not None:
+        details.update(offers=len(page["offers"]), confidence=page["confidence"])
+        if extractor is not None and page["complete"]:
+            details["skipped"] = "structured"
+        elif page["route"] == "skip":
+            details["skipped"] = "heuristic"
+    llm_prices = None
+    if extractor is not None and not page["complete"]:
+        if isinstance(html, bytes) and page["route"] != "skip":
+            # Sólo la plantilla o el LLM necesitan el texto en este proceso
+            html = html.decode("utf-8", "replace")
+        llm_prices = _llm_prices(html, url, page["visible"], extractor, max_chars, templates,
+                                 page["reduced"], page["route"], details)
+    return {"url": url, "matches": page["matches"], "llm": page["structured"] + (llm_prices or []),
+            "offers": page["offers"], "fingerprint": fingerprint, "options": options}
+
+
+def _finish_block(scanned: list, store: FingerprintStore | None = None) -> list:
+    """Normaliza montos/monedas y deduplica (heurística + datos estructurados
+    + LLM) los precios de un bloque de páginas en lote, con el mismo
+    resultado que merge_results página por página."""
+    with metrics.timed("merge_block"):
+        batch = PriceBatch.from_matches([s["matches"] for s in scanned]).merge([s["llm"] for s in scanned])
+    records = []
+    for s, prices in zip(scanned, batch.iter_pages()):
+        result = _with_offers({"prices": prices}, s["offers"])
+        if s["fingerprint"] is not None:
+            store.put(s["url"], s["fingerprint"], result, s["options"])
+        records.append({"url": s["url"], **result})
+    return records
+
+
+NORMALIZE_BATCH_PAGES = 256
+# Un bloque incompleto se escribe igual tras estos segundos (crawls lentos por
+# la cortesía entre requests: resultados visibles y retomables antes)
+NORMALIZE_BATCH_SECONDS = 2.0
+HISTORY_BATCH_PAGES = 500
+
+
+def run_batch(args, api_key: str | None, cache: ResponseCache | None = None,
+              store: FingerprintStore | None = None, history: PriceHistory | None = None,
+              templates: TemplateStore | None = None, products: ProductIndex | None = None):
+    urls = _read_urls(args.urls_file) if args.urls_file else [args.url]
+    frontier = CrawlFrontier(args.crawl_state) if args.crawl else None
+    if frontier is not None:
+        print(f"Crawl desde {len(urls)} URLs (máx. {args.max_pages} páginas, {args.crawl_delay} s entre requests por host)"
+              + (", retomando la corrida anterior" if frontier.resumed else "") + "...", file=sys.stderr)
+    else:
+        print(f"Procesando {len(urls)} URLs (concurrencia {args.concurrency}, por host {args.per_host})...", file=sys.stderr)
+    extractor = _new_extractor(args, api_key) if args.llm else None
+    ok = failed = 0
+    # Al retomar un crawl se agrega al NDJSON de la corrida interrumpida
+    mode = "a" if frontier is not None and frontier.resumed else "w"
+    # Las páginas se procesan en paralelo; el extractor limita los requests LLM
+    # en vuelo de todas ellas con un único pool.
+    # Etapa I/O (descargas, LLM) en hilos; etapa CPU (parseo, extracción,
+    # reducción) en args.workers procesos. Cada hilo de páginas espera su
+    # resultado CPU, así que hay hilos de sobra para mantener ocupados a todos.
+    # Con procesos las páginas llegan como bytes UTF-8 y se decodifican allá.
+    with CpuStage(args.workers) as cpu, \
+            Fetcher(max_workers=args.concurrency, per_host=args.per_host, cache=cache,
+                    max_bytes=_max_bytes(args), as_bytes=cpu.workers > 1) as fetcher, \
+            ThreadPoolExecutor(max_workers=args.concurrency + cpu.workers) as pages, \
+            open(args.output, mode, encoding="utf-8") as out:
+        crawler = None
+        if frontier is not None:
+            crawler = Crawler(fetcher, frontier, delay=args.crawl_delay, per_host=args.per_host,
+                              max_pages=args.max_pages, follow_products=args.crawl_products,
+                              respect_robots=not args.ignore_robots)
+
+        # Todas las observaciones de la corrida comparten timestamp; se insertan
+        # en bloques de HISTORY_BATCH_PAGES páginas por transacción.
+        run_ts = int(time.time())
+        to_record = []
+
+        scanned = []
+
+        def write(records):
+            nonlocal ok, failed
+            if products is not None:
+                products.annotate(r for r in records if "error" not in r)
+            for record in records:
+                if "error" in record:
+                    failed += 1
+                else:
+                    ok += 1
+                    to_record.append((record["url"], record["prices"]))
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if crawler is not None:
+                # Terminadas sólo una vez escritas: tras una caída no se re-descargan
+                crawler.done([r["url"] for r in records if "error" not in r])
+                crawler.done([r["url"] for r in records if "error" in r], "error")
+            if history is not None and len(to_record) >= HISTORY_BATCH_PAGES:
+                history.record_many(to_record, ts=run_ts)
+                to_record.clear()
+
+        block_started = time.monotonic()
+
+        def emit(done):
+            nonlocal block_started
+            ready = []
+            for fut in done:
+                record = fut.result()
+                if "matches" in record:
+                    if not scanned:
+                        block_started = time.monotonic()
+                    scanned.append(record)
+                else:
+                    ready.append(record)
+            if scanned and (len(scanned) >= NORMALIZE_BATCH_PAGES
+                            or time.monotonic() - block_started >= NORMALIZE_BATCH_SECONDS):
+                ready += _finish_block(scanned, store)
+                scanned.clear()
+            write(ready)
+
+        pending = set()
+        source = crawler.crawl(urls) if crawler is not None else fetcher.fetch_many(urls)
+        for url, html, error in source:
+            pending.add(pages.submit(_scan_page, url, html, error, extractor, args.max_chars,
+                                     store, args.force, args.structured_min_coverage, templates, cpu,
+                                     args.route_min_confidence))
+            done = {f for f in pending if f.done()}
+            pending -= done
+            emit(done)
+        for fut in as_completed(pending):
+            emit([fut])
+        if scanned:
+            write(_finish_block(scanned, store))
+        if history is not None and to_record:
+            history.record_many(to_record, ts=run_ts)
+    if extractor is not None:
+        _close_extractor(extractor)
+    print(f"Listo: {ok} páginas OK, {failed} con error. Guardado en {args.output}", file=sys.stderr)
+    if frontier is not None:
+        s = crawler.stats
+        print(f"Crawl: {s['fetched']} descargadas, {s['discovered']} URLs nuevas, "
+              f"{s['blocked']} bloqueadas por robots.txt, {frontier.count('pending')} pendientes", file=sys.stderr)
+        frontier.close()
+
 
 def main():
     parser = argparse.ArgumentParser(description="Extracción de precios desde una página web usando heurística y LLM.")
-    parser.add_argument("url", help="URL a procesar")
+    parser.add_argument("url", nargs="?", help="URL a procesar")
+    parser.add_argument("--urls-file", default=None, help="Archivo con una URL por línea ('-' para stdin); activa el modo lote")
+    parser.add_argument("--concurrency", type=int, default=16, help="Descargas simultáneas en modo lote")
+    parser.add_argument("--workers", type=int, default=0, help="Procesos para parseo y extracción en modo lote (0 = uno por núcleo, 1 = sin procesos)")
+    parser.add_argument("--per-host", type=int, default=4, help="Descargas simultáneas por host en modo lote")
+    parser.add_argument("--crawl", action="store_true", help="Recorrer la paginación de la URL (o de las de --urls-file) y procesar cada página en modo lote")
+    parser.add_argument("--crawl-products", action="store_true", help="Con --crawl: seguir también los enlaces a fichas de producto")
+    parser.add_argument("--crawl-state", default=None, help="Con --crawl: base SQLite (o directorio) de la frontera; permite retomar un crawl interrumpido")
+    parser.add_argument("--crawl-delay", type=float, default=1.0, help="Con --crawl: segundos mínimos entre requests a un mismo host (o Crawl-delay de robots.txt si es mayor)")
+    parser.add_argument("--max-pages", type=int, default=500, help="Con --crawl: máximo de URLs en la frontera")
+    parser.add_argument("--ignore-robots", action="store_true", help="Con --crawl: no consultar robots.txt")
+    parser.add_argument("--max-page-mb", type=float, default=MAX_HTML_BYTES / 1024 / 1024, help="Tope por página en MB (descomprimido); se deja de descargar al alcanzarlo (0 = sin tope)")
+    parser.add_argument("--cache-dir", default=None, help="Directorio para la caché HTTP persistente (desactivada si se omite)")
+    parser.add_argument("--cache-ttl", type=float, default=24 * 3600, help="Segundos antes de revalidar una entrada de la caché")
+    parser.add_argument("--cache-max-mb", type=float, default=256, help="Tamaño máximo de la caché en MB (LRU)")
+    parser.add_argument("--state-dir", default=None, help="Directorio con fingerprints y últimos resultados por URL; páginas sin cambios relevantes no se re-extraen")
+    parser.add_argument("--force", action="store_true", help="Con --state-dir: re-extraer aunque el fingerprint no haya cambiado")
+    parser.add_argument("--history-db", default=None, help="Base SQLite (o directorio) donde acumular el histórico de precios")
+    parser.add_argument("--products-db", default=None, help="Base SQLite (o directorio) de productos; agrega a cada precio un product_id estable entre corridas y tiendas")
+    parser.add_argument("--product-threshold", type=int, default=MATCH_THRESHOLD, help="Con --products-db: similitud mínima (0-100) para considerar un texto el mismo producto")
     parser.add_argument("--llm", action="store_true", help="Activar extracción con LLM además de heurística")
     parser.add_argument("--model", default="gpt-4.1-mini", help="Modelo OpenAI a usar si se activa --llm")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Requests LLM simultáneos como máximo (chunks y páginas)")
+    parser.add_argument("--llm-tpm", type=int, default=None, help="Presupuesto de tokens por minuto para el LLM (opcional)")
+    parser.add_argument("--llm-cache-dir", default=os.getenv("LLM_CACHE_DIR"), help="Directorio de la caché de resultados LLM (o LLM_CACHE_DIR; compartible con la app web)")
+    parser.add_argument("--structured-min-coverage", type=float, default=1.0, help="Con --llm: omitir el LLM si JSON-LD/microdata/meta de producto explican esta fracción de los precios visibles (1 = todos; >1 nunca omite)")
+    parser.add_argument("--route-min-confidence", type=float, default=ROUTE_MIN_CONFIDENCE, help="Con --llm: omitir el LLM si la heurística resuelve esta fracción de las tarjetas de producto (precio con moneda y nombre); si no, mandar sólo las tarjetas dudosas o la página completa (>1 desactiva el ruteo)")
+    parser.add_argument("--templates-db", default=None, help="Con --llm: base SQLite (o directorio) de plantillas por dominio aprendidas de respuestas del LLM; se aplican sin LLM en visitas siguientes")
+    parser.add_argument("--template-min-confidence", type=float, default=0.8, help="Confianza mínima (0-1) para usar la plantilla del dominio en lugar del LLM")
     parser.add_argument("--max-chars", type=int, default=30000, help="Tamaño máximo del HTML para el LLM")
-    parser.add_argument("--output", default="resultados_precios.json", help="Archivo de salida JSON")
+    parser.add_argument("--output", default=None, help="Archivo de salida JSON (NDJSON en modo lote)")
     parser.add_argument("--dump-reduced", default=None, help="Ruta para guardar el HTML reducido enviado al LLM")
     parser.add_argument("--dump-cleaned", default=None, help="Ruta para guardar el HTML limpio (sin reducción)")
+    parser.add_argument("--profile", action="store_true", help="Al terminar, imprimir tiempos y tamaños por etapa (descarga, limpieza, reducción, heurística, LLM, merge)")
     args = parser.parse_args()
+    metrics.enable(args.profile)
+    if args.route_min_confidence > 1:
+        args.route_min_confidence = None
 
-    print(f"Descargando HTML de {args.url}...")
-    html = fetch_html(args.url)
-
-    print("Extrayendo precios (heurística)...")
-    heuristic = extract_prices_from_html(html)
-    llm_result = None
+    if not args.url and not args.urls_file:
+        parser.error("indicar una URL o --urls-file")
 
+    api_key = None
     if args.llm:
-        print("Ejecutando extracción con LLM...")
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise SystemExit("ERROR: Definir variable de entorno OPENAI_API_KEY")
-        # Reducir HTML antes de enviar al LLM
-        original_len = len(html)
-        if args.dump_cleaned:
-            cleaned = clean_html(html)
-            with open(args.dump_cleaned, "w", encoding="utf-8") as f:
-                f.write(cleaned)
-        html_llm = reduce_html(html, max_chars=args.max_chars)
-        reduced_len = len(html_llm)
-        print(f"HTML para LLM: {reduced_len} chars (original {original_len})")
-        if args.dump_reduced:
-            with open(args.dump_reduced, "w", encoding="utf-8") as f:
-                f.write(html_llm)
-        extractor = LLMExtractor(api_key=api_key, model=args.model)
-        llm_result = extractor.extract(html_llm)
 
-    merged = merge_results(heuristic, llm_result)
+    cache = _open_cache(args)
+    store = _open_store(args)
+    history = PriceHistory(args.history_db) if args.history_db else None
+    templates = _open_templates(args)
+    products = _open_products(args)
+    if args.urls_file or args.crawl:
+        args.output = args.output or "resultados_precios.ndjson"
+        run_batch(args, api_key, cache, store, history, templates, products)
+        _report_cache(cache)
+        _report_store(store)
+        _report_templates(templates)
+        _report_products(products)
+        if history is not None:
+            history.close()
+        _report_profile(args)
+        return
+    args.output = args.output or "resultados_precios.json"
+
+    print(f"Descargando HTML de {args.url}...")
+    html = fetch_html(args.url, cache=cache, max_bytes=_max_bytes(args))
+    _report_cache(cache)
+
+    merged = _extract_single(args, api_key, html, store, templates)
+    _report_store(store)
+    _report_templates(templates)
+    if products is not None:
+        products.annotate([merged])
+        _report_products(products)
+    if history is not None:
+        history.record(args.url, merged["prices"])
+        history.close()
 
     with open(args.output, "w", encoding="utf-8") as f:
         json.dump(merged, f, ensure_ascii=False, indent=2)
@@ -83,6 +489,48 @@ def main():
     print(f"Precios encontrados: {len(merged['prices'])}")
     print(f"Guardado en {args.output}")
     print(json.dumps(merged, ensure_ascii=False, indent=2))
+    _report_profile(args)
+
+
+def _extract_single(args, api_key: str | None, html: str, store: FingerprintStore | None = None,
+                    templates: TemplateStore | None = None) -> dict:
+    """process_html sobre la página; aquí sólo se informa y se vuelca lo pedido."""
+    print("Extrayendo precios...")
+    if args.dump_cleaned:
+        with open(args.dump_cleaned, "w", encoding="utf-8") as f:
+            f.write(clean_html(html))
+    extractor = _new_extractor(args, api_key) if args.llm else None
+    details = {}
+    try:
+        merged = process_html(html, extractor, args.max_chars, args.url, store, args.force,
+                              args.structured_min_coverage, templates, args.route_min_confidence, details)
+    finally:
+        if extractor is not None:
+            _close_extractor(extractor)
+
+    if merged.pop("unchanged", False):
+        print("Sin cambios en el contenido relevante: se reutiliza el último resultado.")
+        return merged
+    if details.get("offers"):
+        print(f"Datos estructurados: {details['offers']} offers")
+    skipped = details.get("skipped")
+    if skipped == "structured":
+        print("Los datos estructurados cubren los precios visibles: se omite el LLM.")
+    elif skipped == "heuristic":
+        print(f"La heurística resuelve las tarjetas de producto (confianza {details['confidence']:.2f}): se omite el LLM.")
+    elif skipped == "template":
+        print(f"Plantilla de {site_key(args.url)}: {details['template_prices']} precios, se omite el LLM.")
+    elif "llm_input" in details:
+        html_llm = details["llm_input"]
+        if details["route"] == "blocks":
+            print(f"Sólo las tarjetas dudosas van al LLM (confianza {details['confidence']:.2f})")
+        print(f"HTML para LLM: {len(html_llm)} chars (original {len(html)})")
+        if args.dump_reduced:
+            with open(args.dump_reduced, "w", encoding="utf-8") as f:
+                f.write(html_llm)
+        if details.get("learned"):
+            print(f"Plantilla aprendida para {site_key(args.url)}")
+    return merged
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,251 @@
+"""Instrumentación liviana por etapa del pipeline.
+
+Histogramas (latencia, tamaños, ratio de reducción, tokens) y contadores con
+etiquetas, en memoria del proceso. Desactivada por defecto: timed() devuelve
+un context manager vacío compartido y observe()/inc() vuelven en el primer
+if, así que en el camino caliente cuesta una llamada. render() exporta en
+el formato de texto de Prometheus (/metrics de la app web) y summary() arma
+la tabla de --profile del CLI. take()/merge() pasan lo medido en los
+procesos de cpu_stage al proceso principal.
+
+    with metrics.timed("reduce"):
+        reduced = ...
+    metrics.observe("stage_output_bytes", len(reduced), stage="reduce")
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Dict, List, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 4e3, 16e3, 64e3, 256e3, 1e6, 4e6, 16e6)
+RATIO_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+# nombre -> (ayuda, buckets); los tamaños son caracteres (≈ bytes en HTML)
+HISTOGRAMS = {
+    "stage_seconds": ("Duración de cada etapa del pipeline", LATENCY_BUCKETS),
+    "stage_input_bytes": ("Tamaño de la entrada de cada etapa", SIZE_BUCKETS),
+    "stage_output_bytes": ("Tamaño de la salida de cada etapa", SIZE_BUCKETS),
+    "reduction_ratio": ("HTML reducido / HTML original", RATIO_BUCKETS),
+    "llm_prompt_tokens": ("Tokens estimados por request al LLM", TOKEN_BUCKETS),
+}
+COUNTERS = {
+    "cache_events_total": "Eventos de las cachés (hits, misses, revalidados, desalojos)",
+    "llm_routes_total": "Páginas por decisión del ruteo al LLM (skip, blocks, page)",
+    "fetch_truncated_total": "Descargas cortadas al alcanzar el tope de bytes por página",
+}
+PREFIX = "scraper_"
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_enabled = False
+_lock = threading.Lock()
+# (nombre, etiquetas) -> [conteos por bucket (+Inf al final), suma]
+_histograms: Dict[_Key, list] = {}
+_counters: Dict[_Key, float] = {}
+_NULL = nullcontext()
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _key(name: str, labels: Dict[str, str]) -> _Key:
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    buckets = HISTOGRAMS[name][1]
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+        h[0][bisect_left(buckets, value)] += 1
+        h[1] += value
+
+
+def inc(name: str, amount: float = 1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+class _Timer:
+    __slots__ = ("labels", "start")
+
+    def __init__(self, labels: Dict[str, str]):
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe("stage_seconds", time.perf_counter() - self.start, **self.labels)
+
+
+def timed(stage: str, **labels):
+    """Context manager que registra la duración en stage_seconds{stage=...}."""
+    if not _enabled:
+        return _NULL
+    return _Timer({"stage": stage, **labels})
+
+
+def sizes(stage: str, size_in: int | None = None, size_out: int | None = None):
+    """Tamaños de entrada/salida de una etapa."""
+    if not _enabled:
+        return
+    if size_in is not None:
+        observe("stage_input_bytes", size_in, stage=stage)
+    if size_out is not None:
+        observe("stage_output_bytes", size_out, stage=stage)
+
+
+def take() -> Dict:
+    """Devuelve lo medido y lo reinicia (para enviarlo a otro proceso)."""
+    global _histograms, _counters
+    with _lock:
+        state = {"histograms": _histograms, "counters": _counters}
+        _histograms, _counters = {}, {}
+    return state
+
+
+def merge(state: Dict):
+    """Suma a este proceso lo devuelto por take() en otro."""
+    with _lock:
+        for key, (counts, total) in state["histograms"].items():
+            h = _histograms.get(key)
+            if h is None:
+                _histograms[key] = [list(counts), total]
+            else:
+                h[0] = [a + b for a, b in zip(h[0], counts)]
+                h[1] += total
+        for key, value in state["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def reset():
+    take()
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render() -> str:
+    """Formato de texto de Prometheus (versión 0.0.4)."""
+    with _lock:
+        histograms = {k: (list(c), s) for k, (c, s) in _histograms.items()}
+        counters = dict(_counters)
+    lines: List[str] = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        series = sorted((k, v) for k, v in histograms.items() if k[0] == name)
+        if not series:
+            continue
+        lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} histogram"]
+        for (_, labels), (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(list(buckets) + [float("inf")], counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_fmt(bound)}"'
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels, le)} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_fmt(total)}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {cumulative}")
+    for name, help_text in COUNTERS.items():
+        series = sorted((k, v) for k, v in counters.items() if k[0] == name)
+        if not series:
+            continue
+        lines += [f"# HELP {PREFIX}{name} {help_text}", f"# TYPE {PREFIX}{name} counter"]
+        lines += [f"{PREFIX}{name}{_labels(labels)} {_fmt(value)}" for (_, labels), value in series]
+    return "\n".join(lines) + "\n"
+
+
+def _quantile(buckets, counts, q: float) -> float:
+    """Cuantil aproximado por interpolación lineal dentro del bucket."""
+    total = sum(counts)
+    rank = q * total
+    seen = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and seen + count >= rank:
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return lower
+
+
+def _size(chars: float | None) -> str:
+    return f"{chars / 1e3:8.1f}k" if chars is not None else f"{'-':>9}"
+
+
+def summary() -> str:
+    """Tabla por etapa para --profile: llamadas, tiempo total y por llamada,
+    p50/p95, tamaños medios; luego ratio de reducción, tokens y cachés."""
+    with _lock:
+        histograms = {k: (list(c), s) for k, (c, s) in _histograms.items()}
+        counters = dict(_counters)
+
+    def stat(name, stage):
+        h = histograms.get((name, (("stage", stage),)))
+        return (sum(h[0]), h[1]) if h else (0, 0.0)
+
+    buckets = HISTOGRAMS["stage_seconds"][1]
+    rows = []
+    for (name, labels), (counts, total) in histograms.items():
+        if name != "stage_seconds" or len(labels) != 1:
+            continue
+        stage = labels[0][1]
+        n = sum(counts)
+        n_in, s_in = stat("stage_input_bytes", stage)
+        n_out, s_out = stat("stage_output_bytes", stage)
+        rows.append((total, stage, n, _quantile(buckets, counts, 0.5), _quantile(buckets, counts, 0.95),
+                     s_in / n_in if n_in else None, s_out / n_out if n_out else None))
+    lines = [f"{'etapa':<12} {'llamadas':>9} {'total s':>9} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8} "
+             f"{'entrada':>9} {'salida':>9}"]
+    for total, stage, n, p50, p95, mean_in, mean_out in sorted(rows, reverse=True):
+        lines.append(f"{stage:<12} {n:9d} {total:9.3f} {total / n * 1e3:9.2f} {p50 * 1e3:8.2f} {p95 * 1e3:8.2f} "
+                     f"{_size(mean_in)} {_size(mean_out)}")
+    ratio = histograms.get(("reduction_ratio", ()))
+    if ratio:
+        lines.append(f"reducción media: {ratio[1] / sum(ratio[0]):.1%} del HTML original")
+    tokens = histograms.get(("llm_prompt_tokens", ()))
+    if tokens:
+        lines.append(f"tokens enviados al LLM (estimados): {int(tokens[1])} en {sum(tokens[0])} requests")
+    caches: Dict[str, List[str]] = {}
+    routes = []
+    for (name, labels), value in sorted(counters.items()):
+        if name == "llm_routes_total":
+            routes.append(f"{int(value)} {dict(labels).get('action', '?')}")
+        elif name == "cache_events_total":
+            d = dict(labels)
+            caches.setdefault(d.get("cache", "?"), []).append(f"{int(value)} {d.get('event', '?')}")
+    if routes:
+        lines.append("ruteo al LLM: " + ", ".join(routes))
+    truncated = counters.get(("fetch_truncated_total", ()))
+    if truncated:
+        lines.append(f"descargas cortadas por tamaño: {int(truncated)}")
+    for cache, events in caches.items():
+        lines.append(f"caché {cache}: " + ", ".join(events))
+    return "\n".join(lines)
+
+
+__all__ = ["enable", "enabled", "observe", "inc", "timed", "sizes", "take", "merge", "reset", "render", "summary"]
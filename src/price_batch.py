@@ -0,0 +1,164 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from price_extractor import CURRENCY_NORMALIZATION
+
+
+def normalize_amounts(amounts: Sequence[str]) -> np.ndarray:
+    """Versión vectorizada de price_extractor._normalize_amount: mismos
+    criterios de separadores, sobre todos los montos a la vez. Los que no
+    son números válidos quedan en NaN."""
+    a = np.asarray(amounts, dtype=np.dtypes.StringDType())
+    if a.size == 0:
+        return np.empty(0, dtype=np.float64)
+    n = np.strings.str_len(a)
+    last_comma = np.strings.rfind(a, ",")
+    last_dot = np.strings.rfind(a, ".")
+    has_comma = last_comma >= 0
+    has_dot = last_dot >= 0
+    comma_in_tail = has_comma & (last_comma >= n - 3)
+    sep_at_decimal = (last_comma == n - 3) | (last_dot == n - 3)
+    # Coma decimal: "1.234,56" o "12,50"; en el resto la coma es de miles
+    decimal_comma = comma_in_tail & (~has_dot | sep_at_decimal)
+    cleaned = np.where(
+        decimal_comma,
+        np.strings.replace(np.strings.replace(a, ".", ""), ",", "."),
+        np.strings.replace(a, ",", ""),
+    )
+    # Tras limpiar sólo quedan dígitos y puntos: más de un punto no es un número
+    valid = (np.strings.count(cleaned, ".") <= 1) & (np.strings.str_len(cleaned) > 0)
+    values = np.full(a.shape, np.nan)
+    values[valid] = cleaned[valid].astype(np.float64)
+    return values
+
+
+def normalize_currencies(symbols: Sequence[Optional[str]]) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """Códigos de moneda como (índices, tabla): cada símbolo distinto se
+    busca una sola vez en CURRENCY_NORMALIZATION."""
+    # Símbolos distintos pueden mapear al mismo código ("Bs." y "BOB")
+    table = {s: CURRENCY_NORMALIZATION.get(s) if s else None for s in set(symbols)}
+    codes = sorted(set(table.values()), key=lambda c: (c is not None, c or ""))
+    index = {c: i for i, c in enumerate(codes)}
+    lookup = {s: index[c] for s, c in table.items()}
+    return np.fromiter(map(lookup.__getitem__, symbols), dtype=np.int16, count=len(symbols)), codes
+
+
+def _factorize(values: Sequence) -> np.ndarray:
+    """Un id entero por valor distinto (para usar strings como clave)."""
+    ids: Dict = {}
+    return np.fromiter((ids.setdefault(v, len(ids)) for v in values), dtype=np.int64, count=len(values))
+
+
+def _first_rows(*keys: np.ndarray) -> np.ndarray:
+    """Máscara con la primera fila de cada clave (compuesta por varias
+    columnas)."""
+    n = keys[0].size
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    # lexsort es estable: dentro de cada grupo queda primero la fila original
+    order = np.lexsort(keys[::-1])
+    sorted_keys = [k[order] for k in keys]
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = np.logical_or.reduce([k[1:] != k[:-1] for k in sorted_keys])
+    mask[order[new_group]] = True
+    return mask
+
+
+def _value_bits(values: np.ndarray, decimals: int) -> np.ndarray:
+    # Redondeado y reinterpretado como int64 para combinarlo con otras claves
+    return np.round(values, decimals).astype(np.float64).view(np.int64)
+
+
+class PriceBatch:
+    """Precios de muchas páginas en columnas de NumPy.
+
+    Se arma con los matches sin normalizar de scan_price_matches; montos y
+    monedas se normalizan en lote y la deduplicación se hace sobre los arrays.
+    iter_pages() devuelve, página por página, la lista de dicts con el mismo
+    formato que extract_prices_from_html/merge_results.
+    """
+
+    def __init__(self, page: np.ndarray, raw: np.ndarray, value: np.ndarray,
+                 currency: np.ndarray, currencies: List[Optional[str]], context: np.ndarray,
+                 n_pages: int = 0):
+        self.page = page
+        self.raw = raw
+        self.value = value
+        self.currency = currency
+        self.currencies = currencies
+        self.context = context
+        self.n_pages = n_pages
+
+    def __len__(self) -> int:
+        return len(self.page)
+
+    @classmethod
+    def from_matches(cls, pages: Sequence[Sequence[tuple]], dedup: bool = True) -> "PriceBatch":
+        """pages: por página, la lista de (raw, monto, símbolo, contexto). Con
+        dedup se aplica el mismo criterio que iter_price_candidates: un precio
+        por (valor a 2 decimales, moneda) dentro de cada página."""
+        counts = np.fromiter((len(p) for p in pages), dtype=np.int64, count=len(pages))
+        rows = [m for p in pages for m in p]
+        page = np.repeat(np.arange(len(pages), dtype=np.int32), counts)
+        # Columna por columna: zip(*rows) crea una tupla por fila y dispara el GC
+        raw, amounts, symbols, context = ([m[k] for m in rows] for k in range(4))
+        value = normalize_amounts(amounts)
+        currency, currencies = normalize_currencies(symbols)
+        keep = ~np.isnan(value)
+        if dedup:
+            kept = np.flatnonzero(keep)
+            sub = _first_rows(page[kept], _value_bits(value[kept], 2), currency[kept])
+            keep = np.zeros(len(rows), dtype=bool)
+            keep[kept[sub]] = True
+        idx = np.flatnonzero(keep)
+        return cls(page[idx], np.asarray(raw, dtype=object)[idx], value[idx], currency[idx],
+                   currencies, np.asarray(context, dtype=object)[idx], n_pages=len(pages))
+
+    def merge(self, llm_pages: Sequence[Optional[Iterable[Dict]]]) -> "PriceBatch":
+        """Agrega los precios del LLM de cada página y deduplica todo como
+        merge_results: clave (valor a 4 decimales, moneda, raw), primero la
+        heurística."""
+        llm_rows = [(i, p) for i, prices in enumerate(llm_pages) for p in (prices or [])]
+        codes = {c: i for i, c in enumerate(self.currencies)}
+        currencies = list(self.currencies)
+        for _, p in llm_rows:
+            if p.get("currency") not in codes:
+                codes[p.get("currency")] = len(currencies)
+                currencies.append(p.get("currency"))
+        page = np.concatenate([self.page, np.fromiter((i for i, _ in llm_rows), dtype=np.int32, count=len(llm_rows))])
+        llm_values = (p.get("value") if isinstance(p.get("value"), (int, float)) else np.nan for _, p in llm_rows)
+        value = np.concatenate([self.value, np.fromiter(llm_values, dtype=np.float64, count=len(llm_rows))])
+        currency = np.concatenate([self.currency, np.fromiter((codes[p.get("currency")] for _, p in llm_rows),
+                                                              dtype=np.int16, count=len(llm_rows))])
+        raw = np.concatenate([self.raw, np.asarray([p.get("raw") for _, p in llm_rows], dtype=object)])
+        context = np.concatenate([self.context, np.asarray([p.get("context") for _, p in llm_rows], dtype=object)])
+        raw_ids = _factorize(raw)
+        # Estable: dentro de cada página, heurística y luego LLM en su orden
+        order = np.argsort(page, kind="stable")
+        keep = order[_first_rows(page[order], _value_bits(value[order], 4), currency[order], raw_ids[order])]
+        return PriceBatch(page[keep], raw[keep], value[keep], currency[keep], currencies, context[keep],
+                          n_pages=max(self.n_pages, len(llm_pages)))
+
+    def _columns(self, lo: int, hi: int) -> tuple:
+        # Listas de Python: indexarlas es mucho más barato que indexar arrays fila a fila
+        return (self.raw[lo:hi].tolist(), self.value[lo:hi].tolist(), self.currency[lo:hi].tolist(),
+                self.context[lo:hi].tolist())
+
+    def _row_dicts(self, columns: tuple, lo: int, hi: int) -> List[Dict]:
+        raw, value, currency, context = columns
+        return [
+            {"raw": raw[r], "value": None if value[r] != value[r] else value[r],
+             "currency": self.currencies[currency[r]], "context": context[r]}
+            for r in range(lo, hi)
+        ]
+
+    def iter_pages(self) -> Iterator[List[Dict]]:
+        columns = self._columns(0, len(self))
+        bounds = np.searchsorted(self.page, np.arange(self.n_pages + 1)).tolist()
+        for i in range(self.n_pages):
+            yield self._row_dicts(columns, bounds[i], bounds[i + 1])
+
+
+__all__ = ["PriceBatch", "normalize_amounts", "normalize_currencies"]
@@ -1,12 +1,11 @@
 import re
-from dataclasses import dataclass, asdict
-from typing import List, Optional, Dict, Iterable
+from typing import List, Optional, Dict, Iterable, Iterator, Union
 
-PRICE_PATTERN = re.compile(r"""
-    (?:(?P<currency_symbol>[$€£]|S/\.|Bs\.?|USD\b|EUR\b|MXN\b|ARS\b|CLP\b|COP\b|BOB\b|PEN\b|BRL\b|UYU\b|GTQ\b|CRC\b))\s{0,3}
-    (?P<amount>\d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d{2})?|\d+(?:[\.,]\d{2}))
-    |(?P<amount_alt>\d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d{2})?)\s{0,3}(?P<currency_trailing>USD\b|EUR\b|MXN\b|ARS\b|CLP\b|COP\b|BOB\b|PEN\b|BRL\b|UYU\b|GTQ\b|CRC\b)
-""", re.VERBOSE)
+from lxml import etree
+
+import metrics
+from price_scanner import iter_prices
+from price_table import PriceCandidate, PriceTable
 
 CURRENCY_NORMALIZATION = {
     '$': 'USD', 'USD': 'USD', 'EUR': 'EUR', '€': 'EUR', '£': 'GBP', 'S/.': 'PEN', 'PEN': 'PEN',
@@ -14,16 +13,6 @@ CURRENCY_NORMALIZATION = {
     'BRL': 'BRL', 'UYU': 'UYU', 'GTQ': 'GTQ', 'CRC': 'CRC'
 }
 
-@dataclass
-class PriceCandidate:
-    raw: str
-    value: float
-    currency: Optional[str]
-    context: str
-
-    def to_dict(self) -> Dict:
-        return asdict(self)
-
 def _normalize_amount(text: str) -> Optional[float]:
     # Replace thousand separators and unify decimal
     if text.count(',') > 0 and text.count('.') > 0:
@@ -50,22 +39,35 @@ def _normalize_amount(text: str) -> Optional[float]:
     except ValueError:
         return None
 
+def _match_fields(match, text: str, context_window: int) -> Optional[tuple]:
+    """(raw, monto sin normalizar, símbolo de moneda, contexto) de un match."""
+    amount = match.group('amount') or match.group('amount_alt')
+    if not amount:
+        return None
+    start, end = match.span()
+    left = max(0, start - context_window)
+    right = min(len(text), end + context_window)
+    context = re.sub(r"\s+", " ", text[left:right]).strip()
+    symbol = match.group('currency_symbol') or match.group('currency_trailing')
+    return match.group(0), amount, symbol, context
+
+def _candidate_from_fields(raw: str, amount: str, symbol: Optional[str], context: str) -> Optional[PriceCandidate]:
+    value = _normalize_amount(amount)
+    if value is None:
+        return None
+    currency = CURRENCY_NORMALIZATION.get(symbol) if symbol else None
+    return PriceCandidate(raw=raw, value=value, currency=currency, context=context)
+
+def _candidate_from_match(match, text: str, context_window: int) -> Optional[PriceCandidate]:
+    fields = _match_fields(match, text, context_window)
+    return _candidate_from_fields(*fields) if fields else None
+
 def extract_price_candidates(text: str, context_window: int = 60) -> List[PriceCandidate]:
     candidates: List[PriceCandidate] = []
-    for match in PRICE_PATTERN.finditer(text):
-        currency_symbol = match.group('currency_symbol') or match.group('currency_trailing')
-        amount = match.group('amount') or match.group('amount_alt')
-        if not amount:
-            continue
-        value = _normalize_amount(amount)
-        if value is None:
-            continue
-        currency = CURRENCY_NORMALIZATION.get(currency_symbol) if currency_symbol else None
-        start, end = match.span()
-        left = max(0, start - context_window)
-        right = min(len(text), end + context_window)
-        context = re.sub(r"\s+", " ", text[left:right]).strip()
-        candidates.append(PriceCandidate(raw=match.group(0), value=value, currency=currency, context=context))
+    for match in iter_prices(text):
+        candidate = _candidate_from_match(match, text, context_window)
+        if candidate is not None:
+            candidates.append(candidate)
     return candidates
 
 def deduplicate_prices(candidates: Iterable[PriceCandidate]) -> List[PriceCandidate]:
@@ -78,15 +80,156 @@ def deduplicate_prices(candidates: Iterable[PriceCandidate]) -> List[PriceCandid
             result.append(c)
     return result
 
+SKIP_TEXT_TAGS = {"script", "style"}
+
+WS_RE = re.compile(r"\s+")
+
+# Longitud máxima razonable de un match de PRICE_PATTERN; se usa como margen
+# para no cortar un precio que sigue llegando en el próximo chunk.
+MAX_MATCH_CHARS = 64
+
+STREAM_CHUNK_CHARS = 64 * 1024
+
+
+class _TextCollector:
+    """Target SAX para lxml: acumula sólo el texto visible (sin script/style),
+    con un espacio en cada tag, igual que la versión basada en re.sub. Los
+    espacios se colapsan en take(), una vez por chunk."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self._skip = 0
+        self._last_space = True
+
+    def start(self, tag, attrib):
+        if tag in SKIP_TEXT_TAGS:
+            self._skip += 1
+        self.parts.append(" ")
+
+    def end(self, tag):
+        if tag in SKIP_TEXT_TAGS and self._skip:
+            self._skip -= 1
+        self.parts.append(" ")
+
+    def data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+    def close(self):
+        return None
+
+    def take(self) -> str:
+        text = WS_RE.sub(" ", "".join(self.parts))
+        self.parts.clear()
+        if self._last_space and text.startswith(" "):
+            text = text[1:]
+        if text:
+            self._last_space = text.endswith(" ")
+        return text
+
+
+def _iter_slices(html: str, size: int = STREAM_CHUNK_CHARS) -> Iterator[str]:
+    for i in range(0, len(html), size):
+        yield html[i:i + size]
+
+
+def iter_price_matches(chunks: Iterable[Union[str, bytes]], context_window: int = 60) -> Iterator[tuple]:
+    """Genera (raw, monto, símbolo, contexto) por cada match, sin normalizar.
+
+    El HTML se parsea incrementalmente con lxml sin construir árbol; del texto
+    sólo se mantiene una ventana deslizante de unos context_window caracteres
+    alrededor de la posición de búsqueda, de modo que la memoria no depende del
+    tamaño de la página. Los matches se generan a medida que se confirman.
+    """
+    collector = _TextCollector()
+    parser = etree.HTMLParser(target=collector)
+    margin = max(context_window, MAX_MATCH_CHARS)
+    buf = ""
+    scan = 0  # posición (relativa a buf) desde donde buscar nuevos matches
+
+    def drain(final: bool) -> Iterator[tuple]:
+        nonlocal buf, scan
+        limit = len(buf) if final else len(buf) - margin
+        matched = False
+        pending = None
+        for match in iter_prices(buf, scan):
+            # Un match cerca del final puede crecer con el próximo chunk
+            if not final and match.end() > limit:
+                pending = match.start()
+                break
+            matched = True
+            scan = match.end()
+            fields = _match_fields(match, buf, context_window)
+            if fields is not None:
+                yield fields
+        if not matched:
+            scan = max(scan, len(buf) - MAX_MATCH_CHARS)
+            # Nunca más allá del inicio de un match todavía sin confirmar
+            if pending is not None:
+                scan = min(scan, pending)
+        # Descarta el texto que ya no puede formar parte de un contexto
+        cut = max(0, scan - context_window)
+        if cut:
+            buf = buf[cut:]
+            scan -= cut
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        parser.feed(chunk)
+        buf += collector.take()
+        yield from drain(final=False)
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass  # documento vacío
+    buf += collector.take()
+    yield from drain(final=True)
+
+
+def iter_price_candidates(chunks: Iterable[Union[str, bytes]], context_window: int = 60,
+                          dedup: bool = True) -> Iterator[PriceCandidate]:
+    """Extrae precios de HTML que llega por partes (p. ej. iter_content), con
+    memoria acotada (ver iter_price_matches)."""
+    seen = set()
+    for fields in iter_price_matches(chunks, context_window):
+        candidate = _candidate_from_fields(*fields)
+        if candidate is None:
+            continue
+        if dedup:
+            key = (round(candidate.value, 2), candidate.currency)
+            if key in seen:
+                continue
+            seen.add(key)
+        yield candidate
+
+
+def candidates_from_matches(matches: Iterable[tuple]) -> Iterator[PriceCandidate]:
+    """Normaliza matches de iter_price_matches/scan_price_matches uno a uno."""
+    for fields in matches:
+        candidate = _candidate_from_fields(*fields)
+        if candidate is not None:
+            yield candidate
+
+
+def scan_price_matches(html: str, context_window: int = 60) -> List[tuple]:
+    """Matches sin normalizar de una página, para normalizar en lote
+    (price_batch.PriceBatch)."""
+    metrics.sizes("heuristic", size_in=len(html))
+    with metrics.timed("heuristic"):
+        return list(iter_price_matches(_iter_slices(html), context_window))
+
+
+def extract_price_table(html: str) -> PriceTable:
+    # Se recorre el HTML en porciones: nunca se arma una copia completa del texto
+    metrics.sizes("heuristic", size_in=len(html))
+    with metrics.timed("heuristic"):
+        return PriceTable.from_candidates(iter_price_candidates(_iter_slices(html)))
+
+
 def extract_prices_from_html(html: str) -> List[Dict]:
-    # Quick removal of script/style to reduce noise
-    cleaned = re.sub(r"<script[\s\S]*?</script>", " ", html, flags=re.IGNORECASE)
-    cleaned = re.sub(r"<style[\s\S]*?</style>", " ", cleaned, flags=re.IGNORECASE)
-    # Remove tags, keep text
-    text = re.sub(r"<[^>]+>", " ", cleaned)
-    text = re.sub(r"\s+", " ", text)
-    candidates = extract_price_candidates(text)
-    candidates = deduplicate_prices(candidates)
-    return [c.to_dict() for c in candidates]
-
-__all__ = ["extract_prices_from_html", "extract_price_candidates", "PriceCandidate"]
+    return extract_price_table(html).to_dicts()
+
+__all__ = ["extract_prices_from_html", "extract_price_table", "extract_price_candidates",
+           "iter_price_candidates", "iter_price_matches", "scan_price_matches", "candidates_from_matches",
+           "PriceCandidate"]
@@ -0,0 +1,216 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from product_matcher import normalize_name
+
+SCHEMA = """
+-- key: el contexto normalizado y sin precios (normalize_name), así un
+-- cambio de precio no crea otro producto; context es el último visto.
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    key TEXT NOT NULL,
+    context TEXT NOT NULL,
+    UNIQUE (url, key)
+);
+-- Una fila por producto y corrida; clave compuesta sin rowid: las filas de un
+-- producto quedan contiguas y ordenadas por fecha.
+CREATE TABLE IF NOT EXISTS observations (
+    product_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    currency TEXT,
+    PRIMARY KEY (product_id, ts)
+) WITHOUT ROWID;
+-- Último precio conocido por producto (se mantiene al insertar)
+CREATE TABLE IF NOT EXISTS latest (
+    product_id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    currency TEXT
+);
+-- Sólo las observaciones donde el precio cambió respecto de la anterior
+CREATE TABLE IF NOT EXISTS changes (
+    ts INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    old_value REAL NOT NULL,
+    new_value REAL NOT NULL,
+    currency TEXT,
+    PRIMARY KEY (ts, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_products_url ON products(url);
+CREATE INDEX IF NOT EXISTS idx_changes_product ON changes(product_id, ts);
+"""
+
+
+def product_key(context: str) -> str:
+    """Clave del producto dentro de su URL: el contexto sin precios y
+    normalizado, estable aunque el precio cambie."""
+    return normalize_name(context)
+
+
+class PriceHistory:
+    """Histórico de precios en SQLite.
+
+    Cada producto es (url, product_key(context)) y se guarda una vez; las
+    observaciones referencian su id. Además de la serie completa se mantienen las tablas
+    `latest` y `changes`, de modo que "último precio por producto" y "cambios
+    desde T" no necesitan recorrer el histórico.
+    """
+
+    def __init__(self, path: str | Path):
+        path = Path(path)
+        if path.suffix not in {".sqlite", ".db"}:
+            path.mkdir(parents=True, exist_ok=True)
+            path = path / "price_history.sqlite"
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def _product_ids(self, keys: List[Tuple[str, str]], contexts: List[str]) -> List[int]:
+        self._db.executemany(
+            "INSERT INTO products (url, key, context) VALUES (?, ?, ?) "
+            "ON CONFLICT(url, key) DO UPDATE SET context = excluded.context",
+            [(url, key, context) for (url, key), context in zip(keys, contexts)],
+        )
+        ids = []
+        for url, key in keys:
+            ids.append(self._db.execute(
+                "SELECT id FROM products WHERE url = ? AND key = ?", (url, key)
+            ).fetchone()[0])
+        return ids
+
+    def record_many(self, pages: Iterable[Tuple[str, List[Dict]]], ts: Optional[int] = None) -> int:
+        """Inserta en una sola transacción los precios de varias páginas.
+
+        pages: pares (url, prices) con prices como en merge_results. Por
+        producto (url, product_key(context)) se toma el primer precio de la
+        corrida.
+        Devuelve la cantidad de observaciones insertadas.
+        """
+        ts = int(ts if ts is not None else time.time())
+        rows, contexts = {}, {}
+        for url, prices in pages:
+            for p in prices:
+                value = p.get("value")
+                if not isinstance(value, (int, float)):
+                    continue
+                context = (p.get("context") or p.get("raw") or "").strip()
+                key = (url, product_key(context))
+                if key not in rows:
+                    rows[key] = (float(value), p.get("currency"))
+                    contexts[key] = context
+        if not rows:
+            return 0
+        keys = list(rows)
+        with self._lock, self._db:
+            ids = self._product_ids(keys, [contexts[k] for k in keys])
+            obs = [(pid, ts, *rows[k]) for pid, k in zip(ids, keys)]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO observations (product_id, ts, value, currency) VALUES (?, ?, ?, ?)", obs
+            )
+            prev = {}
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                q = f"SELECT product_id, value, ts FROM latest WHERE product_id IN ({','.join('?' * len(part))})"
+                prev.update({r[0]: (r[1], r[2]) for r in self._db.execute(q, part)})
+            changed = [
+                (ts, pid, prev[pid][0], value, currency)
+                for pid, _, value, currency in obs
+                if pid in prev and prev[pid][1] < ts and prev[pid][0] != value
+            ]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO changes (ts, product_id, old_value, new_value, currency) VALUES (?, ?, ?, ?, ?)",
+                changed,
+            )
+            self._db.executemany(
+                "INSERT INTO latest (product_id, ts, value, currency) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(product_id) DO UPDATE SET ts = excluded.ts, value = excluded.value, "
+                "currency = excluded.currency WHERE excluded.ts >= latest.ts",
+                obs,
+            )
+        return len(obs)
+
+    def record(self, url: str, prices: List[Dict], ts: Optional[int] = None) -> int:
+        return self.record_many([(url, prices)], ts)
+
+    def latest(self, url: Optional[str] = None) -> List[Dict]:
+        q = ("SELECT p.url, p.context, l.value, l.currency, l.ts FROM latest l "
+             "JOIN products p ON p.id = l.product_id")
+        args: tuple = ()
+        if url:
+            q += " WHERE p.url = ?"
+            args = (url,)
+        with self._lock:
+            rows = self._db.execute(q + " ORDER BY p.url, p.context", args).fetchall()
+        return [{"url": r[0], "context": r[1], "value": r[2], "currency": r[3], "ts": r[4]} for r in rows]
+
+    def changes_since(self, since: int, url: Optional[str] = None) -> List[Dict]:
+        q = ("SELECT p.url, p.context, c.old_value, c.new_value, c.currency, c.ts FROM changes c "
+             "JOIN products p ON p.id = c.product_id WHERE c.ts >= ?")
+        args: tuple = (int(since),)
+        if url:
+            q += " AND p.url = ?"
+            args += (url,)
+        with self._lock:
+            rows = self._db.execute(q + " ORDER BY c.ts", args).fetchall()
+        return [
+            {"url": r[0], "context": r[1], "old_value": r[2], "new_value": r[3], "currency": r[4], "ts": r[5]}
+            for r in rows
+        ]
+
+    def history(self, url: str, context: Optional[str] = None) -> List[Dict]:
+        q = ("SELECT p.context, o.ts, o.value, o.currency FROM products p "
+             "JOIN observations o ON o.product_id = p.id WHERE p.url = ?")
+        args: tuple = (url,)
+        if context is not None:
+            q += " AND p.key = ?"
+            args += (product_key(context),)
+        with self._lock:
+            rows = self._db.execute(q + " ORDER BY p.context, o.ts", args).fetchall()
+        return [{"context": r[0], "ts": r[1], "value": r[2], "currency": r[3]} for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas sobre el histórico de precios")
+    parser.add_argument("db", help="Ruta de la base (o directorio) del histórico")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_latest = sub.add_parser("latest", help="Último precio por producto")
+    p_latest.add_argument("--url", default=None)
+    p_changes = sub.add_parser("changes", help="Cambios de precio desde una fecha")
+    p_changes.add_argument("--since", type=float, required=True, help="Epoch en segundos, o días hacia atrás si es < 10000")
+    p_changes.add_argument("--url", default=None)
+    p_hist = sub.add_parser("history", help="Serie de precios de una URL")
+    p_hist.add_argument("url")
+    p_hist.add_argument("--context", default=None, help="Texto del producto (se compara sin precios ni acentos)")
+    args = parser.parse_args()
+
+    store = PriceHistory(args.db)
+    if args.cmd == "latest":
+        out = store.latest(args.url)
+    elif args.cmd == "changes":
+        since = args.since if args.since >= 10000 else time.time() - args.since * 86400
+        out = store.changes_since(int(since), args.url)
+    else:
+        out = store.history(args.url, args.context)
+    store.close()
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+
+
+__all__ = ["PriceHistory", "product_key"]
+
+if __name__ == "__main__":
+    main()
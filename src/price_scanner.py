@@ -0,0 +1,107 @@
+"""Escáner compartido de precios y palabras clave.
+
+Una sola gramática de precio (PRICE_PATTERN) para el extractor heurístico,
+el reductor de HTML y el chunking del LLM, y un regex combinado (TOKEN_RE)
+que en una pasada de izquierda a derecha devuelve precios y keywords.
+"""
+import re
+from typing import Iterator, List, Tuple
+
+CURRENCY_CODES = ("USD", "EUR", "MXN", "ARS", "CLP", "COP", "BOB", "PEN", "BRL", "UYU", "GTQ", "CRC")
+
+# Palabras que suelen acompañar un precio; se buscan también dentro de otras
+# palabras y sin distinguir mayúsculas
+KEYWORDS = ("precio", "oferta", "rebaja", "ahorro", "descuento", "price", "deal", "sale", "promo", "desde")
+
+_CODES = "|".join(rf"{c}\b" for c in CURRENCY_CODES)
+_AMOUNT = r"\d{1,3}(?:[\.,]\d{3})*(?:[\.,]\d{2})?"
+
+_PRICE = rf"""
+    (?:(?P<currency_symbol>[$€£]|S/\.|Bs\.?|{_CODES}))\s{{0,3}}
+    (?P<amount>{_AMOUNT}|\d+(?:[\.,]\d{{2}}))
+    |(?P<amount_alt>{_AMOUNT})\s{{0,3}}(?P<currency_trailing>{_CODES})
+"""
+
+
+def _ci_trie(words) -> str:
+    """Alternativa regex sin IGNORECASE, factorizada por prefijos: con
+    re.IGNORECASE y una lista plana el motor prueba cada palabra en cada
+    posición del texto, lo que cuesta varias veces más."""
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w.lower():
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node) -> str:
+        alts = []
+        for ch, sub in sorted(node.items()):
+            if ch:
+                cls = f"[{ch.upper()}{ch}]" if ch.upper() != ch else re.escape(ch)
+                alts.append(cls + emit(sub))
+        if not alts:
+            return ""
+        body = "(?:" + "|".join(alts) + ")"
+        return body + "?" if "" in node else body
+
+    return emit(trie)
+
+
+# Igual que el KEYWORDS_RE original: las palabras también dentro de otras
+# ("wholesale", "presale") y los códigos de moneda sólo como palabra
+_KEYWORD = rf"""
+    {_ci_trie(KEYWORDS)}|\b{_ci_trie(CURRENCY_CODES)}\b|[Bb][Ss]\.?|[Ss]/\.|[$€£]
+"""
+
+PRICE_PATTERN = re.compile(_PRICE, re.VERBOSE)
+
+# Un precio tiene prioridad sobre la keyword con la que empieza ("Bs. 870")
+TOKEN_RE = re.compile(rf"(?P<price>{_PRICE})|(?P<keyword>{_KEYWORD})", re.VERBOSE)
+
+# Monto con decimales pero sin moneda ("870.00", "1.299,90"): PRICE_PATTERN no
+# lo toma, pero puede ser un precio que sólo el LLM reconoce por el contexto
+BARE_AMOUNT_RE = re.compile(r"(?<![\d.,])\d{1,3}(?:[.,]\d{3})*[.,]\d{2}(?![\d.,])")
+
+_DIGIT_RE = re.compile(r"\d")
+
+
+def may_contain_price(text: str, pos: int = 0) -> bool:
+    """Prefiltro: sin dígitos no puede haber precio."""
+    return _DIGIT_RE.search(text, pos) is not None
+
+
+def iter_prices(text: str, pos: int = 0) -> Iterator[re.Match]:
+    """Matches de PRICE_PATTERN desde pos; si no queda ningún dígito no se
+    recorre el texto con el regex completo."""
+    if may_contain_price(text, pos):
+        yield from PRICE_PATTERN.finditer(text, pos)
+
+
+def scan_bounds(text: str) -> Tuple[List[int], List[int], List[int], List[int]]:
+    """Inicios y fines de precios y de keywords en una pasada. Cada precio
+    cuenta también como keyword (contiene su moneda), como con una búsqueda
+    de keywords aparte."""
+    p_starts: List[int] = []
+    p_ends: List[int] = []
+    k_starts: List[int] = []
+    k_ends: List[int] = []
+    for m in TOKEN_RE.finditer(text):
+        start, end = m.span()
+        if m.start("price") >= 0:
+            p_starts.append(start)
+            p_ends.append(end)
+        k_starts.append(start)
+        k_ends.append(end)
+    return p_starts, p_ends, k_starts, k_ends
+
+
+def has_price_signal(text: str) -> bool:
+    """True si el texto contiene un precio o una keyword de precio."""
+    return TOKEN_RE.search(text) is not None
+
+
+__all__ = [
+    "PRICE_PATTERN", "TOKEN_RE", "BARE_AMOUNT_RE", "CURRENCY_CODES", "KEYWORDS",
+    "may_contain_price", "iter_prices", "scan_bounds", "has_price_signal",
+]
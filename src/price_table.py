@@ -0,0 +1,118 @@
+import sys
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Códigos de moneda compartidos por todas las tablas: cada fila guarda un
+# índice de 2 bytes en vez de una referencia a un str
+CURRENCIES: List[Optional[str]] = [None]
+_CURRENCY_CODES: Dict[Optional[str], int] = {None: 0}
+_codes_lock = threading.Lock()
+
+
+def currency_code(currency: Optional[str]) -> int:
+    code = _CURRENCY_CODES.get(currency)
+    if code is None:
+        with _codes_lock:
+            code = _CURRENCY_CODES.get(currency)
+            if code is None:
+                code = len(CURRENCIES)
+                CURRENCIES.append(currency)
+                _CURRENCY_CODES[currency] = code
+    return code
+
+
+@dataclass(frozen=True, slots=True)
+class PriceCandidate:
+    raw: str
+    value: float
+    currency: Optional[str]
+    context: str
+
+    def to_dict(self) -> Dict:
+        return {"raw": self.raw, "value": self.value, "currency": self.currency, "context": self.context}
+
+
+def _intern(text: Optional[str]) -> Optional[str]:
+    # Los contextos se repiten (misma tarjeta vista por heurística y LLM,
+    # mismo producto en varias páginas): se guarda una sola copia
+    return sys.intern(text) if type(text) is str else text
+
+
+class PriceTable:
+    """Lista de precios en columnas: valores en un array de doubles, moneda
+    como código pequeño (CURRENCIES) y raw/contexto internados.
+
+    Es el contenedor que recorre el pipeline (heurística, merge con el LLM);
+    to_dicts() da el formato de siempre para JSON/API.
+    """
+
+    __slots__ = ("value", "currency", "raw", "context")
+
+    def __init__(self):
+        self.value = array("d")
+        self.currency = array("H")
+        self.raw: List[Optional[str]] = []
+        self.context: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def append(self, raw: Optional[str], value: Optional[float], currency: Optional[str],
+               context: Optional[str]):
+        self.value.append(float("nan") if value is None else value)
+        self.currency.append(currency_code(currency))
+        self.raw.append(_intern(raw))
+        self.context.append(_intern(context))
+
+    @classmethod
+    def from_candidates(cls, candidates: Iterable[PriceCandidate]) -> "PriceTable":
+        table = cls()
+        for c in candidates:
+            table.append(c.raw, c.value, c.currency, c.context)
+        return table
+
+    @classmethod
+    def from_dicts(cls, prices: Iterable[Dict]) -> "PriceTable":
+        """Desde dicts (LLM, JSON guardado). Se conservan raw, value,
+        currency y context; un value no numérico queda vacío (None)."""
+        table = cls()
+        for p in prices:
+            value = p.get("value")
+            table.append(p.get("raw"), value if isinstance(value, (int, float)) else None,
+                         p.get("currency"), p.get("context"))
+        return table
+
+    @classmethod
+    def merge(cls, *tables: Optional["PriceTable"]) -> "PriceTable":
+        """Concatena en orden y deduplica por (valor a 4 decimales, moneda,
+        raw), como merge_results."""
+        out = cls()
+        seen = set()
+        for table in tables:
+            if not table:
+                continue
+            for i, value in enumerate(table.value):
+                key = (round(value, 4) if value == value else None, table.currency[i], table.raw[i])
+                if key not in seen:
+                    seen.add(key)
+                    out.value.append(value)
+                    out.currency.append(table.currency[i])
+                    out.raw.append(table.raw[i])
+                    out.context.append(table.context[i])
+        return out
+
+    def pairs(self) -> Iterator[Tuple[Optional[float], Optional[str]]]:
+        """(valor, moneda) por fila."""
+        for value, code in zip(self.value, self.currency):
+            yield (None if value != value else value), CURRENCIES[code]
+
+    def to_dicts(self) -> List[Dict]:
+        return [
+            {"raw": raw, "value": None if value != value else value, "currency": CURRENCIES[code], "context": context}
+            for raw, value, code, context in zip(self.raw, self.value, self.currency, self.context)
+        ]
+
+
+__all__ = ["PriceCandidate", "PriceTable", "CURRENCIES", "currency_code"]
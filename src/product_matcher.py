@@ -0,0 +1,261 @@
+"""Índice de productos para vincular precios entre corridas y tiendas.
+
+Cada texto (contexto o nombre de un precio) se normaliza a una clave: sin
+acentos, precios, textos de la tienda ("vista rápida", "añadir al carrito")
+ni stopwords, con los tokens ordenados. Una clave ya vista resuelve por
+diccionario; el resto se compara con rapidfuzz (fuzz.ratio sobre tokens
+ordenados, es decir token_sort_ratio) sólo contra los productos que
+comparten alguno de sus tokens menos frecuentes (índice invertido), con
+process.cdist por bloque. Los ids se guardan en SQLite y son estables entre
+corridas.
+
+    python src/product_matcher.py productos.sqlite resultados.ndjson > con_ids.ndjson
+"""
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from price_scanner import PRICE_PATTERN
+
+# Textos de interfaz que las tiendas pegan a la tarjeta del producto
+NOISE_RE = re.compile(
+    r"vista rapida|anadir al carrito|agregar al carrito|comprar ahora|comprar|ver producto|"
+    r"envio gratis|oferta|nuevo|agotado|sin stock|en stock"
+)
+STOPWORDS = {"de", "del", "la", "las", "el", "los", "y", "e", "o", "con", "para", "por", "en", "a", "al", "x"}
+_JOIN_RE = re.compile(r"(?<=[a-z0-9])[-./](?=[a-z0-9])")
+_UNIT_RE = re.compile(r"(\d)\s+(cm|mm|mts?|m|kg|gr?|lts?|l|ml|in|w|v)\b")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+# Puntaje mínimo (0-100) de token_sort_ratio para considerar dos textos el mismo producto
+MATCH_THRESHOLD = 88
+# Tokens menos frecuentes de cada consulta que definen sus bloques de candidatos
+BLOCK_TOKENS = 2
+# Celdas máximas de una matriz de cdist (consultas × candidatos) por llamada
+MAX_CELLS = 20_000_000
+
+
+def normalize_name(text: str) -> str:
+    """Clave de comparación: tokens en minúsculas, sin acentos ni ruido, ordenados."""
+    text = PRICE_PATTERN.sub(" ", text or "")
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = NOISE_RE.sub(" ", text)
+    # "SG-4821" -> "sg4821", "62 cm" -> "62cm"
+    text = _UNIT_RE.sub(r"\1\2", _JOIN_RE.sub("", text))
+    tokens = {t for t in _NON_ALNUM_RE.split(text) if t and t not in STOPWORDS}
+    return " ".join(sorted(tokens))
+
+
+def _numbers(key: str) -> frozenset:
+    return frozenset(_DIGITS_RE.findall(key))
+
+
+def _compatible(a: str, b: str) -> bool:
+    """Modelos y medidas deben coincidir: "silla 62cm" no es "silla 59cm"
+    aunque el texto se parezca. Si uno no tiene números, o los de uno
+    incluyen a los del otro, se acepta."""
+    na, nb = _numbers(a), _numbers(b)
+    return na <= nb or nb <= na
+
+
+class ProductIndex:
+    """Productos conocidos (SQLite, ":memory:" sin ruta) con índice en memoria.
+
+    match() devuelve un product_id por texto: el del producto conocido más
+    parecido si supera threshold, o uno nuevo (create=True). Los textos
+    nuevos de un mismo lote que se parecen entre sí reciben el mismo id.
+    """
+
+    def __init__(self, path: str | Path | None = None, threshold: int = MATCH_THRESHOLD):
+        if path is None:
+            target = ":memory:"
+        else:
+            path = Path(path)
+            if path.suffix not in {".sqlite", ".db"}:
+                path.mkdir(parents=True, exist_ok=True)
+                path = path / "products.sqlite"
+            target = str(path)
+        self.path = path
+        self.threshold = threshold
+        self.stats: Dict[str, int] = {"exact": 0, "fuzzy": 0, "new": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(target, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS catalog (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+        # Fila i del índice: ids[i], keys[i]; postings: token -> filas ascendentes
+        self._ids: List[int] = []
+        self._keys: List[str] = []
+        self._by_key: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for pid, key in self._db.execute("SELECT id, key FROM catalog ORDER BY id"):
+            self._index(pid, key)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _index(self, pid: int, key: str):
+        row = len(self._ids)
+        self._ids.append(pid)
+        self._keys.append(key)
+        self._by_key[key] = pid
+        for token in key.split():
+            self._postings[token].append(row)
+
+    def _insert(self, key: str, name: str) -> int:
+        pid = self._db.execute("INSERT INTO catalog (key, name, created_at) VALUES (?, ?, ?)",
+                               (key, name, time.time())).lastrowid
+        self._index(pid, key)
+        return pid
+
+    def add_many(self, names: Iterable[str]) -> int:
+        """Carga productos sin compararlos (p. ej. un catálogo ya depurado).
+        Devuelve cuántos se agregaron (las claves repetidas se ignoran)."""
+        added = 0
+        with self._lock, self._db:
+            for name in names:
+                key = normalize_name(name)
+                if key and key not in self._by_key:
+                    self._insert(key, name)
+                    added += 1
+        return added
+
+    def _blocks(self, keys: Sequence[str], pending: Iterable[int], since: int = 0) -> Dict[str, List[int]]:
+        """token -> consultas cuyo bloque incluye ese token (sus BLOCK_TOKENS
+        tokens con menos productos, contando sólo filas >= since)."""
+        blocks: Dict[str, List[int]] = defaultdict(list)
+        for i in pending:
+            sizes = []
+            for token in keys[i].split():
+                rows = self._postings.get(token)
+                n = len(rows) - bisect_left(rows, since) if rows else 0
+                if n:
+                    sizes.append((n, token))
+            for _, token in sorted(sizes)[:BLOCK_TOKENS]:
+                blocks[token].append(i)
+        return blocks
+
+    def _best_matches(self, keys: Sequence[str], pending: List[int], since: int = 0) -> Dict[int, int]:
+        """Consulta -> fila del mejor candidato (>= threshold y compatible)."""
+        best: Dict[int, tuple] = {}
+        for token, queries in self._blocks(keys, pending, since).items():
+            rows = self._postings[token]
+            rows = rows[bisect_left(rows, since):]
+            choices = [self._keys[r] for r in rows]
+            step = max(1, MAX_CELLS // len(rows))
+            for start in range(0, len(queries), step):
+                part = queries[start:start + step]
+                scores = process.cdist([keys[i] for i in part], choices, scorer=fuzz.ratio,
+                                       score_cutoff=self.threshold, dtype=np.uint8, workers=-1)
+                for qi, row_scores in zip(part, scores):
+                    hits = np.flatnonzero(row_scores)
+                    if not len(hits):
+                        continue
+                    current = best.get(qi, (0, None))[0]
+                    for j in hits[np.argsort(-row_scores[hits], kind="stable")]:
+                        score = int(row_scores[j])
+                        if score <= current:
+                            break
+                        if _compatible(keys[qi], choices[j]):
+                            best[qi] = (score, rows[j])
+                            break
+        return {i: row for i, (_, row) in best.items()}
+
+    def match(self, names: Sequence[str], create: bool = True) -> List[Optional[int]]:
+        keys = [normalize_name(n) for n in names]
+        out: List[Optional[int]] = [None] * len(keys)
+        with self._lock:
+            pending = []
+            for i, key in enumerate(keys):
+                pid = self._by_key.get(key) if key else None
+                if pid is not None:
+                    out[i] = pid
+                    self.stats["exact"] += 1
+                elif key:
+                    pending.append(i)
+            for i, row in self._best_matches(keys, pending).items():
+                out[i] = self._ids[row]
+                self.stats["fuzzy"] += 1
+            if not create:
+                return out
+            # Los nuevos se comparan sólo con los creados en este mismo lote
+            since = len(self._ids)
+            with self._db:
+                for i in pending:
+                    if out[i] is not None:
+                        continue
+                    key = keys[i]
+                    pid = self._by_key.get(key)
+                    if pid is None:
+                        row = self._best_matches(keys, [i], since).get(i)
+                        if row is not None:
+                            pid = self._ids[row]
+                            self.stats["fuzzy"] += 1
+                        else:
+                            pid = self._insert(key, names[i])
+                            self.stats["new"] += 1
+                    else:
+                        self.stats["exact"] += 1
+                    out[i] = pid
+        return out
+
+    def annotate(self, records: Iterable[Dict]) -> None:
+        """Agrega "product_id" a cada precio de registros {"prices": [...]}."""
+        prices = [p for r in records for p in r.get("prices") or ()]
+        ids = self.match([p.get("context") or p.get("raw") or "" for p in prices])
+        for p, pid in zip(prices, ids):
+            p["product_id"] = pid
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asigna product_id a los precios de un NDJSON de resultados")
+    parser.add_argument("db", help="Ruta de la base (o directorio) de productos")
+    parser.add_argument("input", help="NDJSON de resultados ('-' para stdin)")
+    parser.add_argument("--threshold", type=int, default=MATCH_THRESHOLD, help="Puntaje mínimo (0-100)")
+    args = parser.parse_args()
+
+    index = ProductIndex(args.db, threshold=args.threshold)
+    f = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    try:
+        records = [json.loads(ln) for ln in f if ln.strip()]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    index.annotate(records)
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+    s = index.stats
+    print(f"Productos: {s['exact']} exactos, {s['fuzzy']} por similitud, {s['new']} nuevos "
+          f"({len(index)} en el índice)", file=sys.stderr)
+    index.close()
+
+
+__all__ = ["ProductIndex", "normalize_name"]
+
+if __name__ == "__main__":
+    main()
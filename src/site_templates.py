@@ -0,0 +1,379 @@
+"""Plantillas de extracción aprendidas por dominio.
+
+Las páginas de un mismo sitio repiten la misma tarjeta de producto. Tras una
+extracción con LLM se ubican sus precios en el DOM, se infiere la tarjeta
+(XPath de la tarjeta, de sus precios y de su nombre) y se guarda por dominio.
+En las páginas siguientes la plantilla se aplica con lxml sin llamar al LLM,
+mientras su confianza en la página no baje del umbral.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from lxml import etree
+
+import metrics
+from html_reducer import _RelevanceIndex, _parse
+from price_extractor import _candidate_from_match
+from price_scanner import has_price_signal, iter_prices
+from price_table import PriceTable
+
+# Un precio se ubica en el elemento más profundo que lo contiene, siempre que
+# el texto de ese elemento no supere estos caracteres
+ELEMENT_MAX_CHARS = 200
+CONTEXT_CHARS = 120
+
+MIN_CARDS = 2
+# Un camino relativo de precio se conserva si aparece en esta fracción de tarjetas
+MIN_PATH_SUPPORT = 0.2
+# Validación de la plantilla sobre la misma página de la que se aprende
+MIN_PRECISION = 0.8
+MIN_RECALL = 0.5
+
+NAME_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+IGNORED_TAGS = ("script", "style", "noscript", "template")
+# Clases de estado que no todas las tarjetas del sitio comparten
+STATE_CLASSES = {"first", "last", "instock", "outofstock", "onbackorder", "sale", "featured", "active",
+                 "selected", "hidden", "odd", "even"}
+
+WS_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d")
+
+
+def site_key(url: str) -> str:
+    """Dominio de la URL sin "www."; las plantillas se guardan por esta clave."""
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+@dataclass(frozen=True)
+class SiteTemplate:
+    card: str                  # XPath absoluto de las tarjetas
+    prices: Tuple[str, ...]    # XPaths de los precios, relativos a la tarjeta
+    name: Optional[str]        # XPath del nombre, relativo a la tarjeta
+    coverage: float            # fracción de precios visibles cubierta al aprender
+    cards: int                 # tarjetas en la página de la que se aprendió
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> "SiteTemplate":
+        d = json.loads(data)
+        return cls(d["card"], tuple(d["prices"]), d.get("name"), d["coverage"], d["cards"])
+
+    def apply(self, root) -> Tuple[List[Dict], int, int]:
+        """(precios, tarjetas encontradas, tarjetas con al menos un precio)."""
+        out: List[Dict] = []
+        cards = root.xpath(self.card)
+        with_price = 0
+        for card in cards:
+            name = None
+            if self.name:
+                for el in card.xpath(self.name):
+                    name = _text(el)
+                    if name:
+                        break
+            context = (name or _text(card))[:CONTEXT_CHARS]
+            found = False
+            for rel in self.prices:
+                for el in card.xpath(rel):
+                    text = _text(el)
+                    for match in iter_prices(text):
+                        c = _candidate_from_match(match, text, 0)
+                        if c is not None:
+                            out.append({"raw": c.raw, "value": c.value, "currency": c.currency, "context": context})
+                            found = True
+            with_price += found
+        return out, len(cards), with_price
+
+    def confidence(self, prices: List[Dict], cards: int, with_price: int,
+                   visible: Iterable[Tuple[float, Optional[str]]]) -> float:
+        """Tarjetas con precio × cobertura de precios visibles relativa a la de
+        la página de aprendizaje (un rediseño hace caer una o la otra)."""
+        if not cards:
+            return 0.0
+        score = with_price / cards
+        if self.coverage > 0:
+            score *= min(1.0, _coverage(prices, visible) / self.coverage)
+        return score
+
+
+def _collapse(text: str) -> str:
+    return WS_RE.sub(" ", text or "").strip()
+
+
+def _text(el) -> str:
+    # Un espacio por tag, como el texto sobre el que corre la heurística
+    return _collapse(" ".join(el.itertext()))
+
+
+def _value_key(value) -> Optional[float]:
+    return round(value, 2) if value is not None and value == value else None
+
+
+def _coverage(prices: List[Dict], visible: Iterable[Tuple[float, Optional[str]]]) -> float:
+    found = {_value_key(p["value"]) for p in prices}
+    keys = [k for k in (_value_key(v) for v, _ in visible) if k is not None]
+    if not keys:
+        return 1.0
+    return sum(k in found for k in keys) / len(keys)
+
+
+def _tree(html: str):
+    root = _parse(html)
+    etree.strip_elements(root, etree.Comment, etree.ProcessingInstruction, *IGNORED_TAGS, with_tail=False)
+    return root
+
+
+def _classes(el) -> set:
+    return set(el.get("class", "").split())
+
+
+def _class_test(elements, root=None) -> str:
+    """Predicado XPath con una clase común a todos los elementos. Se evitan
+    las que llevan números (post-123) y las de estado (instock, sale), que
+    cambian entre productos; con root, se prefiere la que menos elementos
+    de ese tag selecciona en la página."""
+    common = set.intersection(*(_classes(el) for el in elements))
+    if not common:
+        return ""
+    tag = elements[0].tag
+
+    def rank(c: str):
+        selected = len(root.xpath(f"//{tag}" + _has_class(c))) if root is not None else 0
+        return bool(_DIGITS_RE.search(c)), c.lower() in STATE_CLASSES, selected, len(c), c
+
+    return _has_class(min(common, key=rank))
+
+
+def _has_class(c: str) -> str:
+    return f"[contains(concat(' ', normalize-space(@class), ' '), ' {c} ')]"
+
+
+def _tag_path(el) -> Tuple[str, ...]:
+    path = [el.tag]
+    path.extend(a.tag for a in el.iterancestors())
+    return tuple(reversed(path))
+
+
+def _locate_prices(root, llm_prices: List[Dict]) -> List:
+    """Elementos más profundos cuyo texto contiene alguno de los precios del
+    LLM (mismo valor a 2 decimales y moneda compatible)."""
+    targets: Dict[float, set] = defaultdict(set)
+    for value, currency in PriceTable.from_dicts(llm_prices).pairs():
+        key = _value_key(value)
+        if key is not None:
+            targets[key].add(currency)
+    if not targets:
+        return []
+    body = root.find("body")
+    index = _RelevanceIndex(body if body is not None else root)
+    # Orden por inicio; sort estable: ante empates el ancestro queda primero
+    spans = sorted(((s, e, el) for el, (s, e) in index.spans.items() if e - s <= ELEMENT_MAX_CHARS),
+                   key=lambda t: t[0])
+    starts = [s for s, _, _ in spans]
+    located: Dict = {}
+    for match in iter_prices(index.text):
+        c = _candidate_from_match(match, index.text, 0)
+        currencies = targets.get(_value_key(c.value)) if c is not None else None
+        if not currencies or not (None in currencies or c.currency is None or c.currency in currencies):
+            continue
+        start, end = match.span()
+        # El último elemento (en orden de documento) que contiene el match es el más profundo
+        for j in range(bisect_right(starts, start) - 1, -1, -1):
+            s, e, el = spans[j]
+            if s < start - ELEMENT_MAX_CHARS:
+                break
+            if e >= end:
+                located[el] = None
+                break
+    return list(located)
+
+
+def _choose_cards(located: List) -> Optional[Tuple[Tuple[str, ...], Dict]]:
+    """Nivel de tarjeta: el camino de tags más externo cuyos elementos
+    separan los precios en al menos MIN_CARDS tarjetas sin que una tarjeta
+    repita el mismo camino relativo de precio (eso sería un contenedor de
+    varias tarjetas, p. ej. una fila de la grilla)."""
+    paths = {el: _tag_path(el) for el in located}
+    groups: Dict[Tuple[str, ...], Dict] = defaultdict(lambda: defaultdict(list))
+    for el in located:
+        node = el
+        while node is not None:
+            groups[_tag_path(node)][node].append(el)
+            node = node.getparent()
+    best = None
+    for key, cards in groups.items():
+        covered = sum(len(v) for v in cards.values())
+        if len(cards) < MIN_CARDS or covered < len(located) / 2:
+            continue
+        if any(len({paths[el][len(key):] for el in els}) < len(els) for els in cards.values()):
+            continue
+        rank = (len(key), -len(cards))
+        if best is None or rank < best[0]:
+            best = (rank, key, cards)
+    return (best[1], best[2]) if best else None
+
+
+def _name_path(cards: Dict, key: Tuple[str, ...]) -> Optional[str]:
+    """Camino del primer encabezado (o enlace) con texto que no es un precio,
+    el más frecuente entre las tarjetas."""
+    found = defaultdict(list)
+    for card in cards:
+        fallback = None
+        for el in card.iterdescendants():
+            if not isinstance(el.tag, str):
+                continue
+            text = _text(el)
+            if len(text) < 3 or has_price_signal(text) and len(text) < 20:
+                continue
+            if el.tag in NAME_TAGS:
+                found[_tag_path(el)[len(key):]].append(el)
+                break
+            if fallback is None and el.tag == "a":
+                fallback = el
+        else:
+            if fallback is not None:
+                found[_tag_path(fallback)[len(key):]].append(fallback)
+    if not found:
+        return None
+    rel, els = max(found.items(), key=lambda kv: len(kv[1]))
+    if len(els) < len(cards) / 2:
+        return None
+    return _rel_xpath(rel, els)
+
+
+def _rel_xpath(rel: Tuple[str, ...], elements) -> str:
+    if not rel:
+        return "."
+    return "./" + "/".join(rel) + _class_test(elements)
+
+
+def learn_template(html: str, llm_prices: List[Dict],
+                   visible: Iterable[Tuple[float, Optional[str]]]) -> Optional[SiteTemplate]:
+    """Infiere una plantilla de los precios que el LLM encontró en la página.
+    None si no hay tarjetas repetidas o la plantilla no reproduce los precios
+    del LLM en la misma página."""
+    root = _tree(html)
+    located = _locate_prices(root, llm_prices)
+    if len(located) < MIN_CARDS:
+        return None
+    chosen = _choose_cards(located)
+    if chosen is None:
+        return None
+    key, cards = chosen
+    card_test = _class_test(list(cards), root)
+    card = f"//{key[-1]}{card_test}" if card_test else "/" + "/".join(key)
+
+    paths = defaultdict(list)
+    for els in cards.values():
+        for el in els:
+            paths[_tag_path(el)[len(key):]].append(el)
+    min_support = max(1, MIN_PATH_SUPPORT * len(cards))
+    prices = tuple(_rel_xpath(rel, els) for rel, els in sorted(paths.items(), key=lambda kv: -len(kv[1]))
+                   if len(els) >= min_support)
+
+    template = SiteTemplate(card, prices, _name_path(cards, key), 0.0, len(cards))
+    got, n_cards, _ = template.apply(root)
+    found = Counter(_value_key(p["value"]) for p in got)
+    wanted = {_value_key(v) for v, _ in PriceTable.from_dicts(llm_prices).pairs()} - {None}
+    if not got or not n_cards:
+        return None
+    precision = sum(n for k, n in found.items() if k in wanted) / sum(found.values())
+    recall = len(wanted & found.keys()) / len(wanted)
+    if precision < MIN_PRECISION or recall < MIN_RECALL:
+        return None
+    return SiteTemplate(card, prices, template.name, _coverage(got, list(visible)), n_cards)
+
+
+class TemplateStore:
+    """Plantillas por dominio en SQLite, con copia en memoria.
+
+    extract() aplica la plantilla del dominio y devuelve sus precios si la
+    confianza alcanza min_confidence (None si hay que llamar al LLM); learn()
+    aprende o reemplaza la plantilla con el resultado del LLM.
+    """
+
+    def __init__(self, path: str | Path, min_confidence: float = 0.8):
+        path = Path(path)
+        if path.suffix not in {".sqlite", ".db"}:
+            path.mkdir(parents=True, exist_ok=True)
+            path = path / "templates.sqlite"
+        self.path = path
+        self.min_confidence = min_confidence
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "unknown": 0, "learned": 0, "unlearnable": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS templates (
+                domain TEXT PRIMARY KEY,
+                template TEXT NOT NULL,
+                source_url TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._db.commit()
+        self._templates: Dict[str, Optional[SiteTemplate]] = {}
+
+    def get(self, domain: str) -> Optional[SiteTemplate]:
+        with self._lock:
+            if domain not in self._templates:
+                row = self._db.execute("SELECT template FROM templates WHERE domain = ?", (domain,)).fetchone()
+                self._templates[domain] = SiteTemplate.from_json(row[0]) if row else None
+            return self._templates[domain]
+
+    def put(self, domain: str, template: SiteTemplate, source_url: str = ""):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO templates (domain, template, source_url, updated_at) VALUES (?, ?, ?, ?)",
+                (domain, template.to_json(), source_url, time.time()),
+            )
+            self._db.commit()
+            self._templates[domain] = template
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+        metrics.inc("cache_events_total", cache="template", event=stat)
+
+    def extract(self, url: str, html: str, visible: Iterable[Tuple[float, Optional[str]]]) -> Optional[List[Dict]]:
+        template = self.get(site_key(url))
+        if template is None:
+            self._count("unknown")
+            return None
+        with metrics.timed("template"):
+            prices, cards, with_price = template.apply(_tree(html))
+            confident = prices and template.confidence(prices, cards, with_price, visible) >= self.min_confidence
+        if confident:
+            self._count("hits")
+            return prices
+        self._count("misses")
+        return None
+
+    def learn(self, url: str, html: str, llm_prices: List[Dict],
+              visible: Iterable[Tuple[float, Optional[str]]]) -> Optional[SiteTemplate]:
+        with metrics.timed("template_learn"):
+            template = learn_template(html, llm_prices, visible)
+        if template is None:
+            self._count("unlearnable")
+            return None
+        self.put(site_key(url), template, url)
+        self._count("learned")
+        return template
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+__all__ = ["SiteTemplate", "TemplateStore", "learn_template", "site_key"]
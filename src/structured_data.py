@@ -0,0 +1,272 @@
+"""Precios desde datos estructurados: JSON-LD, microdata y meta tags.
+
+Muchas tiendas (WooCommerce incluido) publican schema.org/Product con sus
+Offer en <script type="application/ld+json">, que la heurística descarta
+junto con el resto de los scripts. Si esos datos cubren todos los precios
+visibles de la página, el LLM no aporta nada y se puede omitir.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lxml import etree, html as lxml_html
+
+import metrics
+from price_extractor import _normalize_amount
+
+_JSONLD_RE = re.compile(
+    r"<script\b[^>]*\btype\s*=\s*[\"']?application/ld\+json[\"']?[^>]*>(.*?)</script\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+_META_RE = re.compile(r"<meta\b[^>]*>", re.IGNORECASE)
+_ATTR_RE = re.compile(r"""([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+_CDATA_RE = re.compile(r"^\s*(?://\s*)?<!\[CDATA\[|(?://\s*)?\]\]>\s*$")
+
+PRODUCT_TYPES = {"Product", "IndividualProduct", "ProductModel", "SomeProducts", "ProductGroup", "Vehicle"}
+
+# Precios equivalentes: mismo valor a 2 decimales (y misma moneda si ambas se conocen)
+_VALUE_DECIMALS = 2
+
+
+@dataclass(frozen=True, slots=True)
+class StructuredOffer:
+    name: Optional[str]
+    price: float
+    currency: Optional[str]
+    sku: Optional[str] = None
+    availability: Optional[str] = None
+    source: str = "json-ld"
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "price": self.price, "currency": self.currency, "sku": self.sku,
+                "availability": self.availability, "source": self.source}
+
+    def to_price(self) -> Dict:
+        """Como fila de "prices" (raw, value, currency, context)."""
+        raw = f"{self.price:.2f} {self.currency}" if self.currency else f"{self.price:.2f}"
+        context = " ".join(p for p in (self.name, f"SKU {self.sku}" if self.sku else None) if p)
+        return {"raw": raw, "value": self.price, "currency": self.currency, "context": context}
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _types(node: Dict) -> set:
+    return {str(t).rsplit("/", 1)[-1] for t in _as_list(node.get("@type"))}
+
+
+def _text(value) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("@id")
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _price(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if value:
+            return _normalize_amount(value)
+    return None
+
+
+def _availability(value) -> Optional[str]:
+    value = _text(value)
+    return value.rsplit("/", 1)[-1] if value else None
+
+
+def _jsonld_offers(offer: Dict, name, sku) -> Iterator[StructuredOffer]:
+    types = _types(offer)
+    spec = offer.get("priceSpecification")
+    spec = _as_list(spec)[0] if spec else {}
+    currency = _text(offer.get("priceCurrency")) or _text(spec.get("priceCurrency") if isinstance(spec, dict) else None)
+    availability = _availability(offer.get("availability"))
+    sku = _text(offer.get("sku")) or sku
+    if "AggregateOffer" in types:
+        nested = [o for o in _as_list(offer.get("offers")) if isinstance(o, dict)]
+        if nested:
+            for o in nested:
+                yield from _jsonld_offers(o, name, sku)
+            return
+        prices = [_price(offer.get("lowPrice")), _price(offer.get("highPrice"))]
+    else:
+        price = offer.get("price")
+        if price is None and isinstance(spec, dict):
+            price = spec.get("price")
+        prices = [_price(price)]
+    seen = set()
+    for value in prices:
+        if value is not None and value not in seen:
+            seen.add(value)
+            yield StructuredOffer(name, value, currency, sku, availability, "json-ld")
+
+
+def _walk_jsonld(node, out: List[StructuredOffer]):
+    if isinstance(node, list):
+        for item in node:
+            _walk_jsonld(item, out)
+        return
+    if not isinstance(node, dict):
+        return
+    if _types(node) & PRODUCT_TYPES:
+        name, sku = _text(node.get("name")), _text(node.get("sku"))
+        for offer in _as_list(node.get("offers")):
+            if isinstance(offer, dict):
+                out.extend(_jsonld_offers(offer, name, sku))
+        # Variantes de un ProductGroup
+        _walk_jsonld(node.get("hasVariant"), out)
+        return
+    for key, value in node.items():
+        if isinstance(value, (dict, list)) and key != "offers":
+            _walk_jsonld(value, out)
+
+
+def _parse_jsonld(block: str):
+    block = _CDATA_RE.sub("", block.strip())
+    try:
+        return json.loads(block)
+    except ValueError:
+        # Algunos temas concatenan varios objetos o dejan comas finales
+        try:
+            return json.loads(re.sub(r",\s*([\]}])", r"\1", block))
+        except ValueError:
+            return None
+
+
+def _attrs(tag: str) -> Dict[str, str]:
+    return {m.group(1).lower(): next(g for g in m.groups()[1:] if g is not None) for m in _ATTR_RE.finditer(tag)}
+
+
+def _meta_offers(html: str) -> List[StructuredOffer]:
+    """OpenGraph de producto: product:price:amount / og:price:amount."""
+    props = {}
+    for tag in _META_RE.findall(html):
+        attrs = _attrs(tag)
+        key = (attrs.get("property") or attrs.get("name") or "").lower()
+        if key and "content" in attrs:
+            props.setdefault(key, attrs["content"])
+    amount = props.get("product:price:amount") or props.get("og:price:amount")
+    price = _price(amount)
+    if price is None:
+        return []
+    currency = props.get("product:price:currency") or props.get("og:price:currency")
+    availability = _availability(props.get("product:availability") or props.get("og:availability"))
+    return [StructuredOffer(props.get("og:title"), price, currency or None, props.get("product:retailer_item_id"),
+                            availability, "meta")]
+
+
+def _itemprop(scope, prop: str) -> Optional[str]:
+    for el in scope.iterfind(f".//*[@itemprop='{prop}']"):
+        value = el.get("content") or el.get("href") or el.text_content()
+        value = (value or "").strip()
+        if value:
+            return value
+    return None
+
+
+def _microdata_offers(html: str) -> List[StructuredOffer]:
+    try:
+        root = lxml_html.document_fromstring(html)
+    except ValueError:
+        # str con declaración de encoding
+        root = lxml_html.document_fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        return []
+    out = []
+    for product in root.iterfind(".//*[@itemtype]"):
+        itemtype = product.get("itemtype", "")
+        if not any(itemtype.rstrip("/").endswith("/" + t) for t in PRODUCT_TYPES):
+            continue
+        name, sku = _itemprop(product, "name"), _itemprop(product, "sku")
+        for offer in product.iterfind(".//*[@itemprop='offers']"):
+            price = _price(_itemprop(offer, "price") or _itemprop(offer, "lowPrice"))
+            if price is not None:
+                out.append(StructuredOffer(name, price, _itemprop(offer, "priceCurrency"), sku,
+                                           _availability(_itemprop(offer, "availability")), "microdata"))
+    return out
+
+
+def extract_structured_offers(html: str) -> List[StructuredOffer]:
+    """Offers de JSON-LD, microdata y meta tags de producto, sin duplicados.
+
+    Los scripts JSON-LD y los meta tags se ubican con regex sobre el HTML
+    crudo; el árbol sólo se parsea si hay atributos itemprop de precio.
+    """
+    if not html:
+        return []
+    offers: List[StructuredOffer] = []
+    for block in _JSONLD_RE.findall(html):
+        data = _parse_jsonld(block)
+        if data is not None:
+            _walk_jsonld(data, offers)
+    if "price:amount" in html:
+        offers.extend(_meta_offers(html))
+    if "itemprop" in html and re.search(r"itemprop\s*=\s*[\"']?price", html):
+        offers.extend(_microdata_offers(html))
+    seen = set()
+    unique = []
+    for o in offers:
+        key = (o.name, round(o.price, _VALUE_DECIMALS), o.currency)
+        if key not in seen:
+            seen.add(key)
+            unique.append(o)
+    return unique
+
+
+def match_offers(offers: List[StructuredOffer], prices: Iterable[Tuple[float, Optional[str]]]) -> Tuple[float, List[StructuredOffer]]:
+    """Compara las offers con los precios visibles (valor, moneda).
+
+    Devuelve (cobertura, offers sin precio visible equivalente): la
+    cobertura es la fracción de precios visibles que alguna offer explica
+    (1.0 si no hay precios visibles pero sí offers). Dos precios son
+    equivalentes con el mismo valor a 2 decimales y la misma moneda, si
+    ambas se conocen.
+    """
+    if not offers:
+        return 0.0, []
+    by_value: Dict[float, List[StructuredOffer]] = {}
+    for o in offers:
+        by_value.setdefault(round(o.price, _VALUE_DECIMALS), []).append(o)
+    total = covered = 0
+    matched = set()
+    for value, currency in prices:
+        if value is None or value != value:
+            continue
+        total += 1
+        hit = False
+        for o in by_value.get(round(value, _VALUE_DECIMALS), ()):
+            if o.currency is None or currency is None or o.currency == currency:
+                matched.add(id(o))
+                hit = True
+        covered += hit
+    unmatched = [o for o in offers if id(o) not in matched]
+    return (covered / total if total else 1.0), unmatched
+
+
+def structured_fast_path(html: str, visible: Iterable[Tuple[float, Optional[str]]],
+                         min_coverage: float = 1.0) -> Tuple[List[StructuredOffer], List[Dict], bool]:
+    """Datos estructurados de la página frente a sus precios visibles.
+
+    Devuelve (offers, precios de offers sin equivalente visible, completo):
+    completo es True si hay offers y explican al menos min_coverage de los
+    precios visibles; en ese caso el LLM se puede omitir.
+    """
+    with metrics.timed("structured"):
+        offers = extract_structured_offers(html)
+        coverage, unmatched = match_offers(offers, visible)
+    return offers, [o.to_price() for o in unmatched], bool(offers) and coverage >= min_coverage
+
+
+__all__ = ["StructuredOffer", "extract_structured_offers", "match_offers", "structured_fast_path"]
@@ -1,10 +1,14 @@
+import asyncio
+import hashlib
+import json
 import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -16,13 +20,64 @@ from dotenv import load_dotenv
 load_dotenv()
 load_dotenv(dotenv_path=BASE_DIR / ".env")
 
-from fetcher import fetch_html
-from html_reducer import reduce_html, clean_html
-from price_extractor import extract_prices_from_html
+from openai import AsyncOpenAI
+
+import metrics
+from fetcher import fetch_html_async, new_async_client
+from html_reducer import reduce_html
+from price_extractor import extract_price_table
+from price_table import PriceTable
+from structured_data import structured_fast_path
+from site_templates import TemplateStore
 from llm_price_extractor import LLMExtractor
+from llm_cache import LLMResultCache
+from llm_router import route_page
+from jobs import JobQueue, backend_from_url
 from emailer import send_email_smtp
 
-app = FastAPI(title="Scraper de Precios")
+# Requests LLM simultáneos por modelo, compartidos por todos los usuarios
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+
+# Omitir el LLM si JSON-LD/microdata/meta explican esta fracción de los precios visibles
+STRUCTURED_MIN_COVERAGE = float(os.getenv("STRUCTURED_MIN_COVERAGE", "1.0"))
+
+# Omitir el LLM si la heurística resuelve esta fracción de las tarjetas de
+# producto, o mandarle sólo las dudosas (llm_router; >1 desactiva el ruteo)
+ROUTE_MIN_CONFIDENCE = float(os.getenv("ROUTE_MIN_CONFIDENCE", "0.9"))
+
+# Tope por página descargada en MB, descomprimido (0 = sin tope)
+MAX_PAGE_BYTES = int(float(os.getenv("MAX_PAGE_MB", "16")) * 1024 * 1024) or None
+
+# Histogramas por etapa expuestos en /metrics (METRICS=0 los desactiva)
+metrics.enable(os.getenv("METRICS", "1") != "0")
+
+# Caché de resultados LLM compartida con el CLI (mismo LLM_CACHE_DIR)
+llm_cache = LLMResultCache(os.environ["LLM_CACHE_DIR"]) if os.getenv("LLM_CACHE_DIR") else None
+
+# Plantillas por dominio aprendidas del LLM, compartibles con el CLI (--templates-db)
+domain_templates = TemplateStore(
+    os.environ["TEMPLATES_DB"], min_confidence=float(os.getenv("TEMPLATE_MIN_CONFIDENCE", "0.8"))
+) if os.getenv("TEMPLATES_DB") else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clientes HTTP/OpenAI creados una sola vez y compartidos entre requests
+    app.state.http = new_async_client()
+    key = os.getenv("OPENAI_API_KEY")
+    app.state.openai = AsyncOpenAI(api_key=key, max_retries=0) if key else None
+    app.state.extractors = {}
+    app.state.jobs = JobQueue(run_extraction, backend_from_url(os.getenv("JOBS_BACKEND")),
+                              workers=int(os.getenv("JOB_WORKERS", "4")))
+    await app.state.jobs.start()
+    yield
+    await app.state.jobs.stop()
+    await app.state.http.aclose()
+    if app.state.openai is not None:
+        await app.state.openai.close()
+
+
+app = FastAPI(title="Scraper de Precios", lifespan=lifespan)
 
 static_dir = Path(__file__).parent / "static"
 templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
@@ -47,8 +102,114 @@ def index(request: Request):
     )
 
 
+class MissingAPIKey(RuntimeError):
+    pass
+
+
+def _get_extractor(model: str, api_key: Optional[str]):
+    """Devuelve (extractor, propio). Con la key del entorno se reutiliza un
+    extractor por modelo sobre el cliente compartido; una key enviada en el
+    formulario usa un cliente propio que se cierra al terminar el request."""
+    if api_key and api_key != os.getenv("OPENAI_API_KEY"):
+        client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        return LLMExtractor(model=model, async_client=client, cache=llm_cache,
+                            max_in_flight=LLM_MAX_IN_FLIGHT), True
+    if app.state.openai is None:
+        raise MissingAPIKey("OPENAI_API_KEY no definido (o no enviado en el formulario)")
+    extractor = app.state.extractors.get(model)
+    if extractor is None:
+        extractor = LLMExtractor(model=model, async_client=app.state.openai, cache=llm_cache,
+                                 max_in_flight=LLM_MAX_IN_FLIGHT)
+        app.state.extractors[model] = extractor
+    return extractor, False
+
+
+def _price_key(p: dict) -> tuple:
+    value = p.get("value")
+    return (round(value, 4) if value is not None else None, p.get("currency"), p.get("raw"))
+
+
+def _merge(heuristic: PriceTable, llm_result: Optional[dict], structured: Optional[list] = None) -> dict:
+    with metrics.timed("merge"):
+        llm = PriceTable.from_dicts(llm_result.get("prices", [])) if llm_result else None
+        extra = PriceTable.from_dicts(structured) if structured else None
+        return {"prices": PriceTable.merge(heuristic, extra, llm).to_dicts()}
+
+
+def _structured(html: str) -> tuple:
+    """extract_price_table + structured_fast_path, para correr en un hilo."""
+    heuristic = extract_price_table(html)
+    return (heuristic, *structured_fast_path(html, heuristic.pairs(), STRUCTURED_MIN_COVERAGE))
+
+
+async def _template_prices(url: str, html: str, heuristic: PriceTable) -> Optional[list]:
+    if domain_templates is None:
+        return None
+    return await asyncio.to_thread(domain_templates.extract, url, html, list(heuristic.pairs()))
+
+
+async def _route(html: str, max_chars: int):
+    """Decisión de llm_router en un hilo, o None si el ruteo está desactivado."""
+    if ROUTE_MIN_CONFIDENCE > 1:
+        return None
+    return await asyncio.to_thread(route_page, html, ROUTE_MIN_CONFIDENCE, max_chars)
+
+
+async def _learn_template(url: str, html: str, heuristic: PriceTable, llm_prices: list):
+    if domain_templates is not None:
+        await asyncio.to_thread(domain_templates.learn, url, html, llm_prices, list(heuristic.pairs()))
+
+
+async def run_extraction(url: str, use_llm: bool, model: str, max_chars: int,
+                         api_key: Optional[str]) -> dict:
+    """Pipeline sin bloquear el event loop: E/S async con los clientes
+    compartidos y el trabajo de CPU (heurística, reducción) en hilos."""
+    html = await fetch_html_async(url, app.state.http, max_bytes=MAX_PAGE_BYTES)
+    heuristic, offers, structured, complete = await asyncio.to_thread(_structured, html)
+    llm_result = None
+    reduced_len = None
+    skipped = None
+    route = None
+    if use_llm and complete:
+        skipped = "structured"
+    elif use_llm:
+        route = await _route(html, max_chars)
+        if route is not None and route.action == "skip":
+            skipped = "heuristic"
+    if use_llm and skipped is None:
+        template_prices = await _template_prices(url, html, heuristic)
+        if template_prices is not None:
+            skipped = "template"
+            llm_result = {"prices": template_prices}
+    if use_llm and skipped is None:
+        extractor, owned = _get_extractor(model, api_key)
+        try:
+            if route is not None and route.payload is not None:
+                html_llm = route.payload
+            else:
+                # Sin payload del ruteo (max_chars=0): la página reducida, como _llm_prices
+                html_llm = await asyncio.to_thread(reduce_html, html, max_chars)
+            reduced_len = len(html_llm)
+            llm_result = await extractor.extract_async(html_llm)
+        finally:
+            if owned:
+                extractor.close()
+                await extractor.async_client.close()
+        if route is None or route.action != "blocks" or route.payload is None:
+            await _learn_template(url, html, heuristic, llm_result.get("prices", []))
+    return {
+        "original_len": len(html),
+        "reduced_len": reduced_len,
+        "llm_skipped": skipped,
+        "llm_route": route.action if route is not None else None,
+        "llm_confidence": route.confidence if route is not None else None,
+        "offers": [o.to_dict() for o in offers],
+        "result": _merge(heuristic, llm_result, structured),
+    }
+
+
 @app.post("/extract", response_class=HTMLResponse)
-def extract_view(
+async def extract_view(
     request: Request,
     url: str = Form(...),
     use_llm: Optional[bool] = Form(False),
@@ -57,58 +218,19 @@ def extract_view(
     api_key: Optional[str] = Form(None),
 ):
     error = None
+    payload = {
+        "url": url,
+        "use_llm": bool(use_llm),
+        "model": model,
+        "max_chars": max_chars,
+        "original_len": None,
+        "reduced_len": None,
+        "result": {"prices": []},
+    }
     try:
-        html = fetch_html(url)
-        heuristic = extract_prices_from_html(html)
-        llm_result = None
-        reduced_len = None
-        original_len = len(html)
-
-        if use_llm:
-            if api_key:
-                os.environ["OPENAI_API_KEY"] = api_key
-            key = os.getenv("OPENAI_API_KEY")
-            if not key:
-                raise RuntimeError("OPENAI_API_KEY no definido (o no enviado en el formulario)")
-            html_llm = reduce_html(html, max_chars=max_chars)
-            reduced_len = len(html_llm)
-            extractor = LLMExtractor(api_key=key, model=model)
-            llm_result = extractor.extract(html_llm)
-
-        merged = {"prices": []}
-        seen = set()
-        for p in heuristic:
-            k = (round(p.get("value", 0), 4), p.get("currency"), p.get("raw"))
-            if k not in seen:
-                seen.add(k)
-                merged["prices"].append(p)
-        if llm_result:
-            for p in llm_result.get("prices", []):
-                k = (round(p.get("value", 0), 4), p.get("currency"), p.get("raw"))
-                if k not in seen:
-                    seen.add(k)
-                    merged["prices"].append(p)
-
-        payload = {
-            "url": url,
-            "use_llm": bool(use_llm),
-            "model": model,
-            "max_chars": max_chars,
-            "original_len": original_len,
-            "reduced_len": reduced_len,
-            "result": merged,
-        }
+        payload.update(await run_extraction(url, bool(use_llm), model, max_chars, api_key))
     except Exception as ex:
         error = str(ex)
-        payload = {
-            "url": url,
-            "use_llm": bool(use_llm),
-            "model": model,
-            "max_chars": max_chars,
-            "original_len": None,
-            "reduced_len": None,
-            "result": {"prices": []},
-        }
 
     return templates.TemplateResponse(
         "index.html",
@@ -128,41 +250,166 @@ def extract_view(
 
 
 @app.post("/api/extract", response_class=JSONResponse)
-def extract_api(
+async def extract_api(
     url: str = Form(...),
     use_llm: Optional[bool] = Form(False),
     model: str = Form("gpt-4.1-mini"),
     max_chars: int = Form(30000),
     api_key: Optional[str] = Form(None),
+    background: Optional[bool] = Form(False),
 ):
-    html = fetch_html(url)
-    heuristic = extract_prices_from_html(html)
-    llm_result = None
-    if use_llm:
-        if api_key:
-            os.environ["OPENAI_API_KEY"] = api_key
-        key = os.getenv("OPENAI_API_KEY")
-        if not key:
+    if background:
+        if use_llm and not api_key and app.state.openai is None:
             return JSONResponse({"error": "OPENAI_API_KEY faltante"}, status_code=400)
-        html_llm = reduce_html(html, max_chars=max_chars)
-        extractor = LLMExtractor(api_key=key, model=model)
-        llm_result = extractor.extract(html_llm)
+        job = _submit_job(url, bool(use_llm), model, max_chars, api_key)
+        return JSONResponse(_job_view(job), status_code=202)
+    try:
+        out = await run_extraction(url, bool(use_llm), model, max_chars, api_key)
+    except MissingAPIKey:
+        return JSONResponse({"error": "OPENAI_API_KEY faltante"}, status_code=400)
+    if out["offers"]:
+        return {"prices": out["result"]["prices"], "offers": out["offers"]}
+    return {"prices": out["result"]["prices"]}
 
-    merged = {"prices": []}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_extraction(url: str, use_llm: bool, model: str, max_chars: int,
+                            api_key: Optional[str]) -> AsyncIterator[str]:
+    """Como run_extraction pero emitiendo eventos SSE: los precios heurísticos
+    apenas termina la descarga y los del LLM chunk a chunk, ya deduplicados
+    contra lo enviado antes."""
     seen = set()
-    for p in heuristic:
-        k = (round(p.get("value", 0), 4), p.get("currency"), p.get("raw"))
-        if k not in seen:
-            seen.add(k)
-            merged["prices"].append(p)
-    if llm_result:
-        for p in llm_result.get("prices", []):
-            k = (round(p.get("value", 0), 4), p.get("currency"), p.get("raw"))
+
+    def fresh(prices: list) -> list:
+        out = []
+        for p in prices:
+            k = _price_key(p)
             if k not in seen:
                 seen.add(k)
-                merged["prices"].append(p)
+                out.append(p)
+        return out
+
+    extractor, owned = None, False
+    try:
+        if use_llm:
+            extractor, owned = _get_extractor(model, api_key)
+        html = await fetch_html_async(url, app.state.http, max_bytes=MAX_PAGE_BYTES)
+        yield _sse("meta", {"url": url, "original_len": len(html)})
+        heuristic, offers, structured, complete = await asyncio.to_thread(_structured, html)
+        yield _sse("prices", {"source": "heuristic", "prices": fresh(heuristic.to_dicts())})
+        if offers:
+            structured = PriceTable.from_dicts(structured).to_dicts()
+            yield _sse("prices", {"source": "structured", "prices": fresh(structured),
+                                  "offers": [o.to_dict() for o in offers]})
+        reduced_len = None
+        template_prices = route = None
+        if extractor is not None and not complete:
+            route = await _route(html, max_chars)
+            if route is None or route.action != "skip":
+                template_prices = await _template_prices(url, html, heuristic)
+        if extractor is not None and complete:
+            yield _sse("meta", {"llm_skipped": "structured"})
+        elif route is not None and route.action == "skip":
+            yield _sse("meta", {"llm_skipped": "heuristic", "confidence": route.confidence})
+        elif template_prices is not None:
+            yield _sse("meta", {"llm_skipped": "template"})
+            template_prices = PriceTable.from_dicts(template_prices).to_dicts()
+            yield _sse("prices", {"source": "template", "prices": fresh(template_prices)})
+        elif extractor is not None:
+            if route is not None and route.payload is not None:
+                html_llm = route.payload
+            else:
+                # Sin payload del ruteo (max_chars=0): la página reducida, como _llm_prices
+                html_llm = await asyncio.to_thread(reduce_html, html, max_chars)
+            reduced_len = len(html_llm)
+            yield _sse("meta", {"reduced_len": reduced_len, "model": model,
+                                "route": route.action if route is not None else None})
+            llm_prices = []
+            async for index, prices in extractor.iter_extract_async(html_llm):
+                llm = PriceTable.from_dicts(prices).to_dicts()
+                llm_prices += llm
+                yield _sse("prices", {"source": "llm", "chunk": index, "prices": fresh(llm)})
+            if route is None or route.action != "blocks" or route.payload is None:
+                await _learn_template(url, html, heuristic, llm_prices)
+        yield _sse("done", {"total": len(seen), "reduced_len": reduced_len})
+    except Exception as ex:
+        yield _sse("error", {"error": str(ex)})
+    finally:
+        if owned:
+            extractor.close()
+            await extractor.async_client.close()
+
+
+@app.post("/api/extract/stream")
+async def extract_stream(
+    url: str = Form(...),
+    use_llm: Optional[bool] = Form(False),
+    model: str = Form("gpt-4.1-mini"),
+    max_chars: int = Form(30000),
+    api_key: Optional[str] = Form(None),
+):
+    return StreamingResponse(
+        stream_extraction(url, bool(use_llm), model, max_chars, api_key),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _submit_job(url: str, use_llm: bool, model: str, max_chars: int, api_key: Optional[str]) -> dict:
+    params = {"url": url, "use_llm": use_llm, "model": model, "max_chars": max_chars}
+    # La key no se guarda con el job; sólo su hash separa la deduplicación
+    # ("env" con la key del servidor), así nadie recibe el job de otra key
+    if api_key and api_key != os.getenv("OPENAI_API_KEY"):
+        scope = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    else:
+        scope = "env"
+    return app.state.jobs.submit(params, secret={"api_key": api_key}, scope=scope)
+
+
+def _job_view(job: dict) -> dict:
+    view = {"job_id": job["id"], "status": job["status"], "url": job["params"]["url"]}
+    if job.get("result") is not None:
+        view["prices"] = job["result"]["result"]["prices"]
+        view["original_len"] = job["result"]["original_len"]
+        view["reduced_len"] = job["result"]["reduced_len"]
+        if job["result"]["offers"]:
+            view["offers"] = job["result"]["offers"]
+    if job.get("error"):
+        view["error"] = job["error"]
+    return view
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "job no encontrado"}, status_code=404)
+    return _job_view(job)
+
+
+@app.post("/api/jobs/batch")
+async def submit_batch(request: Request):
+    data = await request.json()
+    urls = data.get("urls") or []
+    if not isinstance(urls, list) or not urls:
+        return JSONResponse({"error": "urls debe ser una lista no vacía"}, status_code=400)
+    use_llm = bool(data.get("use_llm", False))
+    api_key = data.get("api_key")
+    if use_llm and not api_key and app.state.openai is None:
+        return JSONResponse({"error": "OPENAI_API_KEY faltante"}, status_code=400)
+    model = data.get("model") or "gpt-4.1-mini"
+    max_chars = int(data.get("max_chars") or 30000)
+    jobs = [_submit_job(u, use_llm, model, max_chars, api_key) for u in dict.fromkeys(urls)]
+    return JSONResponse({"jobs": [_job_view(j) for j in jobs]}, status_code=202)
+
 
-    return {"prices": merged["prices"]}
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_view():
+    """Métricas por etapa en formato de texto de Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/email")
@@ -187,7 +434,7 @@ async def email_report(request: Request):
     )
     subject = data.get("subject") or "Reporte de precios"
     try:
-        send_email_smtp(to=to, subject=subject, html_body=html_body)
+        await asyncio.to_thread(send_email_smtp, to=to, subject=subject, html_body=html_body)
     except Exception as ex:
         return JSONResponse({"ok": False, "error": str(ex)}, status_code=500)
     return {"ok": True}
@@ -60,7 +60,53 @@
     );
   }
 
+  function show(el, visible){
+    if(el) el.classList.toggle('d-none', !visible);
+  }
+
+  function setText(id, value){
+    const el = document.getElementById(id);
+    if(el) el.textContent = value;
+  }
+
+  // Motivo por el que se omitió el LLM (llm_skipped del backend)
+  const SKIPPED_LABELS = {
+    structured: 'datos estructurados',
+    template: 'plantilla del sitio',
+    heuristic: 'heurística',
+  };
+
+  function skippedLabel(reason, confidence){
+    let label = 'LLM omitido: ' + (SKIPPED_LABELS[reason] || reason);
+    if(reason === 'heuristic' && confidence != null) label += ' (confianza ' + Number(confidence).toFixed(2) + ')';
+    return label;
+  }
+
+  // Lee un cuerpo text/event-stream y llama onEvent(evento, datos) por cada frame
+  async function readEvents(res, onEvent){
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = '';
+    for(;;){
+      const { value, done } = await reader.read();
+      if(done) break;
+      buf += decoder.decode(value, { stream: true });
+      let sep;
+      while((sep = buf.indexOf('\n\n')) >= 0){
+        const frame = buf.slice(0, sep);
+        buf = buf.slice(sep + 2);
+        let event = 'message', payload = '';
+        frame.split('\n').forEach(line=>{
+          if(line.startsWith('event:')) event = line.slice(6).trim();
+          else if(line.startsWith('data:')) payload += line.slice(5).trim();
+        });
+        if(payload) onEvent(event, JSON.parse(payload));
+      }
+    }
+  }
+
   function setup(){
+    // Se muta en el lugar: al hacer streaming se van agregando precios
     const data = (window.__DATA__ && window.__DATA__.prices) || [];
     const filterInput = document.getElementById('filterText');
     const sortBy = document.getElementById('sortBy');
@@ -120,6 +166,57 @@
       });
     }
 
+    const form = document.getElementById('scrape-form');
+    const card = document.getElementById('results-card');
+    const errorBox = document.getElementById('stream-error');
+    const spinner = document.getElementById('stream-status');
+    if(form && window.ReadableStream && window.TextDecoder){
+      form.addEventListener('submit', async (ev)=>{
+        ev.preventDefault();
+        const fd = new FormData(form);
+        const meta = { url: fd.get('url'), model: fd.get('use_llm') ? fd.get('model') : null, original_len: null, reduced_len: null };
+        window.__META__ = meta;
+        data.length = 0;
+        setText('meta-url', meta.url);
+        setText('meta-original', 0);
+        setText('meta-model', meta.model || '');
+        setText('meta-reduced', 0);
+        show(document.getElementById('meta-llm'), !!meta.model);
+        show(document.getElementById('meta-structured'), false);
+        show(errorBox, false);
+        show(card, true);
+        show(spinner, true);
+        update();
+        try{
+          const res = await fetch('/api/extract/stream', { method: 'POST', body: fd });
+          if(!res.ok || !res.body) throw new Error('HTTP ' + res.status);
+          await readEvents(res, (event, payload)=>{
+            if(event === 'meta'){
+              if(payload.original_len != null){ meta.original_len = payload.original_len; setText('meta-original', payload.original_len); }
+              if(payload.reduced_len != null){ meta.reduced_len = payload.reduced_len; setText('meta-reduced', payload.reduced_len); }
+              if(payload.llm_skipped){
+                const badge = document.getElementById('meta-structured');
+                if(badge){ badge.textContent = skippedLabel(payload.llm_skipped, payload.confidence); }
+                show(badge, true);
+              }
+            }else if(event === 'prices'){
+              if(payload.prices && payload.prices.length){
+                data.push(...payload.prices);
+                update();
+              }
+            }else if(event === 'error'){
+              throw new Error(payload.error);
+            }
+          });
+        }catch(err){
+          if(errorBox){ errorBox.textContent = 'Error: ' + err.message; show(errorBox, true); }
+        }finally{
+          show(spinner, false);
+          update();
+        }
+      });
+    }
+
     render(sortPrices(data, 'value', 'asc'));
   }
 